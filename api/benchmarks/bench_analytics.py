@@ -0,0 +1,114 @@
+"""
+Benchmark - /api/analytics/metrics for a user with 50k summaries
+
+Seeds a throwaway user and synthetic history (one INSERT ... SELECT generate_series),
+builds the user's daily rollups, then times the old approach (fetch every row, aggregate
+in Python) against AnalyticsService.compute_metrics, and deletes the seeded rows again.
+
+    cd api && DATABASE_URL=postgresql://... python -m benchmarks.bench_analytics
+"""
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from services.analytics import AnalyticsService
+from services.daily_stats import DailyStatsService
+
+ROWS = 50_000
+RUNS = 5
+
+SEED_SQL = """
+INSERT INTO summary_history (id, "userId", url, title, tldr, key_points, "createdAt", "updatedAt")
+SELECT
+    md5($1 || i::text),
+    $1,
+    (ARRAY['https://github.com/a/b', 'https://www.bbc.co.uk/news/x', 'https://www.forbes.com/y', 'https://arxiv.org/abs/1', 'https://example.com/z'])[1 + i % 5],
+    'Synthetic summary ' || i,
+    rtrim(repeat('word ', 40 + i % 60)),
+    ARRAY[rtrim(repeat('point ', 10)), rtrim(repeat('detail ', 15)), rtrim(repeat('fact ', 8))],
+    NOW() - (i * INTERVAL '17 minutes'),
+    NOW()
+FROM generate_series(1, $2) AS i
+"""
+
+
+async def legacy_metrics(db, user_id: str) -> dict:
+    """The pre-aggregation endpoint body, kept here as the baseline."""
+    summaries = await db.query_raw(
+        'SELECT url, tldr, key_points, "createdAt" FROM summary_history WHERE "userId" = $1 ORDER BY "createdAt" DESC',
+        user_id,
+    )
+    now = datetime.now(timezone.utc)
+    week_ago = now - timedelta(days=7)
+    month_ago = now - timedelta(days=30)
+    total = weekly = monthly = 0.0
+    categories = {}
+    for s in summaries:
+        created_at = datetime.fromisoformat(str(s["createdAt"]).replace("Z", "+00:00"))
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        words = len(s["tldr"].split()) + sum(len(p.split()) for p in s["key_points"])
+        time_saved = max(0, (800 - words) / 200 * 60)
+        total += time_saved
+        if created_at >= week_ago:
+            weekly += time_saved
+        if created_at >= month_ago:
+            monthly += time_saved
+        domain = (s["url"] or "").split("//")[-1].split("/")[0].lower()
+        categories[domain] = categories.get(domain, 0) + 1
+    streak = 0
+    for i in range(30):
+        day = now.date() - timedelta(days=i)
+        if any(datetime.fromisoformat(str(s["createdAt"]).replace("Z", "+00:00")).date() == day for s in summaries):
+            streak += 1
+        else:
+            break
+    return {"total": total, "weekly": weekly, "monthly": monthly, "streak": streak}
+
+
+async def timed(label: str, fn) -> None:
+    samples = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - start)
+    print(f"  {label:<28} median {statistics.median(samples) * 1000:8.1f} ms  max {max(samples) * 1000:8.1f} ms")
+
+
+async def run(db) -> None:
+    user_id = f"bench_{uuid.uuid4().hex[:12]}"
+    service = AnalyticsService(db)
+    await db.execute_raw(
+        'INSERT INTO users (id, "clerkId", email, "updatedAt") VALUES ($1, $2, $3, NOW())',
+        str(uuid.uuid4()),
+        user_id,
+        f"{user_id}@example.com",
+    )
+    try:
+        await db.execute_raw(SEED_SQL, user_id, ROWS)
+        start = time.perf_counter()
+        await DailyStatsService(db).rebuild_user(user_id)
+        print(f"\n{ROWS:,} summaries for {user_id} (rollup backfill {time.perf_counter() - start:.1f} s)")
+        await timed("legacy fetch-all + Python", lambda: legacy_metrics(db, user_id))
+        await timed("daily rollups", lambda: service.compute_metrics(user_id))
+    finally:
+        await db.execute_raw('DELETE FROM user_daily_stats WHERE "userId" = $1', user_id)
+        await db.execute_raw('DELETE FROM summary_history WHERE "userId" = $1', user_id)
+        await db.execute_raw('DELETE FROM users WHERE "clerkId" = $1', user_id)
+
+
+async def main() -> None:
+    from prisma import Prisma
+
+    db = Prisma()
+    await db.connect()
+    try:
+        await run(db)
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
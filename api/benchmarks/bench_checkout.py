@@ -0,0 +1,90 @@
+"""
+Benchmark - Stripe/DB work on the create_checkout_session path, before and after
+eager customer provisioning
+
+"before" is what checkout did for a user without a Stripe customer: create the
+customer, write stripeCustomerId back, then create the session. "after" is a user the
+provisioning worker already reached, where checkout only creates the session. Each
+is timed RUNS times for a throwaway user and reported as p50/p95; the user row is
+deleted again. Point it at stripe-mock (which answers instantly, so real Stripe
+latency adds roughly one round trip per call to "before" alone):
+
+    cd api && STRIPE_API_BASE=http://localhost:12111 DATABASE_URL=postgresql://... python -m benchmarks.bench_checkout
+"""
+import asyncio
+import os
+import statistics
+import time
+import uuid
+
+from services.stripe_client import AsyncStripeClient
+
+RUNS = 100
+PRICE_ID = os.getenv("STRIPE_PRICE_ID_MONTHLY", "price_123")
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] * 1000
+
+
+async def create_session(client: AsyncStripeClient, customer_id: str):
+    return await client.create_checkout_session(
+        customer=customer_id,
+        payment_method_types=["card"],
+        line_items=[{"price": PRICE_ID, "quantity": 1}],
+        mode="subscription",
+        success_url="https://example.com/success?session_id={CHECKOUT_SESSION_ID}",
+        cancel_url="https://example.com/cancel",
+    )
+
+
+async def run(db, client: AsyncStripeClient) -> None:
+    clerk_id = f"bench_{uuid.uuid4().hex[:12]}"
+    email = f"{clerk_id}@example.com"
+    await db.execute_raw(
+        'INSERT INTO users (id, "clerkId", email, "updatedAt") VALUES ($1, $2, $3, NOW())',
+        str(uuid.uuid4()),
+        clerk_id,
+        email,
+    )
+
+    async def before():
+        customer = await client.create_customer(email=email, name=email, metadata={"clerkId": clerk_id})
+        await db.execute_raw('UPDATE users SET "stripeCustomerId" = $2 WHERE "clerkId" = $1', clerk_id, customer.id)
+        await create_session(client, customer.id)
+
+    async def after():
+        await create_session(client, provisioned_id)
+
+    try:
+        await before()  # Warm the connection pool
+        provisioned_id = (await client.create_customer(email=email)).id
+        print(f"\ncreate_checkout_session Stripe/DB work, {RUNS} runs")
+        print(f"  {'':<36} {'p50':>9} {'p95':>9}")
+        for label, fn in (("before (customer + write + session)", before), ("after (session only)", after)):
+            samples = []
+            for _ in range(RUNS):
+                start = time.perf_counter()
+                await fn()
+                samples.append(time.perf_counter() - start)
+            print(f"  {label:<36} {statistics.median(samples) * 1000:>6.1f} ms {percentile(samples, 95):>6.1f} ms")
+    finally:
+        await db.execute_raw('DELETE FROM users WHERE "clerkId" = $1', clerk_id)
+
+
+async def main() -> None:
+    from prisma import Prisma
+
+    client = AsyncStripeClient(os.getenv("STRIPE_SECRET_KEY", "sk_test_123"), os.getenv("STRIPE_API_BASE", "http://localhost:12111"))
+    db = Prisma()
+    await db.connect()
+    try:
+        await run(db, client)
+    finally:
+        await db.disconnect()
+        await client.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
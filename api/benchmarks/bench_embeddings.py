@@ -0,0 +1,107 @@
+"""
+Benchmark - Related-summary vector search at 10k / 100k vectors per user
+
+Runs entirely in memory on synthetic clustered vectors (no database), comparing the
+paged brute-force scan used for small accounts with the IVF index used for large ones.
+
+    cd api && python -m benchmarks.bench_embeddings
+"""
+import time
+
+import numpy as np
+
+from services.embeddings import (
+    EMBEDDING_DIM,
+    IVF_NPROBE,
+    IVF_TRAINING_SAMPLE,
+    STREAM_PAGE_SIZE,
+    TopK,
+    assign_lists,
+    embedder,
+    ivf_list_count,
+    nearest_lists,
+    train_ivf_centroids,
+)
+
+QUERIES = 200
+K = 10
+
+
+def synthetic_vectors(n: int, topics: int = 300, seed: int = 7) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((topics, EMBEDDING_DIM)).astype(np.float32)
+    vectors = centers[rng.integers(0, topics, n)] + 0.8 * rng.standard_normal((n, EMBEDDING_DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    # Round-trip through float16 like stored vectors
+    return vectors.astype(np.float16).astype(np.float32)
+
+
+def percentile_ms(samples, pct):
+    return float(np.percentile(np.array(samples) * 1000, pct))
+
+
+def paged_brute_force(query, vectors, ids):
+    top = TopK(K)
+    for start in range(0, len(vectors), STREAM_PAGE_SIZE):
+        page = vectors[start:start + STREAM_PAGE_SIZE]
+        top.push(ids[start:start + STREAM_PAGE_SIZE], page @ query)
+    return top.results()
+
+
+def ivf_search(query, centroids, lists, ids):
+    probe = nearest_lists(query, centroids, IVF_NPROBE)
+    top = TopK(K)
+    for list_id in probe:
+        rows = lists[list_id]
+        if rows[0].size:
+            top.push([ids[i] for i in rows[0]], rows[1] @ query)
+    return top.results()
+
+
+def run(n: int) -> None:
+    vectors = synthetic_vectors(n)
+    ids = [f"s{i}" for i in range(n)]
+    queries = vectors[np.random.default_rng(1).choice(n, QUERIES, replace=False)]
+
+    brute_times, brute_results = [], []
+    for q in queries:
+        start = time.perf_counter()
+        brute_results.append(paged_brute_force(q, vectors, ids))
+        brute_times.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    sample = vectors[np.random.default_rng(2).choice(n, min(n, IVF_TRAINING_SAMPLE), replace=False)]
+    centroids = train_ivf_centroids(sample, ivf_list_count(n))
+    assignment = assign_lists(vectors, centroids)
+    lists = {}
+    for list_id in range(len(centroids)):
+        rows = np.flatnonzero(assignment == list_id)
+        lists[list_id] = (rows, vectors[rows])
+    build_seconds = time.perf_counter() - start
+
+    ivf_times, recalls = [], []
+    for q, exact in zip(queries, brute_results):
+        start = time.perf_counter()
+        approx = ivf_search(q, centroids, lists, ids)
+        ivf_times.append(time.perf_counter() - start)
+        recalls.append(len({i for i, _ in exact} & {i for i, _ in approx}) / K)
+
+    print(f"\n{n:,} vectors ({n * EMBEDDING_DIM * 2 / 1e6:.1f} MB as float16)")
+    print(f"  brute force (paged {STREAM_PAGE_SIZE}): p50 {percentile_ms(brute_times, 50):.2f} ms  p95 {percentile_ms(brute_times, 95):.2f} ms")
+    print(f"  IVF build ({len(centroids)} lists):      {build_seconds:.2f} s")
+    print(f"  IVF search (nprobe={IVF_NPROBE}):      p50 {percentile_ms(ivf_times, 50):.2f} ms  p95 {percentile_ms(ivf_times, 95):.2f} ms  recall@{K} {np.mean(recalls):.3f}")
+
+
+def run_embedder() -> None:
+    text = "Central banks weigh rate cuts as inflation cools across major economies, " * 8
+    start = time.perf_counter()
+    for _ in range(2000):
+        embedder.embed_summary("Rate cuts on the horizon", text, ["Inflation is cooling", "Markets expect cuts"])
+    elapsed = time.perf_counter() - start
+    print(f"embedder: {2000 / elapsed:,.0f} summaries/s ({elapsed / 2000 * 1000:.3f} ms each)")
+
+
+if __name__ == "__main__":
+    run_embedder()
+    for size in (10_000, 100_000):
+        run(size)
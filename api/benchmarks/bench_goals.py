@@ -0,0 +1,89 @@
+"""
+Benchmark - /api/goals reads as history grows
+
+Seeds a throwaway user with three goals, then grows their synthetic history from 1k to
+100k summaries and times a goal read at each size: the naive approach (count this
+period's summaries on every read) against GoalsService.list_goals, whose cost should
+stay flat because it only reads the goal rows. Seeded rows are deleted again.
+
+    cd api && DATABASE_URL=postgresql://... python -m benchmarks.bench_goals
+"""
+import asyncio
+import statistics
+import time
+import uuid
+
+from services.goals import GoalsService
+
+from .bench_analytics import SEED_SQL
+
+HISTORY_SIZES = (1_000, 10_000, 100_000)
+RUNS = 20
+
+GOALS = [("daily_summaries", 3, "daily"), ("weekly_time_saved", 60, "weekly"), ("monthly_summaries", 40, "monthly")]
+
+
+async def naive_goals(db, user_id: str) -> list:
+    """Progress recomputed from summary_history on every read."""
+    return await db.query_raw(
+        """
+        SELECT
+            COUNT(*) FILTER (WHERE "createdAt" >= date_trunc('day', NOW())) AS daily,
+            COUNT(*) FILTER (WHERE "createdAt" >= date_trunc('week', NOW())) AS weekly,
+            COUNT(*) FILTER (WHERE "createdAt" >= date_trunc('month', NOW())) AS monthly,
+            COUNT(*) AS total
+        FROM summary_history WHERE "userId" = $1
+        """,
+        user_id,
+    )
+
+
+async def timed(fn) -> float:
+    samples = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+async def run(db) -> None:
+    user_id = f"bench_{uuid.uuid4().hex[:12]}"
+    service = GoalsService(db)
+    await db.execute_raw(
+        'INSERT INTO users (id, "clerkId", email, "updatedAt") VALUES ($1, $2, $3, NOW())',
+        str(uuid.uuid4()),
+        user_id,
+        f"{user_id}@example.com",
+    )
+    try:
+        for goal_type, target, period in GOALS:
+            await service.create_goal(user_id, goal_type, target, period)
+        print(f"\n{len(GOALS)} goals for {user_id}")
+        print(f"  {'summaries':>10}  {'count history':>14}  {'goal rows':>10}")
+        for size in HISTORY_SIZES:
+            await db.execute_raw('DELETE FROM summary_history WHERE "userId" = $1', user_id)
+            await db.execute_raw(SEED_SQL, user_id, size)
+            await db.execute_raw("ANALYZE summary_history")
+            naive = await timed(lambda: naive_goals(db, user_id))
+            stored = await timed(lambda: service.list_goals(user_id))
+            print(f"  {size:>10,}  {naive:>11.2f} ms  {stored:>7.2f} ms")
+    finally:
+        await db.execute_raw('DELETE FROM user_goals WHERE "userId" = $1', user_id)
+        await db.execute_raw('DELETE FROM summary_history WHERE "userId" = $1', user_id)
+        await db.execute_raw('DELETE FROM users WHERE "clerkId" = $1', user_id)
+
+
+async def main() -> None:
+    from prisma import Prisma
+
+    db = Prisma()
+    await db.connect()
+    try:
+        await run(db)
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+"""
+Benchmark - Resume PDF render latency, launching Chromium per request vs the warm page pool
+
+"before" is what /api/resume/generate-pdf used to do: launch Chromium, open a page, load
+the rendered HTML from a temp file with networkidle, print the PDF, close the browser.
+"after" is services/pdf_renderer.BrowserPool.render(): a warm page, HTML injected in
+memory, and a load + fonts-ready wait instead of networkidle. Both are timed
+RUNS times one after another (p50/p95), then CONCURRENT renders at once (wall time).
+Needs Chromium (`playwright install chromium`):
+
+    cd api && python -m benchmarks.bench_pdf
+"""
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from playwright.async_api import async_playwright
+
+from services.pdf_renderer import CHROMIUM_ARGS, PDF_OPTIONS, BrowserPool
+
+RUNS = 20
+CONCURRENT = 8
+
+SAMPLE_RESUME = {
+    "name": "Alex Example",
+    "contact": {"email": "alex@example.com", "phone": "555-0100", "website": "alex.example.com", "address": "Oakland, CA"},
+    "summary": "Backend engineer focused on reliable, fast web services.",
+    "experience": [
+        {
+            "title": "Senior Engineer", "company": "Example Co", "location": "Remote", "startDate": "2021", "endDate": "Present",
+            "bullets": [f"Shipped improvement number {i} to the billing pipeline." for i in range(6)],
+        },
+        {
+            "title": "Engineer", "company": "Sample Inc", "location": "San Francisco, CA", "startDate": "2018", "endDate": "2021",
+            "bullets": [f"Built and operated service number {i}." for i in range(5)],
+        },
+    ],
+    "education": [{"degree": "B.S. Computer Science", "institution": "State University", "startDate": "2014", "endDate": "2018"}],
+    "skills": ["Python", "PostgreSQL", "FastAPI", "Kubernetes"],
+    "projects": [{"name": "Open source tool", "date": "2023", "technologies": ["Rust"], "bullets": ["Maintainer."]}],
+}
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] * 1000
+
+
+async def render_from_file(page, html: str) -> bytes:
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".html", mode="w", encoding="utf-8") as f:
+        f.write(html)
+    try:
+        await page.goto(f"file://{f.name}", wait_until="networkidle")
+        return await page.pdf(**PDF_OPTIONS)
+    finally:
+        os.unlink(f.name)
+
+
+async def main() -> None:
+    template_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resume_templates")
+    env = Environment(loader=FileSystemLoader(template_dir), autoescape=select_autoescape(["html", "xml"]))
+    html = env.get_template("modern_template.html").render(SAMPLE_RESUME)
+
+    async def before():
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(args=CHROMIUM_ARGS)
+            try:
+                await render_from_file(await browser.new_page(), html)
+            finally:
+                await browser.close()
+
+    pool = BrowserPool(size=CONCURRENT)
+    await pool.start()
+
+    async def after():
+        await pool.render(html)
+
+    try:
+        print(f"\nResume PDF render, {RUNS} sequential runs and {CONCURRENT} concurrent")
+        print(f"  {'':<26} {'p50':>9} {'p95':>9} {'concurrent':>12}")
+        for label, fn in (("before (launch per render)", before), ("after (warm page pool)", after)):
+            samples = []
+            for _ in range(RUNS):
+                start = time.perf_counter()
+                await fn()
+                samples.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            await asyncio.gather(*(fn() for _ in range(CONCURRENT)))
+            wall = time.perf_counter() - start
+            print(
+                f"  {label:<26} {statistics.median(samples) * 1000:>6.0f} ms {percentile(samples, 95):>6.0f} ms"
+                f" {wall * 1000:>9.0f} ms"
+            )
+    finally:
+        await pool.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -3,16 +3,18 @@
 import os
 import logging
 import json # For parsing DeepSeek response
+import hashlib
+import re
 from datetime import datetime, timezone, timedelta # For usage reset logic
 import stripe
 import time
-import tempfile # ADDED for temporary PDF file
+import unicodedata
 
 # Third-party imports
-from fastapi import FastAPI, Depends, HTTPException, Request, Header, BackgroundTasks, status
+from fastapi import FastAPI, Depends, HTTPException, Request, Header, BackgroundTasks, status, Query
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse # MODIFIED: Added FileResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response, PlainTextResponse
 from pydantic import BaseModel, Field, EmailStr, HttpUrl # MODIFIED: Added EmailStr, HttpUrl
 import httpx # Use httpx for async API calls
 # --- Removed google.generativeai import ---
@@ -23,11 +25,6 @@ from jwt import PyJWKClient # For fetching JWKS keys
 from typing import Annotated, Optional, Dict, Any, List # Add Any and List
 from dotenv import load_dotenv
 
-# --- ADD Jinja2 and Playwright ---\
-from jinja2 import Environment, FileSystemLoader, select_autoescape
-from playwright.async_api import async_playwright
-# --- END ADD ---
-
 # --- Prisma Client Import ---
 from prisma import Prisma
 # --- ADD Webhook Verification Import ---
@@ -40,6 +37,35 @@ from services.job_detection import job_detector, JobPosting
 from services.resume_tailoring import ResumeTailoringService, ResumeData, ResumeSection, TailoredResume
 # --- END Job Copilot Services ---
 
+# --- History Services ---
+from services.history import HistoryService, InvalidHistoryFields, parse_fields, MAX_LIST_LIMIT
+from services.history_search import HistorySearchService, InvalidSearchCursor
+from services.history_export import HistoryExportService, EXPORT_FORMATS
+from services.history_deletion import HistoryDeletionService, JOB_KIND_HISTORY, JOB_KIND_USER
+from services.workers import PollingWorker
+from services.embeddings import EmbeddingIndexService
+from services.analytics import AnalyticsService
+from services.daily_stats import DailyStatsService
+from services.summary_metrics import compute_summary_metrics
+from services.analytics_cache import analytics_cache, etag_matches, CachedPayload
+from services.insights import InsightsService
+from services.goals import GoalsService, InvalidGoal
+from services.stripe_client import stripe_client
+from services.stripe_customers import StripeCustomerProvisioner
+from services.stripe_prices import PriceCatalog
+from services.webhook_inbox import WebhookInbox
+from services.email_outbox import EmailOutbox
+from services.weekly_digest import WeeklyDigest
+from services.pdf_renderer import BrowserPool, PdfRendererBusy
+from services.pdf_cache import PdfCache, pdf_cache_key, pdf_etag
+from services.resume_templates import ResumeTemplateRegistry, UnknownTemplateError
+from services.resume_layout import estimate_layout
+from services.pdf_batch import BatchItem, render_batch, zip_pdfs, PDF_BATCH_MAX_ITEMS
+from services.user_sync import UserSync, primary_email, CLERK_RECONCILE_INTERVAL_SECONDS
+from services.subscriptions import SubscriptionMirror, invoice_subscription_period
+from services.metrics import registry as metrics_registry
+# --- END History Services ---
+
 # --- ADD Brevo Configuration ---
 BREVO_API_KEY = os.getenv("BREVO_API_KEY")
 BREVO_API_URL = "https://api.brevo.com/v3/smtp/email"
@@ -76,12 +102,44 @@ if not BREVO_API_KEY:
 else:
     logger.info("BREVO_API_KEY configured successfully.")
 
+# Get your frontend URL for success/cancel redirects and links in emails
+FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
+
 # Initialize FastAPI app
 app = FastAPI()
 
 # --- Prisma Initialization ---
 # Instantiate Prisma Client outside endpoint functions for reuse
 prisma = Prisma()
+history_service = HistoryService(prisma)
+history_search_service = HistorySearchService(prisma)
+history_export_service = HistoryExportService(prisma)
+history_deletion_service = HistoryDeletionService(prisma, on_complete=analytics_cache.invalidate)
+embedding_index_service = EmbeddingIndexService(prisma)
+analytics_service = AnalyticsService(prisma)
+daily_stats_service = DailyStatsService(prisma)
+insights_service = InsightsService(prisma, on_refresh=analytics_cache.invalidate)
+goals_service = GoalsService(prisma)
+webhook_inbox = WebhookInbox(prisma)  # Handlers are registered next to the webhook endpoints
+subscription_mirror = SubscriptionMirror(prisma, stripe_client)
+stripe_customer_provisioner = StripeCustomerProvisioner(prisma, stripe_client)
+user_sync = UserSync(prisma)
+email_outbox = EmailOutbox(prisma, BREVO_API_KEY, BREVO_API_URL)
+weekly_digest = WeeklyDigest(prisma, email_outbox, {"name": SENDER_NAME, "email": SENDER_EMAIL}, FRONTEND_URL)
+pdf_pool = BrowserPool()  # Chromium for resume PDFs, launched at startup
+pdf_cache = PdfCache()  # Rendered resume PDFs on the /data volume
+metrics_registry.gauge("pdf_cache_bytes", "Bytes of rendered resume PDFs in the cache.", lambda: pdf_cache.stats()["bytes"])
+metrics_registry.gauge("pdf_cache_entries", "Rendered resume PDFs in the cache.", lambda: pdf_cache.stats()["entries"])
+metrics_registry.gauge("pdf_pool_idle_pages", "Browser pool pages free for a render.", lambda: pdf_pool.stats()["idle"])
+metrics_registry.gauge("pdf_pool_waiting", "Renders waiting for a browser pool page.", lambda: pdf_pool.stats()["waiting"])
+history_deletion_worker = PollingWorker("history-deletion", history_deletion_service.run_next, interval=30.0)
+insights_worker = PollingWorker("insights", insights_service.run_if_due, interval=600.0)
+goals_rollover_worker = PollingWorker("goals-rollover", goals_service.rollover, interval=3600.0)
+webhook_worker = PollingWorker("webhooks", webhook_inbox.run_next, interval=5.0)
+stripe_customer_worker = PollingWorker("stripe-customers", stripe_customer_provisioner.run_next, interval=60.0)
+email_worker = PollingWorker("email-outbox", email_outbox.run_next, interval=10.0)
+digest_worker = PollingWorker("weekly-digest", weekly_digest.run_if_due, interval=3600.0)
+clerk_reconcile_worker = PollingWorker("clerk-reconcile", user_sync.run_reconcile, interval=CLERK_RECONCILE_INTERVAL_SECONDS)
 
 # --- ADDED: Debug print for DATABASE_URL ---
 logger.info(f"DATABASE_URL at Prisma init: {os.getenv('DATABASE_URL')}")
@@ -93,9 +151,35 @@ async def startup():
     logger.info("Connecting to database...")
     await prisma.connect()
     logger.info("Database connection established.")
+    history_deletion_worker.start()
+    insights_worker.start()
+    goals_rollover_worker.start()
+    webhook_worker.start()
+    if BREVO_API_KEY:
+        email_worker.start()
+        digest_worker.start()
+    if stripe_client.api_key:
+        await price_catalog.load()
+        stripe_customer_worker.start()
+    if user_sync.clerk_secret_key:
+        clerk_reconcile_worker.start()
+    resume_templates.load()
+    await pdf_cache.load()
+    await pdf_pool.start()
 
 @app.on_event("shutdown")
 async def shutdown():
+    await history_deletion_worker.stop()
+    await insights_worker.stop()
+    await goals_rollover_worker.stop()
+    await webhook_worker.stop()
+    await stripe_customer_worker.stop()
+    await clerk_reconcile_worker.stop()
+    await digest_worker.stop()
+    await email_worker.stop()
+    await email_outbox.aclose()
+    await pdf_pool.stop()
+    await stripe_client.aclose()
     logger.info("Disconnecting from database...")
     await prisma.disconnect()
     logger.info("Database connection closed.")
@@ -119,8 +203,6 @@ jwks_client = PyJWKClient(CLERK_JWKS_URL, headers={"User-Agent": "TildraAPI/1.0"
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 PREMIUM_PRICE_ID_MONTHLY = os.getenv("PREMIUM_PRICE_ID_MONTHLY")
 PREMIUM_PRICE_ID_YEARLY = os.getenv("PREMIUM_PRICE_ID_YEARLY")
-# Get your frontend URL for success/cancel redirects
-FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 SUCCESS_URL = f"{FRONTEND_URL}/payment/success" # Define SUCCESS_URL
 CANCEL_URL = f"{FRONTEND_URL}/payment/cancel"   # Define CANCEL_URL
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET") # <-- Load webhook secret
@@ -221,6 +303,54 @@ class HistoryItemResponse(BaseModel):
     class Config: # Add Config for ORM mode if returning Prisma model instances directly
         orm_mode = True 
 
+# Sparse variant for list views; only the fields requested via ?fields= are serialized
+class HistoryListItemResponse(BaseModel):
+    id: str
+    userId: Optional[str] = None
+    url: Optional[str] = None
+    title: Optional[str] = None
+    tldr: Optional[str] = None
+    keyPoints: Optional[List[str]] = None
+    createdAt: Optional[datetime] = None
+
+class RelatedSummaryResult(BaseModel):
+    id: str
+    url: Optional[str] = None
+    title: Optional[str] = None
+    createdAt: datetime
+    score: float # Cosine similarity, higher is more related
+
+class HistoryDeletionJobResponse(BaseModel):
+    jobId: str
+    kind: str
+    status: str # pending | running | completed | failed
+    deletedCount: int
+    createdAt: datetime
+    completedAt: Optional[datetime] = None
+
+def _deletion_job_response(job: Dict[str, Any]) -> HistoryDeletionJobResponse:
+    return HistoryDeletionJobResponse(
+        jobId=job["id"],
+        kind=job["kind"],
+        status=job["status"],
+        deletedCount=job["deletedCount"],
+        createdAt=job["createdAt"],
+        completedAt=job.get("completedAt"),
+    )
+
+class HistorySearchResult(BaseModel):
+    id: str
+    url: Optional[str] = None
+    title: Optional[str] = None
+    createdAt: datetime
+    rank: float
+    snippet: str # HTML-escaped tldr excerpt with matches wrapped in <mark>
+    titleHighlight: Optional[str] = None
+
+class HistorySearchResponse(BaseModel):
+    results: List[HistorySearchResult]
+    nextCursor: Optional[str] = None
+
 # --- Authentication Dependency (Manual JWT Verification) ---
 async def get_authenticated_user_id(request: Request) -> str:
     """Dependency to authenticate the request using manual JWT verification."""
@@ -304,32 +434,9 @@ async def get_authenticated_user_id_with_rls_context(request: Request, db_prisma
             algorithms=["RS256"],
             issuer=CLERK_ISSUER,
         )
+        # Users are created by the Clerk webhook (and repaired by the reconciliation job in
+        # services/user_sync.py), so authentication never touches the users table.
         user_id = claims.get('sub')
-        
-        # Check if user exists in DB, create if not (development fallback)
-        if user_id:
-            existing_user = await db_prisma.user.find_unique(where={"clerkId": user_id})
-            if not existing_user:
-                # Extract email from JWT claims
-                email = claims.get('email') or f"{user_id}@dev.local"
-                logger.info(f"Creating missing user for Clerk ID: {user_id} with email: {email}")
-                try:
-                    await db_prisma.user.create(
-                        data={
-                            "clerkId": user_id,
-                            "email": email,
-                            "firstName": claims.get('given_name') or "Dev",
-                            "lastName": claims.get('family_name') or "User",
-                            "plan": "free",
-                            "summariesUsed": 0,
-                            "summaryLimit": 5,
-                            "totalSummariesMade": 0
-                        }
-                    )
-                    logger.info(f"Successfully created user for Clerk ID: {user_id}")
-                except Exception as create_error:
-                    logger.error(f"Failed to create user for Clerk ID {user_id}: {create_error}")
-                    # Continue anyway - the endpoint will handle the missing user
 
     except jwt.exceptions.PyJWKClientError as e:
         logger.error(f"Auth failed (RLS): Error fetching/finding JWKS key - {e}")
@@ -398,24 +505,49 @@ async def save_summary_to_history(
     url: Optional[str],
     title: Optional[str],
     tldr: str,
-    key_points: List[str]
+    key_points: List[str],
+    article_text: Optional[str] = None
 ):
     """Saves the summary details to the SummaryHistory table."""
     try:
         logger.info(f"[History] Attempting to save summary for Clerk ID: {user_clerk_id}, URL: {url}")
-        await prisma.summaryhistory.create(
+        metrics = compute_summary_metrics(url, tldr, key_points, article_text)
+        saved = await prisma.summaryhistory.create(
             data={
                 "userId": user_clerk_id,
                 "url": url,
                 "title": title,
                 "tldr": tldr,
                 "keyPoints": key_points, # Ensure this matches your Prisma schema (e.g., list of strings)
+                **metrics,
                 # createdAt is usually handled by the database or Prisma default
             }
         )
         logger.info(f"[History] Successfully saved summary for Clerk ID: {user_clerk_id}, URL: {url}")
     except Exception as e:
         logger.error(f"[History] Error saving summary for Clerk ID {user_clerk_id}, URL: {url}: {e}", exc_info=True)
+        return
+
+    try:
+        await daily_stats_service.record_summary(
+            user_clerk_id, saved.createdAt, metrics["category"], metrics["summaryWordCount"], metrics["originalWordCount"]
+        )
+    except Exception as e:
+        # `python -m services.daily_stats backfill` rebuilds rollups that drifted
+        logger.error(f"[History] Error updating daily stats for Clerk ID {user_clerk_id}: {e}", exc_info=True)
+    try:
+        await goals_service.record_summary(
+            user_clerk_id, saved.createdAt, metrics["summaryWordCount"], metrics["originalWordCount"]
+        )
+    except Exception as e:
+        logger.error(f"[History] Error updating goal progress for Clerk ID {user_clerk_id}: {e}", exc_info=True)
+    analytics_cache.invalidate(user_clerk_id)
+
+    try:
+        await embedding_index_service.add_summary(saved.id, user_clerk_id, title, tldr, key_points)
+    except Exception as e:
+        # Related-summary search lazily embeds anything missed here
+        logger.error(f"[History] Error embedding summary {saved.id} for Clerk ID {user_clerk_id}: {e}", exc_info=True)
 # --- END ADDED ---
 
 # --- API Endpoints ---
@@ -430,6 +562,7 @@ PRICE_IDs = {
     "monthly": os.getenv("STRIPE_PRICE_ID_MONTHLY", "price_1RTWE7AGvsrc7mtDIbGZqLgm"), # Production monthly price ID
     "yearly": os.getenv("STRIPE_PRICE_ID_YEARLY", "price_1RUX3xAGvsrc7mtDT8Cx3YZM"),  # Production yearly price ID
 }
+price_catalog = PriceCatalog(stripe_client, PRICE_IDs)  # Validated at startup
 
 class CreateCheckoutSessionRequest(BaseModel):
     price_lookup_key: str # e.g., 'monthly' or 'yearly'
@@ -453,36 +586,21 @@ async def create_checkout_session(
             logger.error(f"User not found for Clerk ID: {user_clerk_id} during checkout session creation.")
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-        price_id = PRICE_IDs.get(request_data.price_lookup_key)
+        price_id = price_catalog.get(request_data.price_lookup_key)
         if not price_id:
             logger.error(f"Invalid price key provided: {request_data.price_lookup_key} for Clerk ID: {user_clerk_id}")
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid price key")
 
         stripe_customer_id = user.stripeCustomerId
 
-        # If the user doesn't have a Stripe Customer ID, create one
+        # The customer is normally created right after sign-up by stripe_customer_worker, so
+        # this is the only Stripe call on the way to the redirect. Only users the worker hasn't
+        # reached yet pay for creating it here (same idempotency key, so no duplicate).
         if not stripe_customer_id:
             try:
-                # Use the email from our database instead of fetching from Clerk
-                user_email = user.email
-                if not user_email:
-                    logger.error(f"No email found for user {user_clerk_id}. Cannot create Stripe customer.")
-                    raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not determine user email for Stripe.")
-                
-                # Use names from database if available
-                user_name = f"{user.firstName} {user.lastName}".strip() if user.firstName and user.lastName else user_email
-                
-                logger.info(f"Creating Stripe customer for Clerk ID: {user_clerk_id}, Email: {user_email}")
-                customer = stripe.Customer.create(
-                    email=user_email,
-                    metadata={"clerkId": user_clerk_id},
-                    name=user_name
-                )
-                stripe_customer_id = customer.id
-                logger.info(f"Updating user record {user_clerk_id} with Stripe Customer ID: {stripe_customer_id}")
-                await prisma.user.update(
-                    where={"clerkId": user_clerk_id},
-                    data={"stripeCustomerId": stripe_customer_id}
+                logger.info(f"Creating Stripe customer inline for Clerk ID: {user_clerk_id}, Email: {user.email}")
+                stripe_customer_id = await stripe_customer_provisioner.provision(
+                    user_clerk_id, user.email, user.firstName, user.lastName
                 )
                 logger.info(f"Stripe customer {stripe_customer_id} created and linked for Clerk ID: {user_clerk_id}")
             except stripe.error.StripeError as e:
@@ -494,7 +612,7 @@ async def create_checkout_session(
 
         # Create new Checkout Session
         logger.info(f"Creating Stripe Checkout session for customer: {stripe_customer_id}, price: {price_id}")
-        checkout_session = stripe.checkout.Session.create(
+        checkout_session = await stripe_client.create_checkout_session(
             customer=stripe_customer_id,
             payment_method_types=['card'],
             line_items=[
@@ -524,7 +642,7 @@ async def create_checkout_session(
 
 @app.post("/stripe-webhook")
 async def stripe_webhook(request: Request):
-    """Handles incoming webhooks from Stripe."""
+    """Handles incoming webhooks from Stripe: verifies, stores and acknowledges the event."""
     payload = await request.body()
     sig_header = request.headers.get('Stripe-Signature')
     event = None
@@ -551,7 +669,30 @@ async def stripe_webhook(request: Request):
         logger.error(f"Webhook error: Unexpected error constructing event - {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error processing webhook.")
 
-    # Handle the event
+    # Store the verified event and acknowledge; the webhook worker processes it
+    # (see process_stripe_event). Stripe retries of the same event id are deduplicated.
+    data_object = event.data.object
+    ordering_key = data_object.get("customer") if data_object.get("object") != "customer" else data_object.get("id")
+    try:
+        if await webhook_inbox.record(
+            "stripe",
+            event.id,
+            event.type,
+            event.to_dict(),
+            ordering_key=ordering_key,
+            created_at=datetime.fromtimestamp(event.created, tz=timezone.utc),
+        ):
+            webhook_worker.wake()
+    except Exception as e:
+        logger.error(f"Webhook error: Failed to store Stripe event {event.id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error processing webhook.")
+
+    # Acknowledge receipt to Stripe
+    return {"received": True}
+
+async def process_stripe_event(payload: Dict[str, Any]) -> None:
+    """Applies a stored Stripe event. Raising makes the webhook inbox retry it later."""
+    event = stripe.Event.construct_from(payload, stripe.api_key)
     if event.type == 'checkout.session.completed':
         session = event.data.object # The Checkout Session object
         logger.info(f"Handling checkout.session.completed for session: {session.id}")
@@ -562,42 +703,26 @@ async def stripe_webhook(request: Request):
 
         if not stripe_customer_id or not stripe_subscription_id:
             logger.error(f"Missing customer or subscription ID in checkout session {session.id}")
-            return {"error": "Missing data in webhook payload"}
+            return
 
         try:
-            # Retrieve the subscription to get price details and current period end
-            logger.info(f"Retrieving subscription: {stripe_subscription_id}")
-            subscription = stripe.Subscription.retrieve(stripe_subscription_id)
-
-            # Extract price ID and period end
-            stripe_price_id = None
-            period_end_timestamp = None
-
-            items_object = subscription.get('items')
-            if items_object and hasattr(items_object, 'data') and items_object.data:
-                first_item = items_object.data[0]
-                plan = first_item.get('plan')
-                price = first_item.get('price')
-                
-                if plan:
-                    stripe_price_id = plan.get('id')
-                elif price:
-                    stripe_price_id = price.get('id')
-                
-                period_end_timestamp = subscription.get('current_period_end')
+            # customer.subscription.created normally lands before this event, so the mirror
+            # has the price and period end; Stripe is only asked when it does not.
+            subscription = await subscription_mirror.resolve(stripe_subscription_id)
+            stripe_price_id = subscription["priceId"]
+            stripe_current_period_end = subscription["currentPeriodEnd"]
 
-            if not stripe_price_id or not period_end_timestamp:
-                logger.error(f"Missing price ID or period end. Price: {stripe_price_id}, Period: {period_end_timestamp}")
-                return {"error": "Missing subscription data"}
+            if not stripe_price_id or not stripe_current_period_end:
+                logger.error(f"Missing price ID or period end. Price: {stripe_price_id}, Period: {stripe_current_period_end}")
+                return
 
-            stripe_current_period_end = datetime.fromtimestamp(period_end_timestamp, tz=timezone.utc)
             logger.info(f"Extracted: Price={stripe_price_id}, PeriodEnd={stripe_current_period_end}")
 
             # Find user by Stripe Customer ID
             user = await prisma.user.find_unique(where={"stripeCustomerId": stripe_customer_id})
             if not user:
                 logger.error(f"User not found for stripe_customer_id: {stripe_customer_id}")
-                return {"error": "User not found"}
+                return
 
             logger.info(f"Found user: {user.clerkId} - Current plan: {user.plan}")
 
@@ -625,10 +750,10 @@ async def stripe_webhook(request: Request):
 
         except stripe.error.StripeError as e:
             logger.error(f"Stripe API error: {e}")
-            return {"error": f"Stripe API error: {e}"}
+            raise
         except Exception as e:
             logger.error(f"Critical error in checkout completion: {e}", exc_info=True)
-            return {"error": f"Processing error: {e}"}
+            raise
 
     # --- ADDED: Handler for invoice.payment_succeeded ---
     elif event.type == 'invoice.payment_succeeded':
@@ -640,24 +765,27 @@ async def stripe_webhook(request: Request):
 
         if not stripe_subscription_id or not stripe_customer_id:
             logger.error(f"Webhook invoice.payment_succeeded: Missing subscription or customer ID. Invoice: {invoice.id}")
-            return {"status": "error", "message": "Missing subscription or customer ID in invoice"}
+            return
 
         # Only process if it's for a subscription (not a one-time payment if you have those)
         # And if it's not the very first payment of a new subscription (which is handled by checkout.session.completed)
         if invoice.billing_reason == 'subscription_cycle' or invoice.billing_reason == 'subscription_update':
             try:
-                # Retrieve the subscription to get the new current_period_end
-                logger.info(f"Retrieving subscription {stripe_subscription_id} for renewal update.")
-                subscription = stripe.Subscription.retrieve(stripe_subscription_id)
-                new_period_end_timestamp = subscription.current_period_end
-                new_period_end_datetime = datetime.fromtimestamp(new_period_end_timestamp, tz=timezone.utc)
+                # The invoice's subscription line carries the new period; the mirror (then
+                # Stripe) covers invoices without one. The invoice's own period_end is when the
+                # new period starts, so a mirrored period ending by then is the previous one.
+                _, new_period_end_datetime = invoice_subscription_period(invoice, stripe_subscription_id)
+                if not new_period_end_datetime:
+                    invoice_period_end = datetime.fromtimestamp(invoice.period_end, tz=timezone.utc) if invoice.get('period_end') else None
+                    subscription = await subscription_mirror.resolve(stripe_subscription_id, period_end_after=invoice_period_end)
+                    new_period_end_datetime = subscription["currentPeriodEnd"]
 
                 logger.info(f"Subscription {stripe_subscription_id} renewed. New period end: {new_period_end_datetime}")
 
                 user = await prisma.user.find_unique(where={"stripeCustomerId": stripe_customer_id})
                 if not user:
                     logger.error(f"Webhook invoice.payment_succeeded: User not found for Stripe Customer ID {stripe_customer_id}. Sub ID: {stripe_subscription_id}")
-                    return {"status": "error", "message": "User not found for subscription renewal."}
+                    return
 
                 # Only update if the user is currently on a premium plan
                 if user.plan == "premium":
@@ -676,22 +804,25 @@ async def stripe_webhook(request: Request):
 
             except stripe.error.StripeError as e:
                 logger.error(f"Stripe API error during subscription retrieval for renewal (Sub ID: {stripe_subscription_id}): {e}", exc_info=True)
-                # Don't crash, but log. Stripe will retry webhooks.
+                raise # The webhook inbox retries the event with backoff
             except Exception as e:
                 logger.error(f"Error processing invoice.payment_succeeded for subscription {stripe_subscription_id}: {e}", exc_info=True)
+                raise
         else:
             logger.info(f"Skipping invoice.payment_succeeded for invoice {invoice.id} with reason '{invoice.billing_reason}'. Not a typical renewal or update.")
 
+    elif event.type in ('customer.subscription.created', 'customer.subscription.updated', 'customer.subscription.deleted'):
+        subscription = event.data.object
+        if await subscription_mirror.record(subscription, event.created):
+            logger.info(f"Mirrored subscription {subscription.id} ({event.type}): status={subscription.get('status')}")
+
     else:
         logger.info(f"Unhandled event type: {event.type}")
 
-    # Acknowledge receipt to Stripe
-    return {"received": True}
-
 @app.post("/clerk-webhook")
-async def clerk_webhook(request: Request, background_tasks: BackgroundTasks):
+async def clerk_webhook(request: Request):
     """Handles incoming webhooks from Clerk.
-    Verifies the signature and processes user.created events.
+    Verifies the signature and stores the event for the webhook worker (see process_clerk_event).
     """
     if not CLERK_WEBHOOK_SECRET:
         logger.error("Webhook processing failed: Signing secret not configured.")
@@ -730,163 +861,77 @@ async def clerk_webhook(request: Request, background_tasks: BackgroundTasks):
         logger.error(f"Unexpected error during webhook verification: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Error verifying webhook.")
 
-    # Process the validated event --- 
+    # Store the verified event and acknowledge; the webhook worker processes it
+    # (see process_clerk_event). Svix retries reuse the svix-id and are deduplicated.
+    try:
+        if await webhook_inbox.record(
+            "clerk",
+            svix_id,
+            evt.get("type") or "unknown",
+            evt,
+            ordering_key=(evt.get("data") or {}).get("id"),
+            created_at=datetime.fromtimestamp(int(svix_timestamp), tz=timezone.utc),
+        ):
+            webhook_worker.wake()
+    except Exception as e:
+        logger.error(f"Failed to store Clerk webhook {svix_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Error storing webhook.")
+    return {"status": "ok"}
+
+async def process_clerk_event(evt: Dict[str, Any]) -> None:
+    """Applies a stored Clerk event. Raising makes the webhook inbox retry it later."""
     event_type = evt.get("type")
     event_data = evt.get("data", {}) # Default to empty dict if 'data' is missing
 
-    if event_type == "user.created":
-        logger.info(f"Processing user.created event for Clerk ID: {event_data.get('id')}")
-        try:
-            clerk_id = event_data.get("id")
-            first_name = event_data.get("first_name")
-            last_name = event_data.get("last_name")
-            image_url = event_data.get("image_url")
-            email_address = None
-            email_addresses = event_data.get("email_addresses", [])
-            if email_addresses:
-                primary_email_obj = next((e for e in email_addresses if e.get("id") == event_data.get("primary_email_address_id")), None)
-                if primary_email_obj:
-                    email_address = primary_email_obj.get("email_address")
-                elif email_addresses: # Fallback to first verified, then first email if no primary found
-                    verified_email_obj = next((e for e in email_addresses if e.get("verification", {}).get("status") == "verified"), None)
-                    if verified_email_obj:
-                        email_address = verified_email_obj.get("email_address")
-                    else:
-                        email_address = email_addresses[0].get("email_address")
-            
-            if not clerk_id or not email_address:
-                 logger.error(f"Webhook Error user.created: Missing clerk_id or email. ClerkID: {clerk_id}, Email: {email_address}, EventData: {event_data}")
-                 return {"status": "error", "message": "Missing required user data (clerkId or email) in user.created event."}
-
-            existing_user_by_clerk_id = await prisma.user.find_unique(where={"clerkId": clerk_id})
-            if existing_user_by_clerk_id:
-                 logger.warning(f"Webhook Info user.created: User with clerkId {clerk_id} already exists. Skipping creation.")
-                 return {"status": "ok", "message": "User already exists."}
-
-            # Check if email exists and link if necessary (idempotency for existing email with different clerkId)
-            existing_user_by_email = await prisma.user.find_unique(where={"email": email_address})
-            if existing_user_by_email:
-                logger.warning(f"Webhook Info user.created: Email {email_address} already exists for user {existing_user_by_email.id}. Linking this new Clerk ID {clerk_id}.")
-                await prisma.user.update(where={"email": email_address}, data={"clerkId": clerk_id, "firstName": first_name, "lastName": last_name, "profileImageUrl": image_url})
-                return {"status": "ok", "message": "Existing user by email linked to new Clerk ID."}
-
-            new_user = await prisma.user.create(
-                data={
-                    "clerkId": clerk_id,
-                    "email": email_address,
-                    "firstName": first_name,
-                    "lastName": last_name,
-                    "profileImageUrl": image_url,
-                    "plan": "free",
-                    "summaryLimit": 10, 
-                    "summariesUsed": 0,
-                    "totalSummariesMade": 0, # Initialize total summaries
-                    "usageResetAt": datetime.now(timezone.utc)
-                }
-            )
-            logger.info(f"Successfully created user in DB for Clerk ID: {new_user.clerkId}")
-            
-            # --- ADDED: Send welcome email --- 
-            if new_user and new_user.email:
-                logger.info(f"Scheduling welcome email for new user: {new_user.email}")
-                # Use the background_tasks instance defined earlier in the endpoint
-                await send_welcome_email(new_user.email, new_user.firstName, background_tasks)
-            # --- END ADDED ---
-
-            return {"status": "ok", "message": "User created successfully."}
-        
-        except Exception as e:
-            logger.error(f"Webhook Error user.created: Failed to process for Clerk ID {event_data.get('id')}: {e}", exc_info=True)
-            raise HTTPException(status_code=500, detail="Failed to process user.created event.")
-
-    elif event_type == "user.updated":
+    if event_type in ("user.created", "user.updated"):
         clerk_id = event_data.get("id")
-        logger.info(f"Processing user.updated event for Clerk ID: {clerk_id}")
-        if not clerk_id:
-            logger.error(f"Webhook Error user.updated: Missing clerk_id. EventData: {event_data}")
-            return {"status": "error", "message": "Missing clerk_id in user.updated event."}
+        logger.info(f"Processing {event_type} event for Clerk ID: {clerk_id}")
         try:
-            first_name = event_data.get("first_name")
-            last_name = event_data.get("last_name")
-            image_url = event_data.get("image_url")
-            email_address = None
-            email_addresses = event_data.get("email_addresses", [])
-            if email_addresses:
-                primary_email_obj = next((e for e in email_addresses if e.get("id") == event_data.get("primary_email_address_id")), None)
-                if primary_email_obj:
-                    email_address = primary_email_obj.get("email_address")
-                elif email_addresses: # Fallback to first verified, then first email
-                    verified_email_obj = next((e for e in email_addresses if e.get("verification", {}).get("status") == "verified"), None)
-                    if verified_email_obj:
-                        email_address = verified_email_obj.get("email_address")
-                    else:
-                        email_address = email_addresses[0].get("email_address")
-
-            update_payload = {
-                "firstName": first_name,
-                "lastName": last_name,
-                "profileImageUrl": image_url
-            }
-            if email_address: # Only update email if we successfully determined one
-                update_payload["email"] = email_address
-            
-            # Remove keys where value is None to avoid overwriting existing data with None if not provided in event
-            update_payload_cleaned = {k: v for k, v in update_payload.items() if v is not None}
+            # One upsert whichever way round the events arrive; a row with the same email
+            # (a re-created Clerk account) is relinked to the new Clerk ID.
+            action = await user_sync.upsert(event_data)
+        except ValueError as e:
+            logger.error(f"Webhook Error {event_type}: {e}. EventData: {event_data}")
+            return
+        except Exception as e:
+            logger.error(f"Webhook Error {event_type}: Failed to sync Clerk ID {clerk_id}: {e}", exc_info=True)
+            raise
 
-            if not update_payload_cleaned:
-                logger.info(f"Webhook Info user.updated: No relevant fields to update for Clerk ID: {clerk_id}. Skipping DB update.")
-                return {"status": "ok", "message": "No fields to update."}
+        logger.info(f"Synced Clerk ID {clerk_id} ({event_type}): {action or 'no changes'}")
+        if action != "inserted":
+            return
+        stripe_customer_worker.wake()  # Create their Stripe customer before they reach checkout
 
-            updated_user = await prisma.user.update(
-                where={"clerkId": clerk_id},
-                data=update_payload_cleaned
-            )
-            if updated_user:
-                logger.info(f"Successfully updated user in DB for Clerk ID: {clerk_id}")
-                return {"status": "ok", "message": "User updated successfully."}
-            else:
-                # This might happen if the user was deleted from DB between webhook firing and processing
-                logger.warning(f"Webhook Info user.updated: User with Clerk ID {clerk_id} not found for update. May have been deleted.")
-                return {"status": "ok", "message": "User not found for update."}
-        except Exception as e:
-            logger.error(f"Webhook Error user.updated: Failed for Clerk ID {clerk_id}: {e}", exc_info=True)
-            raise HTTPException(status_code=500, detail="Failed to process user.updated event.")
+        # --- ADDED: Send welcome email --- 
+        if event_type == "user.created":
+            user_email = primary_email(event_data)
+            logger.info(f"Queueing welcome email for new user: {user_email}")
+            await send_welcome_email(user_email, event_data.get("first_name"), clerk_id)
+        # --- END ADDED ---
 
     elif event_type == "user.deleted":
         clerk_id = event_data.get("id")
         logger.info(f"Processing user.deleted event for Clerk ID: {clerk_id}")
         if not clerk_id:
             logger.error(f"Webhook Error user.deleted: Missing clerk_id. EventData: {event_data}")
-            return {"status": "error", "message": "Missing clerk_id in user.deleted event."}
+            return
         try:
-            # First, delete all summary history records for this user to avoid foreign key constraint
-            logger.info(f"Deleting summary history for user: {clerk_id}")
-            deleted_history = await prisma.summaryhistory.delete_many(
-                where={"userId": clerk_id}
-            )
-            logger.info(f"Deleted {deleted_history.count if hasattr(deleted_history, 'count') else 'unknown'} summary history records for user: {clerk_id}")
-            
-            # Now delete the user
-            deleted_user = await prisma.user.delete(where={"clerkId": clerk_id})
-            if deleted_user:
-                logger.info(f"Successfully deleted user from DB for Clerk ID: {clerk_id}")
-                return {"status": "ok", "message": "User deleted successfully."}
-            else:
-                # This implies user was already deleted from our DB
-                logger.warning(f"Webhook Info user.deleted: User with Clerk ID {clerk_id} not found for deletion. Already deleted? Event Data: {event_data}")
-                return {"status": "ok", "message": "User not found, already deleted?"}
-        except Exception as e: # Catch specific Prisma errors like RecordNotFound if needed
+            # History rows must go before the user row (foreign key), and heavy users can have
+            # a lot of them, so both are removed in batches by the deletion worker. Enqueueing
+            # is idempotent, so retries of this event attach to the same job.
+            job = await history_deletion_service.enqueue(clerk_id, JOB_KIND_USER)
+            history_deletion_worker.wake()
+            logger.info(f"Queued deletion job {job['id']} for Clerk ID: {clerk_id}")
+            return
+        except Exception as e:
             logger.error(f"Webhook Error user.deleted: Failed for Clerk ID {clerk_id}: {e}", exc_info=True)
-            # If Prisma's delete throws an error because record not found, it's okay for idempotency.
-            # Check if the error indicates record not found. Prisma's P2025 error.
-            if "NotFoundError" in str(e) or (hasattr(e, 'code') and e.code == 'P2025'):
-                 logger.warning(f"Webhook Info user.deleted: User with Clerk ID {clerk_id} already deleted (Prisma P2025). Event Data: {event_data}")
-                 return {"status": "ok", "message": "User already deleted from DB."}
-            raise HTTPException(status_code=500, detail="Failed to process user.deleted event.")
+            raise
 
     else:
         logger.info(f"Received Clerk webhook event type '{event_type}', but no specific handler is configured beyond create/update/delete.")
-        return {"status": "ok", "message": "Event received but no specific handler executed."}
+
+webhook_inbox.register("stripe", process_stripe_event)
+webhook_inbox.register("clerk", process_clerk_event)
 
 @app.post("/summarize", response_model=SummarizeResponse)
 async def summarize_article(
@@ -954,7 +999,8 @@ async def summarize_article(
                 url=request_data.url,
                 title=request_data.title,
                 tldr=summary_tldr, 
-                key_points=key_points_list
+                key_points=key_points_list,
+                article_text=request_data.article_text
             )
             background_tasks.add_task(
                 track_summary_usage,
@@ -991,6 +1037,11 @@ async def reset_user_usage(user_clerk_id: str, reset_time: datetime):
 def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """In-process counters and histograms in Prometheus text format."""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
 # --- Optional: Add exception handlers if needed ---
 # Example generic handler
 @app.exception_handler(Exception)
@@ -1060,25 +1111,135 @@ async def get_user_status(user_id: AuthenticatedUserIdWithRLS): # MODIFIED for R
 # --- END ADDED --- 
 
 # --- ADDED: History Endpoint --- 
-@app.get("/api/history", response_model=List[HistoryItemResponse])
-async def get_user_history(user_id: AuthenticatedUserIdWithRLS): # MODIFIED for RLS
-    """Retrieves the summary history for the authenticated user."""
+@app.get("/api/history", response_model=List[HistoryListItemResponse], response_model_exclude_unset=True)
+async def get_user_history(
+    user_id: AuthenticatedUserIdWithRLS, # MODIFIED for RLS
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. 'title,url,createdAt'. Defaults to all fields."),
+    limit: int = Query(MAX_LIST_LIMIT, ge=1, le=MAX_LIST_LIMIT),
+):
+    """Retrieves the summary history for the authenticated user.
+
+    List views should request only the columns they render (e.g. ?fields=title,url,createdAt)
+    and load full content per item from /api/history/{history_id}.
+    """
     logger.info(f"Fetching history for Clerk ID: {user_id}")
     try:
-        history_items = await prisma.summaryhistory.find_many(
-            where={"userId": user_id},
-            order={"createdAt": "desc"},
-            take=100 # Limit results
-        )
+        selected_fields = parse_fields(fields)
+    except InvalidHistoryFields as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    try:
+        history_items = await history_service.list_items(user_id, selected_fields, limit=limit)
         logger.info(f"Found {len(history_items)} history items for user {user_id}")
-        # Directly return the list - Pydantic with orm_mode handles conversion
-        return history_items 
+        return [HistoryListItemResponse(**item) for item in history_items]
 
     except Exception as e:
         logger.error(f"Error fetching history for {user_id}: {e}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error fetching summary history.")
 # --- END ADDED --- 
 
+# --- History Search Endpoint ---
+@app.get("/api/history/search", response_model=HistorySearchResponse)
+async def search_user_history(
+    user_id: AuthenticatedUserIdWithRLS,
+    q: str = Query(..., min_length=1, max_length=256, description="Web-search style query, e.g. 'climate -policy \"carbon tax\"'"),
+    limit: int = Query(20, ge=1, le=50),
+    cursor: Optional[str] = Query(None, description="nextCursor from the previous page"),
+):
+    """Full-text search over the authenticated user's summaries, ranked by relevance."""
+    if not q.strip():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Search query must not be empty.")
+    try:
+        page = await history_search_service.search(user_id, q, limit=limit, cursor=cursor)
+        return HistorySearchResponse(results=page.results, nextCursor=page.next_cursor)
+    except InvalidSearchCursor as e:
+        logger.warning(f"Invalid history search cursor for {user_id}: {e}")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor.")
+    except Exception as e:
+        logger.error(f"Error searching history for {user_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error searching summary history.")
+# --- END History Search Endpoint ---
+
+# --- Related Summaries Endpoints ---
+async def _related_results(user_id: str, scored: List[tuple]) -> List[RelatedSummaryResult]:
+    if not scored:
+        return []
+    items = await prisma.summaryhistory.find_many(where={"id": {"in": [item_id for item_id, _ in scored]}, "userId": user_id})
+    by_id = {item.id: item for item in items}
+    return [
+        RelatedSummaryResult(id=item_id, url=by_id[item_id].url, title=by_id[item_id].title, createdAt=by_id[item_id].createdAt, score=score)
+        for item_id, score in scored if item_id in by_id
+    ]
+
+@app.get("/api/history/related", response_model=List[RelatedSummaryResult])
+async def related_history_for_query(
+    user_id: AuthenticatedUserIdWithRLS,
+    q: str = Query(..., min_length=1, max_length=1000),
+    k: int = Query(10, ge=1, le=50),
+):
+    """Returns the authenticated user's summaries most similar to a free-text query."""
+    try:
+        scored = await embedding_index_service.related_to_query(user_id, q, k=k)
+        return await _related_results(user_id, scored)
+    except Exception as e:
+        logger.error(f"Error finding related summaries for query (user {user_id}): {e}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error finding related summaries.")
+
+@app.get("/api/history/{history_id}/related", response_model=List[RelatedSummaryResult])
+async def related_history_for_summary(
+    history_id: str,
+    user_id: AuthenticatedUserIdWithRLS,
+    k: int = Query(10, ge=1, le=50),
+):
+    """Returns the authenticated user's summaries most similar to the given summary."""
+    try:
+        scored = await embedding_index_service.related_to_summary(user_id, history_id, k=k)
+    except Exception as e:
+        logger.error(f"Error finding summaries related to {history_id} for user {user_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error finding related summaries.")
+    if scored is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="History item not found or access denied.")
+    return await _related_results(user_id, scored)
+# --- END Related Summaries Endpoints ---
+
+# --- History Export Endpoint ---
+@app.get("/api/history/export")
+async def export_user_history(
+    user_id: AuthenticatedUserIdWithRLS,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    gzip: bool = Query(False, description="Gzip the export stream"),
+):
+    """Streams the authenticated user's full summary history as NDJSON or CSV.
+
+    Rows are read in fixed-size keyset pages and written out as they arrive, so memory
+    use does not grow with the size of the history.
+    """
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"tildra-history-{datetime.now(timezone.utc).strftime('%Y%m%d')}.{extension}"
+    if gzip:
+        media_type = "application/gzip"
+        filename += ".gz"
+    logger.info(f"Starting history export for {user_id} (format={format}, gzip={gzip})")
+    return StreamingResponse(
+        history_export_service.stream(user_id, export_format=format, compress=gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+# --- END History Export Endpoint ---
+
+# --- History Item Detail Endpoint ---
+@app.get("/api/history/{history_id}", response_model=HistoryItemResponse)
+async def get_history_item(history_id: str, user_id: AuthenticatedUserIdWithRLS):
+    """Retrieves the full content of a single summary for the authenticated user."""
+    try:
+        item = await history_service.get_item(user_id, history_id)
+    except Exception as e:
+        logger.error(f"Error fetching history item {history_id} for {user_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error fetching history item.")
+    if not item:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="History item not found or access denied.")
+    return item
+# --- END History Item Detail Endpoint ---
+
 # --- ADDED: Delete Single History Item Endpoint ---
 @app.delete("/api/history/{history_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_single_history_item(history_id: str, user_id: AuthenticatedUserIdWithRLS): # MODIFIED for RLS
@@ -1100,6 +1261,15 @@ async def delete_single_history_item(history_id: str, user_id: AuthenticatedUser
         # If found and owned, proceed with deletion
         await prisma.summaryhistory.delete(where={"id": history_id})
         logger.info(f"Successfully deleted history item {history_id} for user {user_id}")
+        try:
+            await daily_stats_service.remove_summary(user_id, item_to_delete.model_dump())
+        except Exception as e:
+            logger.error(f"Error updating daily stats after deleting {history_id} for user {user_id}: {e}", exc_info=True)
+        try:
+            await goals_service.remove_summary(user_id, item_to_delete.model_dump())
+        except Exception as e:
+            logger.error(f"Error updating goal progress after deleting {history_id} for user {user_id}: {e}", exc_info=True)
+        analytics_cache.invalidate(user_id)
         # Return No Content on successful deletion
         return
 
@@ -1110,21 +1280,34 @@ async def delete_single_history_item(history_id: str, user_id: AuthenticatedUser
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error deleting history item.")
 
 # --- ADDED: Delete All History Items Endpoint ---
-@app.delete("/api/history", status_code=status.HTTP_204_NO_CONTENT)
+@app.delete("/api/history", status_code=status.HTTP_202_ACCEPTED, response_model=HistoryDeletionJobResponse)
 async def delete_all_user_history(user_id: AuthenticatedUserIdWithRLS): # MODIFIED for RLS
-    """Deletes all summary history items for the authenticated user."""
+    """Queues deletion of all summary history items for the authenticated user.
+
+    Rows are removed in small batches by a background worker; poll
+    /api/history/deletions/{job_id} for progress. Repeated calls return the active job.
+    """
     logger.info(f"Attempting to delete ALL history for user {user_id}")
     try:
-        await prisma.summaryhistory.delete_many(
-            where={"userId": user_id} # Delete only items belonging to this user
-        )
-        logger.info(f"Successfully deleted all history for user {user_id}")
-        # Return No Content on successful deletion
-        return
+        job = await history_deletion_service.enqueue(user_id, JOB_KIND_HISTORY)
+        history_deletion_worker.wake()
+        return _deletion_job_response(job)
 
     except Exception as e:
-        logger.error(f"Error deleting all history for user {user_id}: {e}", exc_info=True)
+        logger.error(f"Error queueing history deletion for user {user_id}: {e}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error clearing history.")
+
+@app.get("/api/history/deletions/{job_id}", response_model=HistoryDeletionJobResponse)
+async def get_history_deletion_job(job_id: str, user_id: AuthenticatedUserIdWithRLS):
+    """Reports progress of a bulk history deletion job."""
+    try:
+        job = await history_deletion_service.get_job(user_id, job_id)
+    except Exception as e:
+        logger.error(f"Error fetching deletion job {job_id} for user {user_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error fetching deletion job.")
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Deletion job not found.")
+    return _deletion_job_response(job)
 # --- END ADDED --- 
 
 # --- ADDED: User Settings Models and Endpoints ---
@@ -1201,63 +1384,30 @@ async def update_user_settings(
 # --- END ADDED ---
 
 # --- ADDED: Function to send welcome email via Brevo ---
-async def send_welcome_email(user_email: str, user_first_name: Optional[str], background_tasks: BackgroundTasks):
-    if not BREVO_API_KEY:
-        logger.error("BREVO_API_KEY not configured. Cannot send welcome email.")
-        return
-
+async def send_welcome_email(user_email: str, user_first_name: Optional[str], clerk_id: str):
+    """Queues the welcome email; the email worker sends it (see services/email_outbox.py)."""
     # Use a default if first name is not available
     first_name_greeting = user_first_name if user_first_name else "Friend" # Default for greeting if no first name
-    # frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000") # Not needed if HTML is in Brevo
 
     # --- MODIFIED FOR TEMPLATE ID ---
     template_id = 2 
     # Prepare params for Brevo template. Template uses {{params.userName}}
     params_payload = {"userName": first_name_greeting}
 
-    # The subject and HTML content are now defined in the Brevo template
-    # email_subject = f"Welcome to Tildra, {first_name_greeting}!"
-    # email_html_content = f"""...""" # Removed
-
+    # The subject and HTML content are defined in the Brevo template, so queued welcome
+    # emails share one batch send.
     payload = {
         "sender": {"name": SENDER_NAME, "email": SENDER_EMAIL}, # This can override template sender if needed
         "to": [{"email": user_email, "name": user_first_name if user_first_name else user_email}],
-        # "subject": email_subject, # Subject is now in the template
-        # "htmlContent": email_html_content, # HTML is now in the template
         "templateId": template_id,
         "params": params_payload
     }
     # --- END MODIFICATION ---
 
-    async def task():
-        logger.info(f"[Welcome Email Task EXECUTION STARTED] For {user_email}") # ADDED: Log at start of task execution
-        async with httpx.AsyncClient() as client:
-            try:
-                logger.info(f"[Welcome Email Task] Attempting to send email to {user_email} with template ID {template_id}. Payload: {json.dumps(payload)}") # Log payload
-                response = await client.post(
-                    BREVO_API_URL,
-                    headers={
-                        "api-key": BREVO_API_KEY,
-                        "Content-Type": "application/json",
-                        "Accept": "application/json",
-                    },
-                    json=payload,
-                    timeout=30.0 # Add a timeout
-                )
-                logger.info(f"[Welcome Email Task] Brevo API response status: {response.status_code} for {user_email}") # Log status code
-                response.raise_for_status()  # Raise an exception for HTTP errors (4xx or 5xx)
-                logger.info(f"[Welcome Email Task] Welcome email successfully sent to {user_email}. Message ID: {response.json().get('messageId')}")
-            except httpx.HTTPStatusError as e:
-                # Log the full response content for HTTPStatusError for more details
-                logger.error(f"[Welcome Email Task] HTTP error sending welcome email to {user_email}: {e.response.status_code} - {e.response.text}", exc_info=True)
-            except httpx.RequestError as e:
-                logger.error(f"[Welcome Email Task] Request error sending welcome email to {user_email}: {e}", exc_info=True)
-            except Exception as e:
-                logger.error(f"[Welcome Email Task] Unexpected error sending welcome email to {user_email}: {e}", exc_info=True)
-    
-    logger.info(f"[Welcome Email] About to add welcome email task for {user_email} to background.") # ADDED
-    background_tasks.add_task(task)
-    logger.info(f"[Welcome Email] Successfully added welcome email task for {user_email} to background.") # ADDED
+    # One welcome email per Clerk user, however often user.created is replayed
+    if await email_outbox.enqueue("welcome", payload, idempotency_key=f"welcome:{clerk_id}"):
+        email_worker.wake()
+        logger.info(f"[Welcome Email] Queued welcome email for {user_email}")
 # --- END ADDED ---
 
 # --- Helper function to call DeepSeek API ---
@@ -1403,6 +1553,8 @@ class ContactFormRequest(BaseModel):
     subject: str = Field(..., min_length=1, max_length=200)
     message: str = Field(..., min_length=10, max_length=2000)
     recipient: str = Field(default="tildra.help@gmail.com")
+    # Generated by the form once per message and reused on retries, so a retried request is queued once
+    submissionId: Optional[str] = Field(default=None, min_length=8, max_length=64, pattern=r"^[A-Za-z0-9_-]+$")
 
 # --- ADD Contact Form Endpoint ---
 @app.post("/api/contact")
@@ -1417,19 +1569,23 @@ async def contact_form(contact_request: ContactFormRequest):
         if not re.match(email_pattern, contact_request.email):
             raise HTTPException(status_code=400, detail="Invalid email format")
         
-        # Send email to support using Brevo (synchronously to catch errors)
-        await send_contact_form_email(
+        # Queue the email to support; the email worker sends it through Brevo
+        queued = await send_contact_form_email(
             contact_request.name,
             contact_request.email,
             contact_request.subject,
             contact_request.message,
-            contact_request.recipient
+            contact_request.recipient,
+            contact_request.submissionId,
         )
         
-        logger.info(f"Contact form submission sent from {contact_request.email} to {contact_request.recipient}")
+        if queued:
+            logger.info(f"Contact form submission queued from {contact_request.email} to {contact_request.recipient}")
         
         return {
             "success": True,
+            # True when this was a repeat of a submission that is already queued or sent
+            "duplicate": not queued,
             "message": "Your message has been sent successfully. We'll get back to you soon!"
         }
         
@@ -1475,8 +1631,8 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     )
 
 # --- ADD Contact Form Email Function ---
-async def send_contact_form_email(name: str, email: str, subject: str, message: str, recipient: str):
-    """Send contact form submission to support email"""
+async def send_contact_form_email(name: str, email: str, subject: str, message: str, recipient: str, submission_id: Optional[str] = None) -> bool:
+    """Queue contact form submission to support email. Returns False when it was a duplicate."""
     if not BREVO_API_KEY:
         logger.error("BREVO_API_KEY not configured. Cannot send contact form email.")
         raise HTTPException(status_code=500, detail="Email service not configured")
@@ -1549,37 +1705,22 @@ async def send_contact_form_email(name: str, email: str, subject: str, message:
         "htmlContent": email_html_content,
     }
 
-    try:
-        headers = {
-            "Accept": "application/json",
-            "Content-Type": "application/json",
-            "api-key": BREVO_API_KEY
-        }
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.post(BREVO_API_URL, json=payload, headers=headers)
-            response.raise_for_status()
-            logger.info(f"Contact form email sent successfully to {recipient}")
-            return True
-            
-    except httpx.HTTPStatusError as e:
-        logger.error(f"HTTP error sending contact form email: Status {e.response.status_code} - {e.response.text}")
-        raise HTTPException(status_code=500, detail=f"Email service error: {e.response.status_code}")
-    except httpx.RequestError as e:
-        logger.error(f"Request error sending contact form email: {str(e)}")
-        raise HTTPException(status_code=500, detail="Could not connect to email service")
-    except Exception as e:
-        logger.error(f"Unexpected error sending contact form email: {str(e)}")
-        raise HTTPException(status_code=500, detail="Failed to send email")
-
-# --- ADDED: Jinja2 Environment Setup ---
-# Assuming this main.py is in an 'api' subdirectory. Templates are in 'api/resume_templates/'
-template_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resume_templates")
-jinja_env = Environment(
-    loader=FileSystemLoader(template_dir),
-    autoescape=select_autoescape(['html', 'xml'])
-)
-# --- END ADDED ---
+    # Queued rather than sent inline, so the form returns without waiting on Brevo; the
+    # email worker retries failures. The form's submission id makes retries idempotent.
+    # Without one, an identical message is only deduplicated within the same minute
+    # (double clicks), so sending the same text again later still goes out.
+    if submission_id:
+        idempotency_key = f"contact:{submission_id}"
+    else:
+        minute = int(time.time() // 60)
+        content_key = hashlib.sha256(json.dumps([email, subject, message, recipient, minute]).encode()).hexdigest()
+        idempotency_key = f"contact:{content_key}"
+    if not await email_outbox.enqueue("contact", payload, idempotency_key=idempotency_key):
+        logger.warning(f"Contact form submission from {email} dropped as a duplicate of {idempotency_key}")
+        return False
+    email_worker.wake()
+    logger.info(f"Contact form email queued for {recipient}")
+    return True
 
 # --- Resume Models for PDF Generation (NEW) ---
 class ResumeContactInfo(BaseModel):
@@ -1620,95 +1761,206 @@ class ResumeDataRequest(BaseModel): # Renamed to avoid conflict if ResumeData is
     projects: Optional[List[ResumeProject]] = None
     template_name: Optional[str] = Field(default="modern_template.html", description="The filename of the HTML template to use (e.g., 'modern_template.html')")
 
+class ResumeBatchRequest(BaseModel):
+    resumes: List[ResumeDataRequest] = Field(..., min_length=1, max_length=PDF_BATCH_MAX_ITEMS)
+    # "zip": one archive with every PDF; "ids": per-item ids for GET /api/resume/pdf/{id}
+    output: str = Field("zip", pattern="^(zip|ids)$")
+
+class ResumePageBreak(BaseModel):
+    page: int  # The page the break starts
+    section: str
+    index: Optional[int] = None  # Entry within the section (job, degree, project)
+    splits: bool  # True when the entry continues across the break
+
+class ResumePreviewResponse(BaseModel):
+    templateName: str
+    html: str
+    estimatedPages: int
+    pageBreaks: List[ResumePageBreak]
+    fillOfLastPage: float
+
 # --- END Resume Models ---
 
+# Templates in api/resume_templates/, compiled and checked against ResumeDataRequest's fields at startup
+resume_templates = ResumeTemplateRegistry(data_fields=ResumeDataRequest.model_fields.keys())
+
 # --- ADDED: Resume PDF Generation Endpoint (NEW) ---
+def resume_pdf_filename(resume_name: str) -> str:
+    """<Name>_Resume.pdf with the name reduced to [A-Za-z0-9_.-] (accents dropped, "José" -> "Jose").
+
+    Safe as a zip entry and in Content-Disposition: no path separators, no leading dots.
+    """
+    ascii_name = unicodedata.normalize("NFKD", resume_name).encode("ascii", "ignore").decode("ascii")
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", ascii_name).strip("._")
+    return f"{safe_name}_Resume.pdf" if safe_name else "Resume.pdf"
+
+def resume_pdf_headers(resume_name: str) -> Dict[str, str]:
+    """Content-Disposition for a resume download."""
+    return {"Content-Disposition": f'attachment; filename="{resume_pdf_filename(resume_name)}"'}
+
 @app.post("/api/resume/generate-pdf")
 async def generate_resume_pdf(
     resume_data: ResumeDataRequest,
     user_id: AuthenticatedUserIdWithRLS, # For consistency and future use
-    # background_tasks: BackgroundTasks # Potentially for cleanup if not using tempfile context manager
 ):
     logger.info(f"Received PDF generation request for user {user_id} with template: {resume_data.template_name}")
 
     try:
-        # 1. Load the Jinja2 template
-        template = jinja_env.get_template(resume_data.template_name)
-    except Exception as e: # Catch Jinja2 specific TemplateNotFound if preferred
-        logger.error(f"Resume template '{resume_data.template_name}' not found. Error: {e}")
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Resume template '{resume_data.template_name}' not found.")
-
-    # 2. Render the HTML with resume data
-    # Pydantic models can be directly passed to Jinja2 if .model_dump() is called or accessed like attributes
-    rendered_html = template.render(resume_data.model_dump()) # Pass the dict representation
-
-    # 3. Use Playwright to convert HTML to PDF
-    # Note: Launching a browser per request is not optimal for high-load scenarios.
-    # Consider managing browser instances (e.g., pool, global instance per worker) in production.
-    async with async_playwright() as p:
-        browser = None # Initialize to ensure it's defined in finally block if launch fails
+        # 1. Look up the template; only templates that passed validation at startup exist
+        template = resume_templates.get(resume_data.template_name)
+    except UnknownTemplateError as e:
+        logger.error(f"Resume template '{resume_data.template_name}' not found.")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    # 2. Identical requests (same template file, same data) are served from the PDF cache
+    resume_dict = resume_data.model_dump(mode="json")
+    pdf_id = pdf_cache_key(template.name, template.mtime_ns, resume_dict)
+
+    async def render() -> bytes:
+        # Pydantic models can be directly passed to Jinja2 if .model_dump() is called or accessed like attributes
+        rendered_html = template.render(resume_dict) # Pass the dict representation
+        # Use Playwright to convert HTML to PDF, in memory on a warm page from the shared browser pool
+        return await pdf_pool.render(rendered_html)
+
+    try:
+        pdf_bytes, cached = await pdf_cache.get_or_render(user_id, pdf_id, render)
+    except PdfRendererBusy as e:
+        logger.warning(f"PDF renderer busy for user {user_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="PDF generation is busy, please try again shortly.",
+            headers={"Retry-After": "5"},
+        )
+    except Exception as e:
+        logger.error(f"Playwright PDF generation failed for user {user_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to generate PDF resume.")
+    logger.info(f"Resume PDF {pdf_id[:12]} for user {user_id} {'served from cache' if cached else 'rendered'}")
+
+    # 3. Return the PDF bytes directly; nothing is written to disk. Content-Location is where
+    # the same PDF can be downloaded again (GET, with If-None-Match) while it stays cached.
+    headers = {
+        **resume_pdf_headers(resume_data.name),
+        "ETag": pdf_etag(pdf_id),
+        "Cache-Control": "private, no-cache",
+        "Content-Location": f"/api/resume/pdf/{pdf_id}",
+    }
+    return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+
+
+@app.post("/api/resume/generate-pdf/batch")
+async def generate_resume_pdf_batch(
+    batch: ResumeBatchRequest,
+    user_id: AuthenticatedUserIdWithRLS,
+):
+    """Renders several resumes (e.g. one tailored variant per job) concurrently on the browser pool.
+
+    Returns a zip of the PDFs, or with output="ids" the cache id of each one for
+    GET /api/resume/pdf/{id}. Items already in the PDF cache are not rendered again.
+    """
+    if batch.output == "ids" and not pdf_cache.enabled:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="PDF downloads by id are unavailable; request output=\"zip\" instead.",
+        )
+    items = []
+    for i, resume_data in enumerate(batch.resumes):
         try:
-            browser = await p.chromium.launch(
-                args=['--no-sandbox', '--disable-setuid-sandbox'] # Common args for Docker/CI
-            )
-            page = await browser.new_page()
-            
-            # Using a temporary file to serve the HTML to Playwright to handle local resources (CSS, images) if any
-            # and to ensure content is properly encoded.
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".html", mode="w", encoding="utf-8") as temp_html_file:
-                temp_html_file.write(rendered_html)
-                temp_html_file_path = temp_html_file.name
-            
-            await page.goto(f"file://{temp_html_file_path}", wait_until="networkidle") # networkidle or domcontentloaded
-            
-            # Define PDF options for better print quality
-            pdf_options = {
-                "format": "Letter", # or "A4"
-                "print_background": True,
-                "margin": {
-                    "top": "0.5in",
-                    "bottom": "0.5in",
-                    "left": "0.5in",
-                    "right": "0.5in"
+            template = resume_templates.get(resume_data.template_name)
+        except UnknownTemplateError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"resumes[{i}]: {e}")
+        resume_dict = resume_data.model_dump(mode="json")
+
+        async def render(template=template, resume_dict=resume_dict) -> bytes:
+            return await pdf_pool.render(template.render(resume_dict))
+
+        items.append(BatchItem(
+            key=pdf_cache_key(template.name, template.mtime_ns, resume_dict),
+            # Numbered, since variants of one resume share the name
+            filename=f"{i + 1:02d}_{resume_pdf_filename(resume_data.name)}",
+            render=render,
+        ))
+    logger.info(f"Received batch PDF request for user {user_id}: {len(items)} resumes, output={batch.output}")
+
+    results = await render_batch(pdf_cache, user_id, items)
+
+    if batch.output == "ids":
+        return {
+            "items": [
+                {
+                    "id": r.key,
+                    "status": "ready" if r.ok else "busy" if r.busy else "failed",
+                    "cached": r.cached,
+                    "url": f"/api/resume/pdf/{r.key}" if r.ok else None,
+                    "error": r.error,
                 }
-            }
-            pdf_bytes = await page.pdf(pdf_options)
+                for r in results
+            ]
+        }
+    # A zip is all or nothing; the PDFs that did render are cached, so a retry is quick
+    if any(r.busy for r in results):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="PDF generation is busy, please try again shortly.",
+            headers={"Retry-After": "5"},
+        )
+    if not all(r.ok for r in results):
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to generate PDF resumes.")
+    return Response(
+        content=zip_pdfs(results),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="Resumes.zip"', "Cache-Control": "private, no-store"},
+    )
 
-        except Exception as e:
-            logger.error(f"Playwright PDF generation failed for user {user_id}: {e}", exc_info=True)
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to generate PDF resume.")
-        finally:
-            if browser:
-                await browser.close()
-            if 'temp_html_file_path' in locals() and os.path.exists(temp_html_file_path):
-                 os.unlink(temp_html_file_path) # Clean up the temporary HTML file
-
-    # 4. Save PDF to a temporary file to be sent via FileResponse
-    # FileResponse needs a file path. We'll use a temporary file.
-    # tempfile.NamedTemporaryFile is a good way to handle this.
-    # It will be deleted automatically when closed if delete=True (default).
-    # We use delete=False and clean up manually because FileResponse needs the file to exist when it reads it.
-    # An alternative is StreamingResponse with BytesIO, but FileResponse is often simpler for actual files.
-
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_pdf:
-        tmp_pdf.write(pdf_bytes)
-        temp_pdf_path = tmp_pdf.name
-
-    # Use BackgroundTasks to clean up the temp PDF file after the response is sent.
-    # background_tasks.add_task(os.unlink, temp_pdf_path)
-    # For simplicity in this step, we'll return and expect the OS to clean up /tmp or handle manual cleanup.
-    # A better approach for robust cleanup with FileResponse is a custom response class or explicit cleanup.
-    # For now, returning the path and letting it be. Or, even better, use StreamingResponse.
-
-    # Let's use StreamingResponse with BytesIO for cleaner handling without manual temp file cleanup issues for the PDF.
-    import io
-    return FileResponse(
-        path=temp_pdf_path,
-        filename=f"{resume_data.name.replace(' ', '_')}_Resume.pdf",
-        media_type='application/pdf',
-        background=BackgroundTasks([lambda: os.unlink(temp_pdf_path)]) # Ensure cleanup
+
+@app.post("/api/resume/preview", response_model=ResumePreviewResponse)
+def preview_resume(
+    resume_data: ResumeDataRequest,
+    user_id: AuthenticatedUserIdWithRLS,
+):
+    """Rendered HTML and estimated page breaks for live editing, without a browser.
+
+    The editor calls this as the user types; generate-pdf is only needed for the export.
+    """
+    try:
+        template = resume_templates.get(resume_data.template_name)
+    except UnknownTemplateError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    resume_dict = resume_data.model_dump(mode="json")
+    return ResumePreviewResponse(templateName=template.name, html=template.render(resume_dict), **estimate_layout(resume_dict))
+
+
+@app.get("/api/resume/templates")
+def list_resume_templates():
+    """Names of the templates generate-pdf and preview accept."""
+    return {"templates": resume_templates.names()}
+
+
+@app.get("/api/resume/pdf/{pdf_id}")
+async def download_resume_pdf(
+    pdf_id: str,
+    user_id: AuthenticatedUserIdWithRLS,
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+):
+    """Re-downloads a PDF from the cache by the id in generate-pdf's Content-Location.
+
+    Only the user who generated the PDF can download it; for anyone else it does not exist.
+    """
+    if not re.fullmatch(r"[0-9a-f]{64}", pdf_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Resume PDF not found.")
+    headers = {"ETag": pdf_etag(pdf_id), "Cache-Control": "private, no-cache"}
+    # The id is a hash of the content, so a matching ETag is valid even if the file was evicted
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    pdf_bytes = await pdf_cache.get(user_id, pdf_id)
+    if pdf_bytes is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Resume PDF not found. Generate it again.")
+    return Response(
+        content=pdf_bytes,
+        media_type="application/pdf",
+        headers={**headers, "Content-Disposition": f'attachment; filename="Resume_{pdf_id[:12]}.pdf"'},
     )
 
+
 # --- END ADDED ---
 
 # --- Job Copilot Endpoints ---
@@ -2200,199 +2452,78 @@ class InsightDataResponse(BaseModel):
     priority: str
     icon: Optional[str] = None
 
+def _analytics_response(cached: CachedPayload, if_none_match: Optional[str]) -> Response:
+    # no-cache: the browser may store the payload but must revalidate it with If-None-Match
+    headers = {"ETag": cached.etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, cached.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return JSONResponse(content=cached.payload, headers=headers)
+
 @app.get("/api/analytics/metrics", response_model=AnalyticsMetricsResponse)
-async def get_analytics_metrics(user_id: AuthenticatedUserIdWithRLS):
-    """Get comprehensive analytics metrics for the authenticated user."""
-    try:
-        logger.info(f"Fetching analytics metrics for user: {user_id}")
-        
-        # Get user data
+async def get_analytics_metrics(
+    user_id: AuthenticatedUserIdWithRLS,
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+):
+    """Get comprehensive analytics metrics for the authenticated user.
+
+    Payloads are cached per user until they save or delete a summary (or the UTC day
+    changes); responses carry an ETag, and a matching If-None-Match returns 304.
+    """
+    async def compute():
         user = await prisma.user.find_unique(where={"clerkId": user_id})
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
+        # summary_history.userId holds the Clerk id; every aggregate is computed in Postgres
+        metrics = await analytics_service.compute_metrics(user_id)
+        return AnalyticsMetricsResponse(**metrics).model_dump()
+
+    try:
+        logger.info(f"Fetching analytics metrics for user: {user_id}")
+        cached = await analytics_cache.get_or_compute(user_id, "metrics", compute)
+        return _analytics_response(cached, if_none_match)
         
-        # Get all summaries for the user
-        summaries = await prisma.summaryhistory.find_many(
-            where={"userId": user.id},
-            order_by={"createdAt": "desc"}
-        )
-        
-        # Get current date boundaries
-        now = datetime.now(timezone.utc)
-        week_ago = now - timedelta(days=7)
-        month_ago = now - timedelta(days=30)
-        
-        # Calculate metrics
-        total_summaries = len(summaries)
-        
-        # Calculate time saved (estimated based on word count reduction)
-        total_time_saved = 0
-        weekly_time_saved = 0
-        monthly_time_saved = 0
-        category_stats = {}
-        
-        for summary in summaries:
-            # Estimate original word count (rough estimate based on URL and typical article lengths)
-            estimated_original_words = 800  # Average article length
-            summary_words = len(summary.tldr.split()) + sum(len(point.split()) for point in summary.keyPoints)
-            
-            # Estimate time saved (200 words per minute reading speed)
-            time_saved = max(0, (estimated_original_words - summary_words) / 200 * 60)  # in minutes
-            total_time_saved += time_saved
-            
-            # Weekly time saved
-            if summary.createdAt >= week_ago:
-                weekly_time_saved += time_saved
-                
-            # Monthly time saved
-            if summary.createdAt >= month_ago:
-                monthly_time_saved += time_saved
-            
-            # Category analysis (basic categorization based on URL domain)
-            category = "General"
-            if summary.url:
-                domain = summary.url.split("//")[-1].split("/")[0].lower()
-                if any(tech in domain for tech in ['github', 'stackoverflow', 'dev.to', 'medium']):
-                    category = "Technology"
-                elif any(news in domain for news in ['news', 'cnn', 'bbc', 'reuters']):
-                    category = "News"
-                elif any(biz in domain for biz in ['business', 'forbes', 'wsj', 'bloomberg']):
-                    category = "Business"
-                elif any(sci in domain for sci in ['science', 'nature', 'arxiv']):
-                    category = "Science"
-            
-            if category not in category_stats:
-                category_stats[category] = {"count": 0, "timeSaved": 0, "averageLength": 0}
-            category_stats[category]["count"] += 1
-            category_stats[category]["timeSaved"] += time_saved
-            category_stats[category]["averageLength"] += len(summary.tldr.split())
-        
-        # Calculate averages for categories
-        top_categories = []
-        for category, stats in category_stats.items():
-            if stats["count"] > 0:
-                stats["averageLength"] = stats["averageLength"] / stats["count"]
-            top_categories.append({
-                "category": category,
-                "count": stats["count"],
-                "timeSaved": stats["timeSaved"],
-                "averageLength": stats["averageLength"]
-            })
-        
-        # Sort by count
-        top_categories.sort(key=lambda x: x["count"], reverse=True)
-        
-        # Calculate reading time reduction percentage
-        avg_reduction = 75 if total_summaries > 0 else 0  # Rough estimate
-        
-        # Calculate productivity score (0-100)
-        productivity_score = min(100, max(0, int(
-            (weekly_time_saved / 60) * 10 +  # 10 points per hour saved weekly
-            (total_summaries / 10) * 5 +     # 5 points per 10 summaries
-            (len([s for s in summaries if s.createdAt >= week_ago]) / 7) * 15  # Daily consistency
-        )))
-        
-        # Calculate streak (simplified - consecutive days with summaries)
-        streak_days = 0
-        current_date = now.date()
-        for i in range(30):  # Check last 30 days
-            check_date = current_date - timedelta(days=i)
-            has_summary = any(s.createdAt.date() == check_date for s in summaries)
-            if has_summary:
-                streak_days += 1
-            else:
-                break
-        
-        # Generate weekly/monthly data for charts
-        weekly_data = []
-        for i in range(7):
-            week_start = now - timedelta(days=6-i)
-            week_summaries = [s for s in summaries if week_start.date() <= s.createdAt.date() < (week_start + timedelta(days=1)).date()]
-            week_time_saved = sum((800 - len(s.tldr.split()) - sum(len(p.split()) for p in s.keyPoints)) / 200 * 60 
-                                 for s in week_summaries)
-            weekly_data.append({
-                "week": week_start.strftime("%a"),
-                "summaries": len(week_summaries),
-                "timeSaved": max(0, week_time_saved),
-                "avgWordsReduced": 400 if week_summaries else 0
-            })
-        
-        monthly_data = []
-        for i in range(6):  # Last 6 months
-            month_start = (now.replace(day=1) - timedelta(days=30*i)).replace(day=1)
-            month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-            month_summaries = [s for s in summaries if month_start <= s.createdAt <= month_end]
-            month_time_saved = sum((800 - len(s.tldr.split()) - sum(len(p.split()) for p in s.keyPoints)) / 200 * 60 
-                                  for s in month_summaries)
-            monthly_data.append({
-                "month": month_start.strftime("%b"),
-                "summaries": len(month_summaries),
-                "timeSaved": max(0, month_time_saved),
-                "avgWordsReduced": 400 if month_summaries else 0
-            })
-        
-        monthly_data.reverse()  # Show oldest to newest
-        
-        return AnalyticsMetricsResponse(
-            totalTimeSaved=total_time_saved,
-            totalSummaries=total_summaries,
-            averageReadingTimeReduction=avg_reduction,
-            weeklyTimeSaved=weekly_time_saved,
-            monthlyTimeSaved=monthly_time_saved,
-            productivityScore=productivity_score,
-            streakDays=streak_days,
-            topCategories=top_categories,
-            weeklyData=weekly_data,
-            monthlyData=monthly_data
-        )
-        
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Analytics metrics error for user {user_id}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to get analytics metrics: {str(e)}")
 
 @app.get("/api/analytics/insights", response_model=List[InsightDataResponse])
-async def get_analytics_insights(user_id: AuthenticatedUserIdWithRLS):
-    """Get personalized insights for the authenticated user."""
+async def get_analytics_insights(
+    user_id: AuthenticatedUserIdWithRLS,
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+):
+    """Get personalized insights for the authenticated user (cached like /api/analytics/metrics).
+
+    Insights are precomputed from the analytics rollups by the insights worker
+    (services/insights.py), so this is a single primary-key read.
+    """
+    async def compute():
+        insights = await insights_service.get_insights(user_id)
+        return [InsightDataResponse(**insight).model_dump() for insight in insights]
+
     try:
         logger.info(f"Fetching analytics insights for user: {user_id}")
-        
-        # For now, return static insights - this would be enhanced with real data analysis
-        insights = [
-            InsightDataResponse(
-                type="time_saved",
-                title="Great progress this week!",
-                description="You've saved significant time with your summaries. Keep up the consistent usage.",
-                value=120.0,
-                trend="up",
-                actionable="Try summarizing longer articles to maximize your time savings.",
-                priority="medium",
-                icon="clock"
-            ),
-            InsightDataResponse(
-                type="efficiency_tip",
-                title="Optimize your reading workflow",
-                description="You tend to summarize shorter content. Longer articles yield better time savings.",
-                actionable="Focus on articles over 1000 words for maximum efficiency gains.",
-                priority="high",
-                icon="lightbulb"
-            )
-        ]
-        
-        return insights
+        cached = await analytics_cache.get_or_compute(user_id, "insights", compute)
+        return _analytics_response(cached, if_none_match)
         
     except Exception as e:
         logger.error(f"Analytics insights error for user {user_id}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to get analytics insights: {str(e)}")
 
+def _goal_response(goal: Dict[str, Any]) -> UserGoalResponse:
+    return UserGoalResponse(**{**goal, "current": round(goal["current"])})
+
 @app.get("/api/goals", response_model=List[UserGoalResponse])
 async def get_user_goals(user_id: AuthenticatedUserIdWithRLS):
-    """Get all goals for the authenticated user."""
+    """Get all goals for the authenticated user.
+
+    Progress is kept up to date as summaries are saved and deleted, so this is a
+    single indexed read of the user's goal rows.
+    """
     try:
         logger.info(f"Fetching goals for user: {user_id}")
-        
-        # For now, return empty list - would need to add goals table to schema
-        # This is a placeholder implementation
-        return []
+        return [_goal_response(goal) for goal in await goals_service.list_goals(user_id)]
         
     except Exception as e:
         logger.error(f"Get goals error for user {user_id}: {e}", exc_info=True)
@@ -2400,25 +2531,14 @@ async def get_user_goals(user_id: AuthenticatedUserIdWithRLS):
 
 @app.post("/api/goals", response_model=UserGoalResponse)
 async def create_user_goal(goal_data: UserGoalCreateRequest, user_id: AuthenticatedUserIdWithRLS):
-    """Create a new goal for the authenticated user."""
+    """Create a new goal for the authenticated user, starting from their progress so far this period."""
     try:
         logger.info(f"Creating goal for user: {user_id}")
+        goal = await goals_service.create_goal(user_id, goal_data.type, goal_data.target, goal_data.period)
+        return _goal_response(goal)
         
-        # Placeholder implementation - would need goals table
-        mock_goal = UserGoalResponse(
-            id="mock_goal_id",
-            userId=user_id,
-            type=goal_data.type,
-            target=goal_data.target,
-            current=0,
-            period=goal_data.period,
-            createdAt=datetime.now(timezone.utc),
-            updatedAt=datetime.now(timezone.utc),
-            isActive=True
-        )
-        
-        return mock_goal
-        
+    except InvalidGoal as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"Create goal error for user {user_id}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to create goal: {str(e)}")
@@ -2428,22 +2548,15 @@ async def update_user_goal(goal_id: str, goal_updates: UserGoalUpdateRequest, us
     """Update a goal for the authenticated user."""
     try:
         logger.info(f"Updating goal {goal_id} for user: {user_id}")
+        goal = await goals_service.update_goal(user_id, goal_id, goal_updates.target, goal_updates.isActive)
+        if goal is None:
+            raise HTTPException(status_code=404, detail="Goal not found")
+        return _goal_response(goal)
         
-        # Placeholder implementation
-        mock_goal = UserGoalResponse(
-            id=goal_id,
-            userId=user_id,
-            type="daily_summaries",
-            target=goal_updates.target or 5,
-            current=0,
-            period="daily",
-            createdAt=datetime.now(timezone.utc) - timedelta(days=1),
-            updatedAt=datetime.now(timezone.utc),
-            isActive=goal_updates.isActive if goal_updates.isActive is not None else True
-        )
-        
-        return mock_goal
-        
+    except InvalidGoal as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Update goal error for user {user_id}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to update goal: {str(e)}")
@@ -2453,10 +2566,12 @@ async def delete_user_goal(goal_id: str, user_id: AuthenticatedUserIdWithRLS):
     """Delete a goal for the authenticated user."""
     try:
         logger.info(f"Deleting goal {goal_id} for user: {user_id}")
-        
-        # Placeholder implementation - would delete from goals table
+        if not await goals_service.delete_goal(user_id, goal_id):
+            raise HTTPException(status_code=404, detail="Goal not found")
         return
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Delete goal error for user {user_id}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Failed to delete goal: {str(e)}")
@@ -0,0 +1,155 @@
+"""
+Analytics Service - Dashboard metrics read from the per-user daily rollups
+
+Metrics are aggregated from user_daily_stats (see services/daily_stats.py), which is
+maintained as summaries are saved and deleted, so a dashboard load reads O(active days)
+rows no matter how large the user's history is.
+"""
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ESTIMATED_ORIGINAL_WORDS = 800   # Average article length used for time-saved estimates
+READING_WORDS_PER_MINUTE = 200
+ASSUMED_READING_TIME_REDUCTION = 75
+STREAK_LOOKBACK_DAYS = 30
+WEEKLY_CHART_DAYS = 7
+MONTHLY_CHART_MONTHS = 6
+
+
+def summary_word_count(tldr: str, key_points: List[str]) -> int:
+    return len(tldr.split()) + sum(len(point.split()) for point in key_points)
+
+
+def estimate_time_saved(summary_words: int, original_words: Optional[int] = None) -> float:
+    """Minutes saved by reading the summary instead of the article.
+
+    Summaries saved before article lengths were recorded assume an average-length article.
+    """
+    original_words = original_words or ESTIMATED_ORIGINAL_WORDS
+    return max(0.0, (original_words - summary_words) / READING_WORDS_PER_MINUTE * 60)
+
+
+# $2 is "today" (UTC). Weekly/monthly windows are whole days: today and the 6 / 29 before it.
+METRICS_SQL = f"""
+WITH stats AS MATERIALIZED (
+    SELECT day, category, "summaryCount" AS n, "wordsProduced" AS words, "timeSaved" AS saved
+    FROM user_daily_stats
+    WHERE "userId" = $1 AND "summaryCount" > 0
+)
+SELECT
+    (SELECT json_build_object(
+        'total', COALESCE(SUM(n), 0),
+        'timeSaved', COALESCE(SUM(saved), 0),
+        'weekCount', COALESCE(SUM(n) FILTER (WHERE day > $2::date - 7), 0),
+        'weekTimeSaved', COALESCE(SUM(saved) FILTER (WHERE day > $2::date - 7), 0),
+        'monthTimeSaved', COALESCE(SUM(saved) FILTER (WHERE day > $2::date - 30), 0)
+    ) FROM stats) AS totals,
+    (SELECT COALESCE(json_agg(c ORDER BY c.count DESC, c.category), '[]'::json) FROM (
+        SELECT category, SUM(n) AS count, SUM(saved) AS "timeSaved", SUM(words)::float / SUM(n) AS "averageLength"
+        FROM stats GROUP BY category
+    ) c) AS categories,
+    (SELECT COALESCE(json_agg(d), '[]'::json) FROM (
+        SELECT to_char(day, 'YYYY-MM-DD') AS day, SUM(n) AS summaries, SUM(saved) AS "timeSaved"
+        FROM stats
+        WHERE day > $2::date - {WEEKLY_CHART_DAYS}
+        GROUP BY day
+    ) d) AS days,
+    (SELECT COALESCE(json_agg(m), '[]'::json) FROM (
+        SELECT to_char(date_trunc('month', day), 'YYYY-MM') AS month, SUM(n) AS summaries, SUM(saved) AS "timeSaved"
+        FROM stats
+        WHERE day >= date_trunc('month', $2::date) - INTERVAL '{MONTHLY_CHART_MONTHS - 1} months'
+        GROUP BY 1
+    ) m) AS months,
+    -- Gaps-and-islands: consecutive days ending today share day + row_number().
+    (SELECT COUNT(*) FROM (
+        SELECT day + (ROW_NUMBER() OVER (ORDER BY day DESC))::int AS island
+        FROM (
+            SELECT DISTINCT day FROM stats
+            WHERE day > $2::date - {STREAK_LOOKBACK_DAYS}
+        ) active_days
+    ) islands WHERE island = $2::date + 1) AS streak
+"""
+
+
+def _json(value: Any) -> Any:
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def _month_starts(now: datetime, months: int) -> List[datetime]:
+    starts = []
+    year, month = now.year, now.month
+    for _ in range(months):
+        starts.append(datetime(year, month, 1, tzinfo=timezone.utc))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return list(reversed(starts))  # Oldest to newest
+
+
+class AnalyticsService:
+    """Computes the /api/analytics/metrics payload from daily rollup rows"""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def compute_metrics(self, user_id: str, now: Optional[datetime] = None) -> Dict[str, Any]:
+        now = now or datetime.now(timezone.utc)
+        rows = await self.db.query_raw(METRICS_SQL, user_id, now.date().isoformat())
+        row = rows[0]
+        totals = _json(row["totals"])
+        categories = _json(row["categories"]) or []
+        days = {d["day"]: d for d in _json(row["days"]) or []}
+        months = {m["month"]: m for m in _json(row["months"]) or []}
+
+        total_summaries = int(totals["total"])
+        weekly_time_saved = float(totals["weekTimeSaved"])
+
+        productivity_score = min(100, max(0, int(
+            (weekly_time_saved / 60) * 10 +         # 10 points per hour saved weekly
+            (total_summaries / 10) * 5 +            # 5 points per 10 summaries
+            (int(totals["weekCount"]) / 7) * 15     # Daily consistency
+        )))
+
+        weekly_data = []
+        for i in range(WEEKLY_CHART_DAYS):
+            day = now - timedelta(days=WEEKLY_CHART_DAYS - 1 - i)
+            bucket = days.get(day.strftime("%Y-%m-%d"))
+            weekly_data.append({
+                "week": day.strftime("%a"),
+                "summaries": int(bucket["summaries"]) if bucket else 0,
+                "timeSaved": float(bucket["timeSaved"]) if bucket else 0.0,
+                "avgWordsReduced": 400 if bucket else 0,
+            })
+
+        monthly_data = []
+        for month_start in _month_starts(now, MONTHLY_CHART_MONTHS):
+            bucket = months.get(month_start.strftime("%Y-%m"))
+            monthly_data.append({
+                "month": month_start.strftime("%b"),
+                "summaries": int(bucket["summaries"]) if bucket else 0,
+                "timeSaved": float(bucket["timeSaved"]) if bucket else 0.0,
+                "avgWordsReduced": 400 if bucket else 0,
+            })
+
+        return {
+            "totalTimeSaved": float(totals["timeSaved"]),
+            "totalSummaries": total_summaries,
+            "averageReadingTimeReduction": ASSUMED_READING_TIME_REDUCTION if total_summaries > 0 else 0,
+            "weeklyTimeSaved": weekly_time_saved,
+            "monthlyTimeSaved": float(totals["monthTimeSaved"]),
+            "productivityScore": productivity_score,
+            "streakDays": int(row["streak"]),
+            "topCategories": [
+                {
+                    "category": c["category"],
+                    "count": int(c["count"]),
+                    "timeSaved": float(c["timeSaved"]),
+                    "averageLength": float(c["averageLength"] or 0),
+                }
+                for c in categories
+            ],
+            "weeklyData": weekly_data,
+            "monthlyData": monthly_data,
+        }
@@ -0,0 +1,105 @@
+"""
+Analytics Cache - Per-user cache of computed analytics payloads with write-triggered invalidation
+"""
+import hashlib
+import itertools
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, NamedTuple, Optional
+
+from cachetools import LRUCache, TTLCache
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_CACHE_MAX_USERS = int(os.getenv("ANALYTICS_CACHE_MAX_USERS", "10000"))
+# Entries are dropped on the user's own writes and at UTC midnight. The TTL only bounds how
+# long another machine's write can go unnoticed when several instances are running.
+ANALYTICS_CACHE_TTL_SECONDS = int(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", "900"))
+
+cache_requests = registry.counter(
+    "analytics_cache_requests_total",
+    "Analytics payload lookups by kind and result (hit/miss).",
+    ["kind", "result"],
+)
+recompute_seconds = registry.histogram(
+    "analytics_cache_recompute_seconds",
+    "Time spent recomputing an analytics payload on a cache miss.",
+    ["kind"],
+)
+
+
+class CachedPayload(NamedTuple):
+    payload: Any
+    etag: str
+    day: str
+
+
+def compute_etag(payload: Any) -> str:
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return '"' + hashlib.sha256(body.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison, as RFC 9110 specifies for If-None-Match
+    return "*" in candidates or etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+class _Generations(LRUCache):
+    """user_id -> generation of the last invalidation, remembering the newest one evicted.
+
+    A user whose generation was evicted is treated as invalidated at `floor`, so an
+    in-flight computation is never stored over an invalidation the cache has forgotten.
+    """
+
+    floor = 0
+
+    def popitem(self):
+        user_id, generation = super().popitem()
+        self.floor = max(self.floor, generation)
+        return user_id, generation
+
+
+class AnalyticsCache:
+    """Caches one payload per (user, kind), e.g. ("user_123", "metrics")"""
+
+    def __init__(self, max_users: int = ANALYTICS_CACHE_MAX_USERS, ttl_seconds: int = ANALYTICS_CACHE_TTL_SECONDS):
+        self._entries: TTLCache = TTLCache(maxsize=max_users, ttl=ttl_seconds)  # user_id -> {kind: CachedPayload}
+        # Generation of each user's last invalidation. A computation that started before an
+        # invalidation must not be stored afterwards, or the cache would hold pre-write data.
+        self._invalidations = _Generations(maxsize=max_users)
+        self._clock = itertools.count(1)
+
+    async def get_or_compute(self, user_id: str, kind: str, compute: Callable[[], Awaitable[Any]]) -> CachedPayload:
+        today = datetime.now(timezone.utc).date().isoformat()
+        entry = self._entries.get(user_id, {}).get(kind)
+        if entry is not None and entry.day == today:
+            cache_requests.inc(kind=kind, result="hit")
+            return entry
+
+        cache_requests.inc(kind=kind, result="miss")
+        generation = next(self._clock)
+        start = time.perf_counter()
+        payload = await compute()
+        recompute_seconds.observe(time.perf_counter() - start, kind=kind)
+
+        entry = CachedPayload(payload, compute_etag(payload), today)
+        if self._invalidations.get(user_id, self._invalidations.floor) < generation:
+            kinds = {k: v for k, v in self._entries.get(user_id, {}).items() if v.day == today}
+            kinds[kind] = entry
+            self._entries[user_id] = kinds
+        return entry
+
+    def invalidate(self, user_id: str) -> None:
+        self._invalidations[user_id] = next(self._clock)
+        self._entries.pop(user_id, None)
+
+
+analytics_cache = AnalyticsCache()
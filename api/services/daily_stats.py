@@ -0,0 +1,209 @@
+"""
+Daily Stats Service - Incrementally maintained per-user, per-day, per-category rollups
+
+Every saved summary adds one row's worth of counts to user_daily_stats and every deleted
+summary takes it away again, so analytics never has to scan summary_history.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from .analytics import estimate_time_saved
+from .summary_metrics import compute_summary_metrics
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_USER_PAGE_SIZE = 200
+BACKFILL_ROW_PAGE_SIZE = 2000
+
+UPSERT_SQL = """
+INSERT INTO user_daily_stats ("userId", day, category, "summaryCount", "wordsProduced", "timeSaved", "updatedAt")
+VALUES ($1, $2::date, $3, 1, $4, $5, NOW())
+ON CONFLICT ("userId", day, category) DO UPDATE SET
+    "summaryCount" = user_daily_stats."summaryCount" + 1,
+    "wordsProduced" = user_daily_stats."wordsProduced" + EXCLUDED."wordsProduced",
+    "timeSaved" = user_daily_stats."timeSaved" + EXCLUDED."timeSaved",
+    "updatedAt" = NOW()
+"""
+
+DECREMENT_SQL = """
+UPDATE user_daily_stats SET
+    "summaryCount" = GREATEST("summaryCount" - 1, 0),
+    "wordsProduced" = GREATEST("wordsProduced" - $4, 0),
+    "timeSaved" = GREATEST("timeSaved" - $5, 0),
+    "updatedAt" = NOW()
+WHERE "userId" = $1 AND day = $2::date AND category = $3
+"""
+
+# Backfill writes one user's complete set of rollups in a single statement, replacing
+# whatever was there, so re-running it is safe.
+REPLACE_SQL = """
+INSERT INTO user_daily_stats ("userId", day, category, "summaryCount", "wordsProduced", "timeSaved", "updatedAt")
+SELECT $1, r.day, r.category, r.summary_count, r.words_produced, r.time_saved, NOW()
+FROM unnest($2::date[], $3::text[], $4::int[], $5::int[], $6::float8[])
+    AS r(day, category, summary_count, words_produced, time_saved)
+ON CONFLICT ("userId", day, category) DO UPDATE SET
+    "summaryCount" = EXCLUDED."summaryCount",
+    "wordsProduced" = EXCLUDED."wordsProduced",
+    "timeSaved" = EXCLUDED."timeSaved",
+    "updatedAt" = NOW()
+"""
+
+Contribution = Tuple[str, str, int, float]  # (day, category, words, time saved)
+
+
+def utc_day(created_at: Any) -> str:
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+    if isinstance(created_at, datetime):
+        if created_at.tzinfo is not None:
+            created_at = created_at.astimezone(timezone.utc)
+        return created_at.date().isoformat()
+    if isinstance(created_at, date):
+        return created_at.isoformat()
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def summary_contribution(
+    created_at: Any,
+    category: str,
+    summary_words: int,
+    original_words: Optional[int] = None,
+) -> Contribution:
+    """What one summary adds to its (day, category) rollup row."""
+    return utc_day(created_at), category, summary_words, estimate_time_saved(summary_words, original_words)
+
+
+def row_contribution(row: Dict[str, Any]) -> Contribution:
+    """Contribution of a summary_history row, using its stored metric columns when present."""
+    if row.get("summaryWordCount") is None or not row.get("category"):
+        metrics = compute_summary_metrics(row.get("url"), row["tldr"], row.get("keyPoints") or [])
+        return summary_contribution(row["createdAt"], metrics["category"], metrics["summaryWordCount"])
+    return summary_contribution(row["createdAt"], row["category"], row["summaryWordCount"], row.get("originalWordCount"))
+
+
+class DailyStatsService:
+    """Keeps user_daily_stats in step with summary_history"""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def record_summary(
+        self,
+        user_id: str,
+        created_at: Any,
+        category: str,
+        summary_words: int,
+        original_words: Optional[int] = None,
+    ) -> None:
+        day, category, words, time_saved = summary_contribution(created_at, category, summary_words, original_words)
+        await self.db.execute_raw(UPSERT_SQL, user_id, day, category, words, time_saved)
+
+    async def remove_summary(self, user_id: str, summary: Dict[str, Any]) -> None:
+        """Subtracts a deleted summary_history row (as a dict) from its rollup row."""
+        day, category, words, time_saved = row_contribution(summary)
+        await self.db.execute_raw(DECREMENT_SQL, user_id, day, category, words, time_saved)
+        await self.db.execute_raw(
+            'DELETE FROM user_daily_stats WHERE "userId" = $1 AND day = $2::date AND category = $3 AND "summaryCount" = 0',
+            user_id,
+            day,
+            category,
+        )
+
+    async def clear_user(self, user_id: str) -> int:
+        return await self.db.execute_raw('DELETE FROM user_daily_stats WHERE "userId" = $1', user_id)
+
+    async def rebuild_user(self, user_id: str) -> int:
+        """Recomputes a user's rollups from their summary history. Returns rows aggregated."""
+        buckets: Dict[Tuple[str, str], List[float]] = defaultdict(lambda: [0, 0, 0.0])
+        scanned = 0
+        last_id = ""
+        while True:
+            rows = await self.db.query_raw(
+                """
+                SELECT id, url, tldr, key_points AS "keyPoints", "createdAt", category,
+                       summary_word_count AS "summaryWordCount", original_word_count AS "originalWordCount"
+                FROM summary_history
+                WHERE "userId" = $1 AND id > $2
+                ORDER BY id
+                LIMIT $3
+                """,
+                user_id,
+                last_id,
+                BACKFILL_ROW_PAGE_SIZE,
+            )
+            for row in rows:
+                day, category, words, time_saved = row_contribution(row)
+                bucket = buckets[(day, category)]
+                bucket[0] += 1
+                bucket[1] += words
+                bucket[2] += time_saved
+            scanned += len(rows)
+            if len(rows) < BACKFILL_ROW_PAGE_SIZE:
+                break
+            last_id = rows[-1]["id"]
+
+        keys = list(buckets)
+        await self.db.execute_raw(
+            REPLACE_SQL,
+            user_id,
+            [day for day, _ in keys],
+            [category for _, category in keys],
+            [int(buckets[key][0]) for key in keys],
+            [int(buckets[key][1]) for key in keys],
+            [float(buckets[key][2]) for key in keys],
+        )
+        # Drop rollups for (day, category) pairs that no longer have any summaries.
+        await self.db.execute_raw(
+            """
+            DELETE FROM user_daily_stats
+            WHERE "userId" = $1
+              AND (day, category) NOT IN (SELECT * FROM unnest($2::date[], $3::text[]))
+            """,
+            user_id,
+            [day for day, _ in keys],
+            [category for _, category in keys],
+        )
+        return scanned
+
+    async def backfill(self) -> int:
+        """Rebuilds the rollups of every user with summary history."""
+        total_users = 0
+        last_user = ""
+        while True:
+            rows = await self.db.query_raw(
+                'SELECT DISTINCT "userId" FROM summary_history WHERE "userId" > $1 ORDER BY "userId" LIMIT $2',
+                last_user,
+                BACKFILL_USER_PAGE_SIZE,
+            )
+            for row in rows:
+                scanned = await self.rebuild_user(row["userId"])
+                logger.debug(f"[Daily Stats] Rebuilt rollups for {row['userId']} from {scanned} summaries")
+            total_users += len(rows)
+            if len(rows) < BACKFILL_USER_PAGE_SIZE:
+                return total_users
+            last_user = rows[-1]["userId"]
+            logger.info(f"[Daily Stats] Backfilled {total_users} users so far")
+
+
+async def _main(argv: List[str]) -> None:
+    from prisma import Prisma
+
+    if argv[:1] != ["backfill"]:
+        raise SystemExit("usage: python -m services.daily_stats backfill")
+    db = Prisma()
+    await db.connect()
+    try:
+        total = await DailyStatsService(db).backfill()
+        logger.info(f"[Daily Stats] Backfill complete: rollups rebuilt for {total} users")
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(sys.argv[1:]))
@@ -0,0 +1,210 @@
+"""
+Domain Classifier - Maps article URLs to analytics categories by registrable domain
+
+The category ruleset is compiled once into a dict keyed by domain suffix. A host is
+classified by probing its own name and then each parent domain, so "blog.github.com" and
+"github.com" match the "github.com" rule while "newsletter.example.com" no longer counts as
+News just because it contains "news". Results are memoized per host. Public suffix rules
+give the registrable domain (eTLD+1) stored on each summary, e.g. "bbc.co.uk".
+"""
+import json
+import logging
+import os
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CATEGORY = "General"
+
+# Rules are domain suffixes: "github.com" matches github.com and every subdomain of it,
+# "news.ycombinator.com" only that host (and its subdomains), and a public suffix such as
+# "edu" or "ac.uk" matches every site registered under it. The most specific rule wins.
+# Override with a JSON file of the same shape via CATEGORY_RULES_PATH.
+DEFAULT_CATEGORY_RULES: Dict[str, List[str]] = {
+    "Technology": [
+        "github.com", "gitlab.com", "stackoverflow.com", "stackexchange.com", "dev.to", "medium.com",
+        "news.ycombinator.com", "techcrunch.com", "theverge.com", "arstechnica.com", "wired.com",
+        "engadget.com", "zdnet.com", "thenextweb.com", "hackernoon.com", "infoq.com", "developer.mozilla.org",
+        "docs.python.org", "readthedocs.io", "substack.com",
+    ],
+    "News": [
+        "bbc.co.uk", "bbc.com", "cnn.com", "reuters.com", "apnews.com", "nytimes.com", "washingtonpost.com",
+        "theguardian.com", "npr.org", "aljazeera.com", "news.yahoo.com", "news.google.com", "nbcnews.com",
+        "cbsnews.com", "abcnews.go.com", "foxnews.com", "usatoday.com", "politico.com", "axios.com",
+        "independent.co.uk", "telegraph.co.uk", "abc.net.au", "cbc.ca", "dw.com", "france24.com",
+    ],
+    "Business": [
+        "forbes.com", "wsj.com", "bloomberg.com", "ft.com", "businessinsider.com", "cnbc.com", "economist.com",
+        "fortune.com", "hbr.org", "marketwatch.com", "fastcompany.com", "inc.com", "entrepreneur.com",
+        "morningstar.com", "investopedia.com",
+    ],
+    "Science": [
+        "nature.com", "arxiv.org", "science.org", "sciencemag.org", "sciencedirect.com", "scientificamerican.com",
+        "newscientist.com", "pnas.org", "cell.com", "plos.org", "nih.gov", "nasa.gov", "sciencedaily.com",
+        "quantamagazine.org", "phys.org", "biorxiv.org", "medrxiv.org", "springer.com", "wiley.com",
+    ],
+}
+
+# Multi-label public suffixes we commonly see. Any single label ("com", "io", "de") is always
+# treated as a public suffix; set PUBLIC_SUFFIX_LIST_PATH to a copy of
+# https://publicsuffix.org/list/public_suffix_list.dat for full coverage.
+BUILTIN_PUBLIC_SUFFIXES: FrozenSet[str] = frozenset({
+    "co.uk", "org.uk", "ac.uk", "gov.uk", "ltd.uk", "plc.uk", "me.uk", "net.uk", "sch.uk", "nhs.uk",
+    "com.au", "net.au", "org.au", "edu.au", "gov.au", "asn.au", "id.au",
+    "co.nz", "org.nz", "ac.nz", "govt.nz", "net.nz",
+    "co.jp", "ne.jp", "or.jp", "ac.jp", "go.jp",
+    "co.kr", "or.kr", "ac.kr", "go.kr",
+    "com.br", "net.br", "org.br", "gov.br",
+    "com.cn", "net.cn", "org.cn", "gov.cn", "edu.cn",
+    "co.in", "net.in", "org.in", "ac.in", "gov.in",
+    "com.mx", "org.mx", "gob.mx", "com.ar", "com.co", "com.tr", "com.sg", "edu.sg", "gov.sg",
+    "com.hk", "org.hk", "edu.hk", "com.tw", "org.tw", "edu.tw", "co.za", "org.za", "ac.za", "gov.za",
+    "co.il", "org.il", "ac.il", "com.my", "com.ph", "com.pk", "com.ng", "co.ke", "com.eg", "com.sa",
+    "github.io", "gitlab.io", "herokuapp.com", "netlify.app", "vercel.app", "pages.dev", "web.app",
+    "firebaseapp.com", "blogspot.com", "wordpress.com", "azurewebsites.net", "cloudfront.net",
+})
+
+HOST_CACHE_SIZE = 65536
+
+
+def url_host(url: Optional[str]) -> Optional[str]:
+    """Lower-cased host name of a URL (no scheme, userinfo, port, path or trailing dot)."""
+    if not url:
+        return None
+    start = url.find("//")
+    start = start + 2 if start != -1 else 0
+    end = len(url)
+    for separator in "/?#":
+        index = url.find(separator, start, end)
+        if index != -1:
+            end = index
+    host = url[start:end]
+    if "@" in host:
+        host = host.rsplit("@", 1)[1]
+    if host.startswith("["):  # IPv6 literal
+        return host[1:].split("]", 1)[0].lower() or None
+    if ":" in host:
+        host = host.split(":", 1)[0]
+    host = host.lower().rstrip(".")
+    return host or None
+
+
+class PublicSuffixes:
+    """Public suffix matching with the publicsuffix.org rule semantics (plain, *. and ! rules)"""
+
+    def __init__(self, rules: Iterable[str]):
+        self.exact: set = set()
+        self.wildcards: set = set()
+        self.exceptions: set = set()
+        for rule in rules:
+            rule = rule.strip().lower()
+            if not rule or rule.startswith("//"):
+                continue
+            if rule.startswith("!"):
+                self.exceptions.add(rule[1:])
+            elif rule.startswith("*."):
+                self.wildcards.add(rule[2:])
+            else:
+                self.exact.add(rule)
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "PublicSuffixes":
+        path = path or os.getenv("PUBLIC_SUFFIX_LIST_PATH")
+        if path:
+            try:
+                with open(path, encoding="utf-8") as handle:
+                    rules = [line.split()[0] for line in handle if line.strip() and not line.startswith("//")]
+                logger.info(f"[Domain Classifier] Loaded {len(rules)} public suffix rules from {path}")
+                return cls(rules)
+            except OSError as e:
+                logger.error(f"[Domain Classifier] Could not read public suffix list {path}: {e}")
+        return cls(BUILTIN_PUBLIC_SUFFIXES)
+
+    def suffix_length(self, labels: List[str]) -> int:
+        """Number of trailing labels that form the public suffix of `labels`."""
+        # Longest candidate first, so the first rule that matches is the prevailing one.
+        for i in range(len(labels)):
+            candidate = ".".join(labels[i:])
+            if candidate in self.exceptions:
+                return len(labels) - i - 1
+            if candidate in self.exact:
+                return len(labels) - i
+            if i + 1 < len(labels) and ".".join(labels[i + 1:]) in self.wildcards:
+                return len(labels) - i
+        return 1  # Unlisted TLDs are public suffixes too (the implicit "*" rule)
+
+
+class DomainClassifier:
+    """Compiled category ruleset with a memoized per-host lookup"""
+
+    def __init__(
+        self,
+        rules: Optional[Dict[str, List[str]]] = None,
+        suffixes: Optional[PublicSuffixes] = None,
+        default_category: str = DEFAULT_CATEGORY,
+        cache_size: int = HOST_CACHE_SIZE,
+    ):
+        self.default_category = default_category
+        self.suffixes = suffixes or PublicSuffixes(BUILTIN_PUBLIC_SUFFIXES)
+        self.rules = self._compile(rules if rules is not None else DEFAULT_CATEGORY_RULES)
+        self.classify_host = lru_cache(maxsize=cache_size)(self._classify_host)
+
+    @classmethod
+    def from_env(cls) -> "DomainClassifier":
+        rules = None
+        path = os.getenv("CATEGORY_RULES_PATH")
+        if path:
+            try:
+                with open(path, encoding="utf-8") as handle:
+                    rules = json.load(handle)
+                logger.info(f"[Domain Classifier] Loaded category rules for {len(rules)} categories from {path}")
+            except (OSError, ValueError) as e:
+                logger.error(f"[Domain Classifier] Could not load category rules from {path}, using defaults: {e}")
+        return cls(rules=rules, suffixes=PublicSuffixes.load())
+
+    @staticmethod
+    def _compile(rules: Dict[str, List[str]]) -> Dict[str, str]:
+        compiled: Dict[str, str] = {}
+        for category, domains in rules.items():
+            for domain in domains:
+                domain = domain.strip().lower().lstrip(".").rstrip(".")
+                if domain.startswith("*."):
+                    domain = domain[2:]
+                if domain in compiled and compiled[domain] != category:
+                    logger.warning(f"[Domain Classifier] {domain} listed under {compiled[domain]} and {category}; keeping {compiled[domain]}")
+                    continue
+                compiled[domain] = category
+        return compiled
+
+    def registrable_domain(self, host: str) -> Optional[str]:
+        """eTLD+1, e.g. "www.bbc.co.uk" -> "bbc.co.uk". None for bare public suffixes and IPs."""
+        labels = host.split(".")
+        if _is_ip(host):
+            return None
+        suffix = self.suffixes.suffix_length(labels)
+        if len(labels) <= suffix:
+            return None
+        return ".".join(labels[-(suffix + 1):])
+
+    def _classify_host(self, host: str) -> str:
+        if _is_ip(host):
+            return self.default_category
+        labels = host.split(".")
+        # Probe from the full host up to the TLD; the first (longest) matching rule wins.
+        for i in range(len(labels)):
+            category = self.rules.get(".".join(labels[i:]))
+            if category is not None:
+                return category
+        return self.default_category
+
+    def classify_url(self, url: Optional[str]) -> str:
+        host = url_host(url)
+        return self.classify_host(host) if host else self.default_category
+
+
+def _is_ip(host: str) -> bool:
+    return ":" in host or host.replace(".", "").isdigit()
+
+
+domain_classifier = DomainClassifier.from_env()
@@ -0,0 +1,286 @@
+"""
+Email Outbox - Durable queue of transactional emails, sent to Brevo by a background worker
+
+Request and webhook handlers only insert a row here (deduplicated by idempotency key) and
+return. A PollingWorker claims due messages, sends them over one pooled HTTP client and
+retries failures with exponential backoff. Messages that share a template (or none), sender
+and tags go out as a single Brevo batch send, with one `messageVersions` entry per message
+carrying its recipient, params, subject and HTML. At most EMAIL_SEND_CONCURRENCY sends are
+in flight at once.
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+BREVO_API_URL = "https://api.brevo.com/v3/smtp/email"
+EMAIL_CLAIM_BATCH_SIZE = 100
+BREVO_MAX_VERSIONS = 100          # messageVersions per batch send
+EMAIL_SEND_CONCURRENCY = 4
+EMAIL_MAX_ATTEMPTS = 8
+EMAIL_RETRY_BASE_SECONDS = 30     # 30s, 60s, 120s ... capped below
+EMAIL_RETRY_MAX_SECONDS = 3600
+# A sending message whose worker has not finished within this long is assumed orphaned
+# (e.g. the machine restarted mid-send) and is picked up again.
+EMAIL_STALE_AFTER = "5 minutes"
+EMAIL_RETENTION = "30 days"       # Sent and failed messages are kept this long for dedupe and debugging
+PRUNE_INTERVAL_SECONDS = 3600
+
+emails_total = registry.counter(
+    "email_outbox_messages_total",
+    "Outbox emails by kind and result (queued/duplicate/sent/retried/failed).",
+    ["kind", "result"],
+)
+brevo_request_seconds = registry.histogram(
+    "brevo_request_seconds",
+    "Brevo send latency by mode (single/batch) and outcome.",
+    ["mode", "outcome"],
+)
+
+MESSAGE_COLUMNS = 'id, "idempotencyKey", kind, payload, attempts'
+
+# nextAttemptAt is truncated so rounding to the column's millisecond precision cannot put a
+# new message just after NOW() of the claim that wake() triggers.
+ENQUEUE_SQL = """
+INSERT INTO email_outbox (id, "idempotencyKey", kind, payload, status, attempts, "nextAttemptAt", "createdAt", "updatedAt")
+VALUES ($1, $2, $3, $4::jsonb, 'pending', 0, date_trunc('milliseconds', NOW()), NOW(), NOW())
+ON CONFLICT ("idempotencyKey") DO NOTHING
+RETURNING id
+"""
+
+ENQUEUE_MANY_SQL = """
+INSERT INTO email_outbox (id, "idempotencyKey", kind, payload, status, attempts, "nextAttemptAt", "createdAt", "updatedAt")
+SELECT m.id, m.key, $3, m.payload::jsonb, 'pending', 0, date_trunc('milliseconds', NOW()), NOW(), NOW()
+FROM unnest($1::text[], $2::text[], $4::text[]) AS m(id, key, payload)
+ON CONFLICT ("idempotencyKey") DO NOTHING
+"""
+
+CLAIM_SQL = f"""
+UPDATE email_outbox SET status = 'sending', attempts = attempts + 1, "updatedAt" = NOW()
+WHERE id IN (
+    SELECT id FROM email_outbox
+    WHERE (status = 'pending' AND "nextAttemptAt" <= NOW())
+       OR (status = 'sending' AND "updatedAt" < NOW() - INTERVAL '{EMAIL_STALE_AFTER}')
+    ORDER BY "createdAt"
+    LIMIT $1
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING {MESSAGE_COLUMNS}
+"""
+
+SENT_SQL = """
+UPDATE email_outbox o SET status = 'sent', "messageId" = v.message_id, error = NULL, "sentAt" = NOW(), "updatedAt" = NOW()
+FROM unnest($1::text[], $2::text[]) AS v(id, message_id)
+WHERE o.id = v.id
+"""
+
+RETRY_SQL = """
+UPDATE email_outbox SET status = $2, error = $3, "nextAttemptAt" = NOW() + make_interval(secs => $4), "updatedAt" = NOW()
+WHERE id = $1
+"""
+
+PRUNE_SQL = f"""
+DELETE FROM email_outbox
+WHERE (status = 'sent' AND "sentAt" < NOW() - INTERVAL '{EMAIL_RETENTION}')
+   OR (status = 'failed' AND "updatedAt" < NOW() - INTERVAL '{EMAIL_RETENTION}')
+"""
+
+
+class BrevoError(Exception):
+    def __init__(self, message: str, permanent: bool):
+        super().__init__(message)
+        self.permanent = permanent
+
+
+def retry_delay(attempts: int) -> float:
+    return min(EMAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1), EMAIL_RETRY_MAX_SECONDS)
+
+
+# Fields that may differ between the messages of one batch send
+VERSION_FIELDS = ("to", "params", "replyTo", "subject", "htmlContent", "textContent")
+
+
+def _batch_key(payload: Dict[str, Any]) -> Optional[str]:
+    """Messages with equal keys can share one batch send; None means send on its own."""
+    if payload.get("attachment"):
+        return None
+    return json.dumps([payload.get("templateId"), payload.get("sender"), payload.get("tags")], sort_keys=True)
+
+
+class EmailOutbox:
+    """Queues Brevo messages in email_outbox and delivers them in batches"""
+
+    def __init__(
+        self,
+        db,
+        api_key: Optional[str],
+        api_url: str = BREVO_API_URL,
+        batch_size: int = EMAIL_CLAIM_BATCH_SIZE,
+    ):
+        self.db = db
+        self.api_key = api_key
+        self.api_url = api_url
+        self.batch_size = batch_size
+        self._client: Optional[httpx.AsyncClient] = None
+        self._send_slots = asyncio.Semaphore(EMAIL_SEND_CONCURRENCY)
+        self._last_prune = 0.0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers={"api-key": self.api_key or "", "Accept": "application/json"},
+                timeout=httpx.Timeout(30.0, connect=5.0),
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def enqueue(self, kind: str, payload: Dict[str, Any], idempotency_key: Optional[str] = None) -> bool:
+        """Queues a Brevo /smtp/email payload. Returns False when the key was already queued."""
+        message_id = str(uuid.uuid4())
+        rows = await self.db.query_raw(
+            ENQUEUE_SQL, message_id, idempotency_key or f"{kind}:{message_id}", kind, json.dumps(payload)
+        )
+        emails_total.inc(kind=kind, result="queued" if rows else "duplicate")
+        if not rows:
+            logger.info(f"[Email Outbox] Duplicate {kind} email {idempotency_key} ignored")
+        return bool(rows)
+
+    async def enqueue_many(self, kind: str, messages: List[Tuple[str, Dict[str, Any]]]) -> int:
+        """Queues (idempotency key, payload) pairs in one insert. Returns how many were new."""
+        queued = await self.db.execute_raw(
+            ENQUEUE_MANY_SQL,
+            [str(uuid.uuid4()) for _ in messages],
+            [key for key, _ in messages],
+            kind,
+            [json.dumps(payload) for _, payload in messages],
+        )
+        emails_total.inc(queued, kind=kind, result="queued")
+        emails_total.inc(len(messages) - queued, kind=kind, result="duplicate")
+        return queued
+
+    async def run_next(self) -> bool:
+        """Claims and sends one batch of due messages. Returns False when nothing is due."""
+        messages = await self.db.query_raw(CLAIM_SQL, self.batch_size)
+        if not messages:
+            await self._prune_if_due()
+            return False
+        for message in messages:
+            if isinstance(message["payload"], str):
+                message["payload"] = json.loads(message["payload"])
+
+        groups: Dict[Optional[str], List[Dict[str, Any]]] = {}
+        singles: List[List[Dict[str, Any]]] = []
+        for message in messages:
+            key = _batch_key(message["payload"])
+            if key is None:
+                singles.append([message])
+            else:
+                groups.setdefault(key, []).append(message)
+        sends = singles + [
+            group[i:i + BREVO_MAX_VERSIONS] for group in groups.values() for i in range(0, len(group), BREVO_MAX_VERSIONS)
+        ]
+        await asyncio.gather(*(self._deliver(send) for send in sends))
+        return True
+
+    async def _deliver(self, messages: List[Dict[str, Any]]) -> None:
+        try:
+            async with self._send_slots:
+                message_ids = await self._send(messages)
+        except BrevoError as e:
+            if len(messages) > 1 and e.permanent:
+                # One bad recipient rejects the whole batch; send individually to isolate it
+                logger.warning(f"[Email Outbox] Batch of {len(messages)} rejected ({e}), sending individually")
+                for message in messages:
+                    await self._deliver([message])
+                return
+            for message in messages:
+                await self._schedule_retry(message, e)
+            return
+        await self.db.execute_raw(SENT_SQL, [m["id"] for m in messages], message_ids)
+        for message in messages:
+            emails_total.inc(kind=message["kind"], result="sent")
+        logger.info(f"[Email Outbox] Sent {len(messages)} {messages[0]['kind']} email(s)")
+
+    async def _send(self, messages: List[Dict[str, Any]]) -> List[Optional[str]]:
+        if len(messages) == 1:
+            mode, body = "single", messages[0]["payload"]
+        else:
+            first = messages[0]["payload"]
+            mode = "batch"
+            # The first message's subject and content stay at the top level as the defaults
+            body = {k: v for k, v in first.items() if k not in ("to", "params", "replyTo")}
+            body["messageVersions"] = [
+                {k: m["payload"][k] for k in VERSION_FIELDS if m["payload"].get(k)} for m in messages
+            ]
+        outcome = "error"
+        start = time.perf_counter()
+        try:
+            response = await self.client.post(self.api_url, json=body)
+            if response.status_code < 400:
+                outcome = "ok"
+        except httpx.RequestError as e:
+            raise BrevoError(f"request error: {type(e).__name__}: {e}", permanent=False)
+        finally:
+            brevo_request_seconds.observe(time.perf_counter() - start, mode=mode, outcome=outcome)
+        if response.status_code >= 400:
+            # 429 and 5xx are worth retrying; other 4xx mean the message itself is bad
+            permanent = response.status_code < 500 and response.status_code != 429
+            raise BrevoError(f"HTTP {response.status_code}: {response.text[:500]}", permanent=permanent)
+        data = response.json() if response.content else {}
+        ids = data.get("messageIds") or [data.get("messageId")]
+        return (ids + [None] * len(messages))[: len(messages)]
+
+    async def _schedule_retry(self, message: Dict[str, Any], error: BrevoError) -> None:
+        attempts = message["attempts"]
+        status = "failed" if error.permanent or attempts >= EMAIL_MAX_ATTEMPTS else "pending"
+        delay = retry_delay(attempts)
+        logger.error(
+            f"[Email Outbox] {message['kind']} email {message['id']} attempt {attempts} failed, marking {status}"
+            f"{'' if status == 'failed' else f' (retry in {delay:.0f}s)'}: {error}"
+        )
+        await self.db.execute_raw(RETRY_SQL, message["id"], status, str(error)[:1000], delay)
+        emails_total.inc(kind=message["kind"], result="failed" if status == "failed" else "retried")
+
+    async def _prune_if_due(self) -> None:
+        if time.monotonic() - self._last_prune < PRUNE_INTERVAL_SECONDS:
+            return
+        self._last_prune = time.monotonic()
+        pruned = await self.db.execute_raw(PRUNE_SQL)
+        if pruned:
+            logger.info(f"[Email Outbox] Pruned {pruned} sent and failed emails")
+
+
+async def _main(argv: List[str]) -> None:
+    from prisma import Prisma
+
+    if argv[:1] != ["retry-failed"]:
+        raise SystemExit("usage: python -m services.email_outbox retry-failed")
+    db = Prisma()
+    await db.connect()
+    try:
+        count = await db.execute_raw(
+            """UPDATE email_outbox SET status = 'pending', attempts = 0, "nextAttemptAt" = NOW(), "updatedAt" = NOW() WHERE status = 'failed'"""
+        )
+        logger.info(f"[Email Outbox] Re-queued {count} failed emails; the API's email worker will send them")
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(sys.argv[1:]))
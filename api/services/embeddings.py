@@ -0,0 +1,431 @@
+"""
+Embedding Service - Local hashing embeddings and per-user "related summaries" search
+
+Vectors come from a CPU-only feature-hashing embedder (no model download, deterministic
+across processes) and are stored per summary in summary_embeddings. Small accounts are
+searched by streaming their vectors through a NumPy brute-force scan; accounts with at
+least IVF_MIN_VECTORS vectors get an IVF index (spherical k-means centroids stored in
+embedding_indexes, list ids stored on each vector) so a query only scans a few lists.
+
+List ids are only meaningful under the centroids they were assigned with, so every build
+has a random buildId, stored with the centroids and on each vector it assigns. A vector
+whose buildId is not the index's current one (written while a rebuild was running, or by
+a process still holding the previous centroids) is scanned on every query like an
+unassigned vector. After publishing, a rebuild reassigns those vectors. Every process
+checks the index's buildId on each load, so new centroids are picked up everywhere. An
+index is rebuilt once the account has grown IVF_REBUILD_GROWTH_RATIO past the size it
+was built at.
+
+Run `python -m services.embeddings backfill` from api/ to embed existing history.
+"""
+import asyncio
+import base64
+import hashlib
+import logging
+import math
+import re
+import secrets
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from cachetools import LRUCache
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = 256
+STREAM_PAGE_SIZE = 4096          # Vectors decoded per page; bounds search memory to ~4 MB
+IVF_MIN_VECTORS = 20000          # Below this a brute-force scan is fast enough
+IVF_REBUILD_GROWTH_RATIO = 0.25  # Rebuild once the account has grown 25% since the last build
+IVF_TRAINING_SAMPLE = 16384
+IVF_NPROBE = 8
+IVF_REBUILD_CHECK_EVERY = 50     # Saves per user between checks of the vector count
+SAVE_COUNTER_SIZE = 10000        # Users whose saves-since-check count is kept; evicting one only delays its check
+CENTROID_CACHE_SIZE = 64         # Users whose IVF centroids stay in memory
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with "
+    "not but can we you they he she his her their our your more most also than into about over after".split()
+)
+
+
+# --- Embedding ---
+
+def _features(text: str) -> Iterable[str]:
+    tokens = [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in _STOPWORDS]
+    yield from tokens
+    for left, right in zip(tokens, tokens[1:]):
+        yield f"{left} {right}"
+
+
+def _bucket(feature: str, dim: int) -> Tuple[int, float]:
+    digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    return digest % dim, (1.0 if digest >> 63 else -1.0)
+
+
+class HashingEmbedder:
+    """Signed feature hashing of unigrams + bigrams with sublinear term weighting"""
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def embed(self, weighted_texts: Sequence[Tuple[Optional[str], float]]) -> np.ndarray:
+        counts: Dict[str, float] = defaultdict(float)
+        for text, weight in weighted_texts:
+            if text:
+                for feature in _features(text):
+                    counts[feature] += weight
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, count in counts.items():
+            index, sign = _bucket(feature, self.dim)
+            vector[index] += sign * (1.0 + math.log(count)) if count >= 1 else sign * count
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm > 0 else vector
+
+    def embed_summary(self, title: Optional[str], tldr: Optional[str], key_points: Optional[List[str]]) -> np.ndarray:
+        return self.embed([(title, 2.0), (tldr, 1.0), (" ".join(key_points or []), 1.0)])
+
+    def embed_query(self, query: str) -> np.ndarray:
+        return self.embed([(query, 1.0)])
+
+
+embedder = HashingEmbedder()
+
+
+# Vectors travel through Prisma's raw-query JSON transport, so they are stored as
+# base64-encoded float16 (512 bytes -> ~684 chars) rather than float arrays, which
+# would cost a JSON number parse per dimension.
+def encode_vector(vector: np.ndarray) -> str:
+    return base64.b64encode(vector.astype(np.float16).tobytes()).decode("ascii")
+
+
+def decode_vectors(encoded: Sequence[str], dim: int = EMBEDDING_DIM) -> np.ndarray:
+    raw = b"".join(base64.b64decode(e) for e in encoded)
+    return np.frombuffer(raw, dtype=np.float16).reshape(len(encoded), dim).astype(np.float32)
+
+
+# --- Vector math ---
+
+class TopK:
+    """Running top-k over scored batches so only one batch is in memory at a time"""
+
+    def __init__(self, k: int):
+        self.k = k
+        self.ids: List[str] = []
+        self.scores = np.empty(0, dtype=np.float32)
+
+    def push(self, ids: Sequence[str], scores: np.ndarray) -> None:
+        all_ids = self.ids + list(ids)
+        all_scores = np.concatenate([self.scores, scores.astype(np.float32)])
+        if len(all_ids) > self.k:
+            keep = np.argpartition(-all_scores, self.k - 1)[: self.k]
+            all_ids = [all_ids[i] for i in keep]
+            all_scores = all_scores[keep]
+        self.ids, self.scores = all_ids, all_scores
+
+    def results(self) -> List[Tuple[str, float]]:
+        order = np.argsort(-self.scores)
+        return [(self.ids[i], float(self.scores[i])) for i in order]
+
+
+def brute_force_top_k(query: np.ndarray, matrix: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    scores = matrix @ query
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return top, scores[top]
+
+
+def train_ivf_centroids(vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means; centroids are unit vectors so assignment is a dot product."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        sums[empty] = centroids[empty]
+        norms[empty] = 1.0
+        centroids = sums / norms
+    return centroids.astype(np.float32)
+
+
+def ivf_list_count(vector_count: int) -> int:
+    return max(1, min(1024, int(math.sqrt(vector_count))))
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    return np.argmax(vectors @ centroids.T, axis=1).astype(np.int32)
+
+
+def nearest_lists(query: np.ndarray, centroids: np.ndarray, nprobe: int) -> List[int]:
+    nprobe = min(nprobe, len(centroids))
+    return [int(i) for i in np.argsort(-(centroids @ query))[:nprobe]]
+
+
+# --- Storage / search ---
+
+@dataclass
+class IvfIndex:
+    centroids: np.ndarray
+    vector_count: int
+    build_id: int
+
+
+class EmbeddingIndexService:
+    """Writes summary embeddings and answers per-user top-k related-summary queries"""
+
+    def __init__(self, db, page_size: int = STREAM_PAGE_SIZE):
+        self.db = db
+        self.page_size = page_size
+        self._centroids: "OrderedDict[str, Optional[IvfIndex]]" = OrderedDict()
+        self._rebuilding: Dict[str, asyncio.Task] = {}
+        self._saves_since_check: LRUCache = LRUCache(maxsize=SAVE_COUNTER_SIZE)
+
+    async def add_summary(self, summary_id: str, user_id: str, title: Optional[str], tldr: str, key_points: List[str]) -> None:
+        vector = embedder.embed_summary(title, tldr, key_points)
+        index = await self._load_index(user_id)
+        list_id = int(assign_lists(vector[None, :], index.centroids)[0]) if index else None
+        await self.db.execute_raw(
+            """
+            INSERT INTO summary_embeddings ("summaryId", "userId", vector, "listId", "buildId", "createdAt")
+            VALUES ($1, $2, $3, $4, $5, NOW())
+            ON CONFLICT ("summaryId") DO UPDATE SET vector = EXCLUDED.vector, "listId" = EXCLUDED."listId",
+                "buildId" = EXCLUDED."buildId"
+            """,
+            summary_id,
+            user_id,
+            encode_vector(vector),
+            list_id,
+            index.build_id if index else None,
+        )
+        await self._maybe_schedule_rebuild(user_id, index)
+
+    async def related_to_summary(self, user_id: str, summary_id: str, k: int = 10) -> Optional[List[Tuple[str, float]]]:
+        rows = await self.db.query_raw(
+            'SELECT vector FROM summary_embeddings WHERE "summaryId" = $1 AND "userId" = $2',
+            summary_id,
+            user_id,
+        )
+        if rows:
+            vector = decode_vectors([rows[0]["vector"]])[0]
+        else:
+            summary = await self.db.summaryhistory.find_first(where={"id": summary_id, "userId": user_id})
+            if not summary:
+                return None
+            # Summaries saved before embeddings existed are embedded on first use.
+            await self.add_summary(summary.id, user_id, summary.title, summary.tldr, summary.keyPoints)
+            vector = embedder.embed_summary(summary.title, summary.tldr, summary.keyPoints)
+        return await self.search(user_id, vector, k=k, exclude_id=summary_id)
+
+    async def related_to_query(self, user_id: str, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        return await self.search(user_id, embedder.embed_query(query), k=k)
+
+    async def search(self, user_id: str, query: np.ndarray, k: int = 10, exclude_id: Optional[str] = None) -> List[Tuple[str, float]]:
+        if not np.any(query):
+            return []
+        index = await self._load_index(user_id)
+        list_ids = nearest_lists(query, index.centroids, IVF_NPROBE) if index else None
+        top = TopK(k + 1 if exclude_id else k)
+        async for ids, matrix in self._stream_vectors(user_id, list_ids, index.build_id if index else None):
+            top.push(ids, matrix @ query)
+        return [(i, s) for i, s in top.results() if i != exclude_id][:k]
+
+    async def _stream_vectors(self, user_id: str, list_ids: Optional[List[int]] = None, build_id: Optional[int] = None):
+        """Yields (ids, float32 matrix) pages.
+
+        With `list_ids`, only those lists of build `build_id` are scanned, plus every vector
+        not assigned under that build. With only `build_id`, just the vectors not assigned
+        under it. With neither, all of the user's vectors.
+        """
+        after = ""
+        while True:
+            if list_ids is not None:
+                rows = await self.db.query_raw(
+                    """
+                    SELECT "summaryId", vector FROM summary_embeddings
+                    WHERE "userId" = $1 AND "summaryId" > $2
+                      AND (("buildId" = $5 AND "listId" = ANY($4::int[])) OR "buildId" IS DISTINCT FROM $5)
+                    ORDER BY "summaryId" LIMIT $3
+                    """,
+                    user_id, after, self.page_size, list_ids, build_id,
+                )
+            elif build_id is not None:
+                rows = await self.db.query_raw(
+                    """
+                    SELECT "summaryId", vector FROM summary_embeddings
+                    WHERE "userId" = $1 AND "summaryId" > $2 AND "buildId" IS DISTINCT FROM $4
+                    ORDER BY "summaryId" LIMIT $3
+                    """,
+                    user_id, after, self.page_size, build_id,
+                )
+            else:
+                rows = await self.db.query_raw(
+                    """
+                    SELECT "summaryId", vector FROM summary_embeddings
+                    WHERE "userId" = $1 AND "summaryId" > $2
+                    ORDER BY "summaryId" LIMIT $3
+                    """,
+                    user_id, after, self.page_size,
+                )
+            if not rows:
+                return
+            yield [r["summaryId"] for r in rows], decode_vectors([r["vector"] for r in rows])
+            if len(rows) < self.page_size:
+                return
+            after = rows[-1]["summaryId"]
+
+    async def _load_index(self, user_id: str) -> Optional[IvfIndex]:
+        """The user's current index. Cached centroids are reused only while their buildId is current."""
+        rows = await self.db.query_raw('SELECT "buildId" FROM embedding_indexes WHERE "userId" = $1', user_id)
+        if not rows:
+            self._centroids.pop(user_id, None)
+            return None
+        cached = self._centroids.get(user_id)
+        if cached is not None and cached.build_id == rows[0]["buildId"]:
+            self._centroids.move_to_end(user_id)
+            return cached
+        rows = await self.db.query_raw(
+            'SELECT centroids, nlist, "vectorCount", "buildId" FROM embedding_indexes WHERE "userId" = $1',
+            user_id,
+        )
+        if not rows:
+            return None
+        centroids = np.frombuffer(base64.b64decode(rows[0]["centroids"]), dtype=np.float32).reshape(rows[0]["nlist"], EMBEDDING_DIM)
+        index = IvfIndex(centroids=centroids, vector_count=rows[0]["vectorCount"], build_id=rows[0]["buildId"])
+        self._centroids[user_id] = index
+        self._centroids.move_to_end(user_id)
+        if len(self._centroids) > CENTROID_CACHE_SIZE:
+            self._centroids.popitem(last=False)
+        return index
+
+    async def _maybe_schedule_rebuild(self, user_id: str, index: Optional[IvfIndex]) -> None:
+        if user_id in self._rebuilding:
+            return
+        saves = self._saves_since_check.get(user_id, 0) + 1
+        if saves < IVF_REBUILD_CHECK_EVERY:
+            self._saves_since_check[user_id] = saves
+            return
+        self._saves_since_check.pop(user_id, None)
+        # An index-only count on ("userId", "summaryId"), once every IVF_REBUILD_CHECK_EVERY saves
+        rows = await self.db.query_raw('SELECT COUNT(*)::int AS n FROM summary_embeddings WHERE "userId" = $1', user_id)
+        count = rows[0]["n"] if rows else 0
+        if index is None:
+            needs_build = count >= IVF_MIN_VECTORS
+        else:
+            # nlist grows with the account; an index built at a smaller size scans ever longer lists
+            needs_build = count > index.vector_count * (1 + IVF_REBUILD_GROWTH_RATIO)
+        if needs_build:
+            # Held in _rebuilding until done, so the task is not garbage-collected mid-run
+            task = asyncio.create_task(self.rebuild_index(user_id), name=f"ivf-rebuild:{user_id}")
+            self._rebuilding[user_id] = task
+            task.add_done_callback(lambda t: self._rebuild_done(user_id, t))
+
+    def _rebuild_done(self, user_id: str, task: asyncio.Task) -> None:
+        self._rebuilding.pop(user_id, None)
+        if task.cancelled():
+            logger.warning(f"[Embeddings] IVF rebuild for {user_id} was cancelled")
+        elif task.exception() is not None:
+            e = task.exception()
+            logger.error(f"[Embeddings] IVF rebuild failed for {user_id}: {e}", exc_info=e)
+
+    async def rebuild_index(self, user_id: str) -> None:
+        """Trains centroids on a sample and reassigns every vector, one page at a time.
+
+        Vectors are written under a new buildId while searches keep using the previous
+        index (they scan the already reassigned vectors in full). Once the new centroids are
+        published, vectors still not under the new build are reassigned.
+        """
+        sample_rows = await self.db.query_raw(
+            'SELECT vector FROM summary_embeddings WHERE "userId" = $1 ORDER BY random() LIMIT $2',
+            user_id, IVF_TRAINING_SAMPLE,
+        )
+        count_rows = await self.db.query_raw('SELECT COUNT(*)::int AS n FROM summary_embeddings WHERE "userId" = $1', user_id)
+        vector_count = count_rows[0]["n"]
+        if vector_count < IVF_MIN_VECTORS:
+            return
+        nlist = ivf_list_count(vector_count)
+        sample = decode_vectors([r["vector"] for r in sample_rows])
+        centroids = await asyncio.to_thread(train_ivf_centroids, sample, nlist)
+        # Random rather than incremented, so two processes rebuilding at once never share one
+        build_id = secrets.randbelow(2**31 - 1) + 1
+
+        await self._assign(user_id, centroids, build_id, self._stream_vectors(user_id))
+        await self.db.execute_raw(
+            """
+            INSERT INTO embedding_indexes ("userId", centroids, nlist, "vectorCount", "buildId", "builtAt")
+            VALUES ($1, $2, $3, $4, $5, NOW())
+            ON CONFLICT ("userId") DO UPDATE SET centroids = EXCLUDED.centroids, nlist = EXCLUDED.nlist,
+                "vectorCount" = EXCLUDED."vectorCount", "buildId" = EXCLUDED."buildId", "builtAt" = EXCLUDED."builtAt"
+            """,
+            user_id, base64.b64encode(centroids.tobytes()).decode("ascii"), nlist, vector_count, build_id,
+        )
+        self._centroids[user_id] = IvfIndex(centroids=centroids, vector_count=vector_count, build_id=build_id)
+        # Saved during the pass above with the previous centroids
+        late = await self._assign(user_id, centroids, build_id, self._stream_vectors(user_id, build_id=build_id))
+        logger.info(
+            f"[Embeddings] Built IVF index for {user_id}: {vector_count} vectors, {nlist} lists, "
+            f"{late} reassigned after publishing"
+        )
+
+    async def _assign(self, user_id: str, centroids: np.ndarray, build_id: int, pages) -> int:
+        assigned = 0
+        async for ids, matrix in pages:
+            assignment = assign_lists(matrix, centroids)
+            await self.db.execute_raw(
+                """
+                UPDATE summary_embeddings AS e SET "listId" = v.list_id, "buildId" = $3
+                FROM unnest($1::text[], $2::int[]) AS v(id, list_id)
+                WHERE e."summaryId" = v.id
+                """,
+                ids, assignment.tolist(), build_id,
+            )
+            assigned += len(ids)
+            await asyncio.sleep(0)
+        return assigned
+
+    async def backfill(self, page_size: int = 500) -> int:
+        """Embeds every summary that does not have a vector yet."""
+        total = 0
+        while True:
+            rows = await self.db.query_raw(
+                """
+                SELECT h.id, h."userId", h.title, h.tldr, h.key_points AS "keyPoints"
+                FROM summary_history h
+                LEFT JOIN summary_embeddings e ON e."summaryId" = h.id
+                WHERE e."summaryId" IS NULL
+                LIMIT $1
+                """,
+                page_size,
+            )
+            if not rows:
+                return total
+            for row in rows:
+                await self.add_summary(row["id"], row["userId"], row.get("title"), row["tldr"], row.get("keyPoints") or [])
+            total += len(rows)
+            logger.info(f"[Embeddings] Backfilled {total} summaries so far")
+
+
+async def _main(argv: List[str]) -> None:
+    from prisma import Prisma
+
+    if argv[:1] != ["backfill"]:
+        raise SystemExit("usage: python -m services.embeddings backfill")
+    db = Prisma()
+    await db.connect()
+    try:
+        total = await EmbeddingIndexService(db).backfill()
+        logger.info(f"[Embeddings] Backfill complete: {total} summaries embedded")
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(sys.argv[1:]))
@@ -0,0 +1,234 @@
+"""
+Goals Service - User goals with progress counters maintained on save/delete
+
+Each goal row carries its own running progress for the current period. Saving a summary
+bumps every active goal of the user in one UPDATE, so reading goals never touches
+summary_history. A goal whose period has ended reads as zero progress until the next
+save or the rollover job moves it into the new period.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from .analytics import estimate_time_saved
+from .daily_stats import row_contribution, utc_day
+
+logger = logging.getLogger(__name__)
+
+# Goal type -> what its progress counts. "efficiency" goals track the mean percentage by
+# which summaries shortened their articles (only summaries with a known article length count).
+GOAL_METRICS: Dict[str, str] = {
+    "daily_summaries": "summaries",
+    "monthly_summaries": "summaries",
+    "weekly_time_saved": "time_saved",
+    "reading_efficiency": "efficiency",
+}
+GOAL_PERIODS = ("daily", "weekly", "monthly")
+MAX_GOALS_PER_USER = 20
+
+
+class InvalidGoal(ValueError):
+    """Raised when a goal has an unknown type or period, or a non-positive target."""
+
+
+def _period_start(day: str, period: str = "period") -> str:
+    """SQL for the first day of the goal period containing `day` (weeks start on Monday)."""
+    return f"""(CASE {period}
+        WHEN 'daily' THEN {day}::date
+        WHEN 'weekly' THEN date_trunc('week', {day}::date)::date
+        ELSE date_trunc('month', {day}::date)::date
+    END)"""
+
+
+GOAL_COLUMNS = f"""
+    id, "userId", type, target, period, "isActive", "createdAt", "updatedAt",
+    CASE WHEN "periodStart" < {_period_start('$2')} THEN 0
+         WHEN metric = 'efficiency' THEN COALESCE(progress / NULLIF(samples, 0), 0)
+         ELSE progress
+    END AS current
+"""
+
+# $2 is today (UTC); progress from an earlier period reads as 0 without a write.
+LIST_SQL = f'SELECT {GOAL_COLUMNS} FROM user_goals WHERE "userId" = $1 ORDER BY "createdAt"'
+
+# $2 summary day, $3 minutes saved, $4 reading efficiency (NULL when the article length is unknown)
+RECORD_SQL = f"""
+UPDATE user_goals SET
+    progress = (CASE WHEN "periodStart" = {_period_start('$2')} THEN progress ELSE 0 END)
+        + CASE metric WHEN 'summaries' THEN 1 WHEN 'time_saved' THEN $3::float8 ELSE COALESCE($4::float8, 0) END,
+    samples = (CASE WHEN "periodStart" = {_period_start('$2')} THEN samples ELSE 0 END)
+        + CASE WHEN metric = 'efficiency' AND $4::float8 IS NULL THEN 0 ELSE 1 END,
+    "periodStart" = {_period_start('$2')},
+    "updatedAt" = NOW()
+WHERE "userId" = $1 AND "isActive" AND "periodStart" <= {_period_start('$2')}
+"""
+
+# Only goals whose current period contains the deleted summary give its contribution back.
+REMOVE_SQL = f"""
+UPDATE user_goals SET
+    progress = GREATEST(progress
+        - CASE metric WHEN 'summaries' THEN 1 WHEN 'time_saved' THEN $3::float8 ELSE COALESCE($4::float8, 0) END, 0),
+    samples = GREATEST(samples - CASE WHEN metric = 'efficiency' AND $4::float8 IS NULL THEN 0 ELSE 1 END, 0),
+    "updatedAt" = NOW()
+WHERE "userId" = $1 AND "isActive" AND "periodStart" = {_period_start('$2')}
+"""
+
+ROLLOVER_SQL = f"""
+UPDATE user_goals SET progress = 0, samples = 0, "periodStart" = {_period_start('$1')}, "updatedAt" = NOW()
+WHERE "periodStart" < {_period_start('$1')}
+"""
+
+# Progress so far in the period, for goals created or re-activated mid-period. Reads the
+# daily rollups; only efficiency goals look at the (date-bounded) summaries themselves.
+SEED_SQL = """
+SELECT
+    CASE $3
+        WHEN 'summaries' THEN (SELECT COALESCE(SUM("summaryCount"), 0)::float8 FROM user_daily_stats WHERE "userId" = $1 AND day >= $2::date)
+        WHEN 'time_saved' THEN (SELECT COALESCE(SUM("timeSaved"), 0)::float8 FROM user_daily_stats WHERE "userId" = $1 AND day >= $2::date)
+        ELSE (SELECT COALESCE(SUM(GREATEST(1 - summary_word_count::float8 / original_word_count, 0) * 100), 0)
+              FROM summary_history
+              WHERE "userId" = $1 AND "createdAt" >= $2::date AND original_word_count > 0 AND summary_word_count IS NOT NULL)
+    END AS progress,
+    CASE $3
+        WHEN 'efficiency' THEN (SELECT COUNT(*)::int FROM summary_history
+                                WHERE "userId" = $1 AND "createdAt" >= $2::date AND original_word_count > 0
+                                  AND summary_word_count IS NOT NULL)
+        ELSE (SELECT COALESCE(SUM("summaryCount"), 0)::int FROM user_daily_stats WHERE "userId" = $1 AND day >= $2::date)
+    END AS samples
+"""
+
+
+def reading_efficiency(summary_words: int, original_words: Optional[int]) -> Optional[float]:
+    """Percentage by which the summary shortened the article, or None if its length is unknown."""
+    if not original_words:
+        return None
+    return max(0.0, 1 - summary_words / original_words) * 100
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+class GoalsService:
+    """CRUD for user_goals plus the counter updates done alongside summary writes"""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def list_goals(self, user_id: str) -> List[Dict[str, Any]]:
+        return await self.db.query_raw(LIST_SQL, user_id, _today())
+
+    async def create_goal(self, user_id: str, type_: str, target: int, period: str) -> Dict[str, Any]:
+        metric = GOAL_METRICS.get(type_)
+        if metric is None:
+            raise InvalidGoal(f"Unknown goal type '{type_}'. Allowed: {', '.join(GOAL_METRICS)}")
+        if period not in GOAL_PERIODS:
+            raise InvalidGoal(f"Unknown goal period '{period}'. Allowed: {', '.join(GOAL_PERIODS)}")
+        if target <= 0:
+            raise InvalidGoal("Goal target must be positive.")
+        existing = await self.db.query_raw('SELECT COUNT(*)::int AS n FROM user_goals WHERE "userId" = $1', user_id)
+        if existing[0]["n"] >= MAX_GOALS_PER_USER:
+            raise InvalidGoal(f"A user can have at most {MAX_GOALS_PER_USER} goals.")
+
+        goal_id = str(uuid.uuid4())
+        await self.db.execute_raw(
+            f"""
+            INSERT INTO user_goals (id, "userId", type, metric, target, period, "periodStart", progress, samples, "isActive", "createdAt", "updatedAt")
+            VALUES ($1, $2, $3, $4, $5, $6, {_period_start('$7', '$6::text')}, 0, 0, true, NOW(), NOW())
+            """,
+            goal_id, user_id, type_, metric, target, period, _today(),
+        )
+        await self._seed(goal_id, user_id)
+        return await self.get_goal(user_id, goal_id)
+
+    async def get_goal(self, user_id: str, goal_id: str) -> Optional[Dict[str, Any]]:
+        rows = await self.db.query_raw(
+            f'SELECT {GOAL_COLUMNS} FROM user_goals WHERE "userId" = $1 AND id = $3', user_id, _today(), goal_id
+        )
+        return rows[0] if rows else None
+
+    async def update_goal(
+        self, user_id: str, goal_id: str, target: Optional[int] = None, is_active: Optional[bool] = None
+    ) -> Optional[Dict[str, Any]]:
+        if target is not None and target <= 0:
+            raise InvalidGoal("Goal target must be positive.")
+        rows = await self.db.query_raw(
+            """
+            UPDATE user_goals g SET
+                target = COALESCE($3, g.target),
+                "isActive" = COALESCE($4, g."isActive"),
+                "updatedAt" = NOW()
+            FROM user_goals prev
+            WHERE g.id = prev.id AND g."userId" = $1 AND g.id = $2
+            RETURNING prev."isActive" AS "wasActive", g."isActive" AS "isActive"
+            """,
+            user_id, goal_id, target, is_active,
+        )
+        if not rows:
+            return None
+        if rows[0]["isActive"] and not rows[0]["wasActive"]:
+            # Saves were not counted while the goal was paused
+            await self._seed(goal_id, user_id)
+        return await self.get_goal(user_id, goal_id)
+
+    async def delete_goal(self, user_id: str, goal_id: str) -> bool:
+        return await self.db.execute_raw('DELETE FROM user_goals WHERE "userId" = $1 AND id = $2', user_id, goal_id) > 0
+
+    async def _seed(self, goal_id: str, user_id: str) -> None:
+        rows = await self.db.query_raw(
+            f'SELECT metric, {_period_start("$2")} AS start FROM user_goals WHERE id = $1', goal_id, _today()
+        )
+        if not rows:
+            return
+        seed = await self.db.query_raw(SEED_SQL, user_id, str(rows[0]["start"]), rows[0]["metric"])
+        await self.db.execute_raw(
+            'UPDATE user_goals SET progress = $2, samples = $3, "periodStart" = $4::date, "updatedAt" = NOW() WHERE id = $1',
+            goal_id, seed[0]["progress"], seed[0]["samples"], str(rows[0]["start"]),
+        )
+
+    async def record_summary(
+        self, user_id: str, created_at: Any, summary_words: int, original_words: Optional[int] = None
+    ) -> None:
+        await self.db.execute_raw(
+            RECORD_SQL,
+            user_id,
+            utc_day(created_at),
+            estimate_time_saved(summary_words, original_words),
+            reading_efficiency(summary_words, original_words),
+        )
+
+    async def remove_summary(self, user_id: str, summary: Dict[str, Any]) -> None:
+        """Takes a deleted summary_history row (as a dict) back out of the goals it counted towards."""
+        day, _, words, time_saved = row_contribution(summary)
+        await self.db.execute_raw(
+            REMOVE_SQL, user_id, day, time_saved, reading_efficiency(words, summary.get("originalWordCount"))
+        )
+
+    async def rollover(self) -> bool:
+        """PollingWorker handler: moves goals whose period has ended into the current one."""
+        rolled = await self.db.execute_raw(ROLLOVER_SQL, _today())
+        if rolled:
+            logger.info(f"[Goals] Rolled {rolled} goals over to a new period")
+        return False
+
+
+async def _main(argv: List[str]) -> None:
+    from prisma import Prisma
+
+    if argv[:1] != ["rollover"]:
+        raise SystemExit("usage: python -m services.goals rollover")
+    db = Prisma()
+    await db.connect()
+    try:
+        await GoalsService(db).rollover()
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(sys.argv[1:]))
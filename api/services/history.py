@@ -0,0 +1,72 @@
+"""
+History Service - Column-projected reads of a user's summary history
+"""
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# API field name -> SQL column expression. Only these may be projected, which is also
+# what keeps the dynamically built SELECT list safe.
+HISTORY_FIELDS: Dict[str, str] = {
+    "id": 'h.id AS "id"',
+    "userId": 'h."userId" AS "userId"',
+    "url": 'h.url AS "url"',
+    "title": 'h.title AS "title"',
+    "tldr": 'h.tldr AS "tldr"',
+    "keyPoints": 'h.key_points AS "keyPoints"',
+    "createdAt": 'h."createdAt" AS "createdAt"',
+}
+
+DEFAULT_FIELDS = ["id", "userId", "url", "title", "tldr", "keyPoints", "createdAt"]
+MAX_LIST_LIMIT = 100
+
+
+class InvalidHistoryFields(ValueError):
+    """Raised when a fields= projection names an unknown field."""
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """Parse a comma-separated fields= parameter into an ordered, de-duplicated list.
+
+    `id` is always included so clients can lazily load the full item later.
+    """
+    if not fields:
+        return list(DEFAULT_FIELDS)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in HISTORY_FIELDS]
+    if unknown:
+        raise InvalidHistoryFields(f"Unknown history field(s): {', '.join(unknown)}. Allowed: {', '.join(HISTORY_FIELDS)}")
+    selected = ["id"]
+    for field in requested:
+        if field not in selected:
+            selected.append(field)
+    return selected
+
+
+class HistoryService:
+    """Summary history reads that only touch the requested columns"""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def list_items(self, user_id: str, fields: List[str], limit: int = MAX_LIST_LIMIT) -> List[Dict[str, Any]]:
+        select_list = ", ".join(HISTORY_FIELDS[f] for f in fields)
+        rows = await self.db.query_raw(
+            f"""
+            SELECT {select_list}
+            FROM summary_history h
+            WHERE h."userId" = $1
+            ORDER BY h."createdAt" DESC, h.id DESC
+            LIMIT $2
+            """,
+            user_id,
+            min(limit, MAX_LIST_LIMIT),
+        )
+        logger.info(f"[History] Listed {len(rows)} items for {user_id} with fields={fields}")
+        return rows
+
+    async def get_item(self, user_id: str, history_id: str):
+        return await self.db.summaryhistory.find_first(
+            where={"id": history_id, "userId": user_id}
+        )
@@ -0,0 +1,156 @@
+"""
+History Deletion Service - Chunked, resumable background deletion of summary history
+"""
+import asyncio
+import logging
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DELETION_BATCH_SIZE = 1000
+DELETION_BATCH_PAUSE_SECONDS = 0.05
+DELETION_MAX_ATTEMPTS = 5
+# A running job whose progress has not moved for this long is assumed orphaned
+# (e.g. the machine restarted mid-job) and is picked up again.
+DELETION_STALE_AFTER = "5 minutes"
+
+JOB_KIND_HISTORY = "history"  # Clear a user's history, keep the account
+JOB_KIND_USER = "user"        # Clear history, then delete the user row (Clerk user.deleted)
+
+JOB_COLUMNS = 'id, "userId", kind, status, "deletedCount", attempts, error, "createdAt", "updatedAt", "completedAt"'
+
+# The partial unique index on ("userId", kind) for active jobs makes enqueueing idempotent:
+# repeated clicks or webhook retries attach to the job that is already queued or running.
+ENQUEUE_SQL = f"""
+INSERT INTO history_deletion_jobs (id, "userId", kind, status, "deletedCount", attempts, "createdAt", "updatedAt")
+VALUES ($1, $2, $3, 'pending', 0, 0, NOW(), NOW())
+ON CONFLICT ("userId", kind) WHERE status IN ('pending', 'running') DO NOTHING
+RETURNING {JOB_COLUMNS}
+"""
+
+ACTIVE_JOB_SQL = f"""
+SELECT {JOB_COLUMNS} FROM history_deletion_jobs
+WHERE "userId" = $1 AND kind = $2 AND status IN ('pending', 'running')
+LIMIT 1
+"""
+
+CLAIM_JOB_SQL = f"""
+UPDATE history_deletion_jobs
+SET status = 'running', attempts = attempts + 1, "updatedAt" = NOW()
+WHERE id = (
+    SELECT id FROM history_deletion_jobs
+    WHERE (status = 'pending' AND "updatedAt" <= NOW() - attempts * INTERVAL '30 seconds')
+       OR (status = 'running' AND "updatedAt" < NOW() - INTERVAL '{DELETION_STALE_AFTER}')
+    ORDER BY "createdAt"
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING {JOB_COLUMNS}
+"""
+
+DELETE_BATCH_SQL = """
+DELETE FROM summary_history
+WHERE id IN (
+    SELECT id FROM summary_history
+    WHERE "userId" = $1
+    LIMIT $2
+)
+"""
+
+PROGRESS_SQL = """
+UPDATE history_deletion_jobs
+SET "deletedCount" = "deletedCount" + $2, "updatedAt" = NOW()
+WHERE id = $1
+"""
+
+
+class HistoryDeletionService:
+    """Queues bulk history/user deletions and works them off in small batches"""
+
+    def __init__(
+        self,
+        db,
+        batch_size: int = DELETION_BATCH_SIZE,
+        pause_seconds: float = DELETION_BATCH_PAUSE_SECONDS,
+        on_complete: Optional[Callable[[str], None]] = None,
+    ):
+        self.db = db
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+        self.on_complete = on_complete  # Called with the user id once a job has finished
+
+    async def enqueue(self, user_id: str, kind: str = JOB_KIND_HISTORY) -> Dict[str, Any]:
+        rows = await self.db.query_raw(ENQUEUE_SQL, str(uuid.uuid4()), user_id, kind)
+        if rows:
+            logger.info(f"[History Deletion] Queued {kind} deletion job {rows[0]['id']} for {user_id}")
+            return rows[0]
+        rows = await self.db.query_raw(ACTIVE_JOB_SQL, user_id, kind)
+        if rows:
+            logger.info(f"[History Deletion] Reusing active {kind} deletion job {rows[0]['id']} for {user_id}")
+            return rows[0]
+        # The active job finished between the two statements; queue a fresh one.
+        return await self.enqueue(user_id, kind)
+
+    async def get_job(self, user_id: str, job_id: str) -> Optional[Dict[str, Any]]:
+        rows = await self.db.query_raw(
+            f'SELECT {JOB_COLUMNS} FROM history_deletion_jobs WHERE id = $1 AND "userId" = $2',
+            job_id,
+            user_id,
+        )
+        return rows[0] if rows else None
+
+    async def run_next(self) -> bool:
+        """Claims and runs one pending job. Returns False when the queue is empty."""
+        rows = await self.db.query_raw(CLAIM_JOB_SQL)
+        if not rows:
+            return False
+        job = rows[0]
+        try:
+            await self._run_job(job)
+        except Exception as e:
+            status = "failed" if job["attempts"] >= DELETION_MAX_ATTEMPTS else "pending"
+            logger.error(f"[History Deletion] Job {job['id']} attempt {job['attempts']} failed, marking {status}: {e}", exc_info=True)
+            await self.db.execute_raw(
+                'UPDATE history_deletion_jobs SET status = $2, error = $3, "updatedAt" = NOW() WHERE id = $1',
+                job["id"],
+                status,
+                str(e)[:1000],
+            )
+        return True
+
+    async def _run_job(self, job: Dict[str, Any]) -> None:
+        user_id = job["userId"]
+        total = 0
+        while True:
+            # Each batch is its own short statement, so locks are held only briefly and
+            # an interrupted job resumes from whatever rows are left.
+            deleted = await self.db.execute_raw(DELETE_BATCH_SQL, user_id, self.batch_size)
+            if deleted:
+                total += deleted
+                await self.db.execute_raw(PROGRESS_SQL, job["id"], deleted)
+            if deleted < self.batch_size:
+                break
+            await asyncio.sleep(self.pause_seconds)
+
+        # Vectors cascade with their summaries; the per-user IVF centroids, rollups and insights do not.
+        await self.db.execute_raw('DELETE FROM embedding_indexes WHERE "userId" = $1', user_id)
+        await self.db.execute_raw('DELETE FROM user_daily_stats WHERE "userId" = $1', user_id)
+        await self.db.execute_raw('DELETE FROM user_insights WHERE "userId" = $1', user_id)
+
+        if job["kind"] == JOB_KIND_USER:
+            await self.db.execute_raw('DELETE FROM user_goals WHERE "userId" = $1', user_id)
+            removed = await self.db.execute_raw('DELETE FROM users WHERE "clerkId" = $1', user_id)
+            logger.info(f"[History Deletion] Removed {removed} user row(s) for {user_id}")
+        else:
+            await self.db.execute_raw(
+                'UPDATE user_goals SET progress = 0, samples = 0, "updatedAt" = NOW() WHERE "userId" = $1', user_id
+            )
+
+        await self.db.execute_raw(
+            'UPDATE history_deletion_jobs SET status = \'completed\', error = NULL, "updatedAt" = NOW(), "completedAt" = NOW() WHERE id = $1',
+            job["id"],
+        )
+        logger.info(f"[History Deletion] Job {job['id']} ({job['kind']}) completed for {user_id}: {total} rows deleted")
+        if self.on_complete:
+            self.on_complete(user_id)
@@ -0,0 +1,100 @@
+"""
+History Export Service - Constant-memory streaming export of a user's summary history
+"""
+import csv
+import io
+import json
+import logging
+import zlib
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+EXPORT_PAGE_SIZE = 500
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+}
+CSV_COLUMNS = ["id", "createdAt", "title", "url", "tldr", "keyPoints"]
+
+# Keyset pagination on ("createdAt", id) walks the ("userId", "createdAt" DESC) index,
+# so every page costs the same no matter how deep into the history it is.
+FIRST_PAGE_SQL = """
+SELECT id, url, title, tldr, key_points AS "keyPoints", "createdAt"
+FROM summary_history
+WHERE "userId" = $1
+ORDER BY "createdAt" DESC, id DESC
+LIMIT $2
+"""
+
+NEXT_PAGE_SQL = """
+SELECT id, url, title, tldr, key_points AS "keyPoints", "createdAt"
+FROM summary_history
+WHERE "userId" = $1 AND ("createdAt", id) < ($3::timestamp, $4)
+ORDER BY "createdAt" DESC, id DESC
+LIMIT $2
+"""
+
+
+class HistoryExportService:
+    """Streams summary history rows page by page as NDJSON or CSV, optionally gzipped"""
+
+    def __init__(self, db, page_size: int = EXPORT_PAGE_SIZE):
+        self.db = db
+        self.page_size = page_size
+
+    async def iter_pages(self, user_id: str) -> AsyncIterator[List[Dict[str, Any]]]:
+        rows = await self.db.query_raw(FIRST_PAGE_SQL, user_id, self.page_size)
+        while rows:
+            yield rows
+            if len(rows) < self.page_size:
+                return
+            last = rows[-1]
+            rows = await self.db.query_raw(NEXT_PAGE_SQL, user_id, self.page_size, last["createdAt"], last["id"])
+
+    async def stream(self, user_id: str, export_format: str = "ndjson", compress: bool = False) -> AsyncIterator[bytes]:
+        encoder = _encode_ndjson if export_format == "ndjson" else _encode_csv
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # wbits=31 -> gzip container
+        exported = 0
+
+        if export_format == "csv":
+            yield _maybe_compress(compressor, _csv_line(CSV_COLUMNS))
+
+        async for page in self.iter_pages(user_id):
+            exported += len(page)
+            chunk = _maybe_compress(compressor, encoder(page))
+            if chunk:
+                yield chunk
+
+        if compressor:
+            yield compressor.flush()
+        logger.info(f"[History Export] Streamed {exported} rows for {user_id} as {export_format} (gzip={compress})")
+
+
+def _maybe_compress(compressor, data: bytes) -> bytes:
+    return compressor.compress(data) if compressor else data
+
+
+def _encode_ndjson(rows: List[Dict[str, Any]]) -> bytes:
+    return "".join(json.dumps(row, ensure_ascii=False, default=str) + "\n" for row in rows).encode("utf-8")
+
+
+def _csv_line(values: List[Optional[str]]) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue().encode("utf-8")
+
+
+def _encode_csv(rows: List[Dict[str, Any]]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([
+            row["id"],
+            row["createdAt"],
+            row.get("title") or "",
+            row.get("url") or "",
+            row["tldr"],
+            "\n".join(row.get("keyPoints") or []),
+        ])
+    return buffer.getvalue().encode("utf-8")
@@ -0,0 +1,138 @@
+"""
+History Search Service - Ranked full-text search over a user's summary history
+"""
+import base64
+import html
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Control characters used as highlight delimiters inside Postgres, then swapped
+# for <mark> tags after the surrounding text has been HTML-escaped.
+_HL_START = "\x02"
+_HL_STOP = "\x03"
+
+SNIPPET_OPTIONS = f"StartSel={_HL_START}, StopSel={_HL_STOP}, MaxFragments=2, MaxWords=30, MinWords=10, FragmentDelimiter= … "
+TITLE_OPTIONS = f"StartSel={_HL_START}, StopSel={_HL_STOP}, HighlightAll=true"
+
+MAX_QUERY_LENGTH = 256
+
+# Matches are ranked per user through the ("userId", search_vector) GIN index, and
+# only the requested page is joined back to build the (comparatively expensive) headlines.
+SEARCH_SQL = """
+WITH query AS (
+    SELECT websearch_to_tsquery('english', $2) AS q
+),
+matches AS (
+    SELECT h.id, ts_rank_cd(h.search_vector, query.q) AS rank
+    FROM summary_history h, query
+    WHERE h."userId" = $1 AND h.search_vector @@ query.q
+),
+page AS (
+    SELECT id, rank
+    FROM matches
+    WHERE $3::real IS NULL OR rank < $3::real OR (rank = $3::real AND id > $4)
+    ORDER BY rank DESC, id ASC
+    LIMIT $5
+)
+SELECT
+    h.id,
+    h.url,
+    h.title,
+    h."createdAt",
+    page.rank,
+    ts_headline('english', h.tldr, query.q, $6) AS snippet,
+    ts_headline('english', coalesce(h.title, ''), query.q, $7) AS "titleHighlight"
+FROM page
+JOIN summary_history h ON h.id = page.id
+CROSS JOIN query
+ORDER BY page.rank DESC, page.id ASC
+"""
+
+
+class InvalidSearchCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+@dataclass
+class SearchResultPage:
+    """One page of ranked search results plus the cursor for the next page"""
+    results: List[Dict[str, Any]]
+    next_cursor: Optional[str]
+
+
+def encode_cursor(rank: float, item_id: str) -> str:
+    raw = json.dumps({"r": rank, "id": item_id}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return float(data["r"]), str(data["id"])
+    except Exception as e:
+        raise InvalidSearchCursor(f"Invalid search cursor: {e}") from e
+
+
+def render_highlight(text: Optional[str]) -> str:
+    """Escape headline text and turn the Postgres highlight delimiters into <mark> tags."""
+    if not text:
+        return ""
+    escaped = html.escape(text, quote=False)
+    return escaped.replace(_HL_START, "<mark>").replace(_HL_STOP, "</mark>")
+
+
+class HistorySearchService:
+    """Keyword search over summary_history backed by the generated tsvector column"""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def search(
+        self,
+        user_id: str,
+        query: str,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+    ) -> SearchResultPage:
+        query = query.strip()[:MAX_QUERY_LENGTH]
+        after_rank, after_id = decode_cursor(cursor) if cursor else (None, None)
+
+        # Fetch one extra row to know whether another page exists without a COUNT(*).
+        rows = await self.db.query_raw(
+            SEARCH_SQL,
+            user_id,
+            query,
+            after_rank,
+            after_id,
+            limit + 1,
+            SNIPPET_OPTIONS,
+            TITLE_OPTIONS,
+        )
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        results = [
+            {
+                "id": row["id"],
+                "url": row.get("url"),
+                "title": row.get("title"),
+                "createdAt": row["createdAt"],
+                "rank": float(row["rank"]),
+                "snippet": render_highlight(row.get("snippet")),
+                "titleHighlight": render_highlight(row.get("titleHighlight")) or None,
+            }
+            for row in rows
+        ]
+
+        next_cursor = None
+        if has_more and results:
+            last = results[-1]
+            next_cursor = encode_cursor(last["rank"], last["id"])
+
+        logger.info(f"[History Search] user={user_id} query_len={len(query)} results={len(results)} has_more={has_more}")
+        return SearchResultPage(results=results, next_cursor=next_cursor)
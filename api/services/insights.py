@@ -0,0 +1,319 @@
+"""
+Insights Service - Periodic batch job that precomputes personalized analytics insights
+
+Insights are derived from the user_daily_stats rollups, a chunk of users at a time with one
+set-based query per chunk, and stored as one JSON document per user in user_insights so
+/api/analytics/insights is a single primary-key read.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+INSIGHTS_CHUNK_SIZE = 500
+INSIGHTS_ACTIVE_DAYS = 30        # Users with a summary in this window are refreshed
+INSIGHTS_LOOKBACK_DAYS = 60      # Rollup history read per user
+INSIGHTS_MAX_PER_USER = 5
+INSIGHTS_REFRESH_SECONDS = int(os.getenv("INSIGHTS_REFRESH_SECONDS", str(6 * 3600)))
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+PRIORITY_ORDER = {"high": 0, "medium": 1, "low": 2}
+
+# Shown until the batch job has produced something for the user.
+DEFAULT_INSIGHTS: List[Dict[str, Any]] = [
+    {
+        "type": "getting_started",
+        "title": "Build your reading profile",
+        "description": "Summarize a few articles this week and we'll show trends, reading patterns and time saved here.",
+        "value": None,
+        "trend": None,
+        "actionable": "Try summarizing longer articles to maximize your time savings.",
+        "priority": "medium",
+        "icon": "lightbulb",
+    }
+]
+
+users_processed = registry.counter("insights_users_processed_total", "Users whose insights were recomputed.")
+chunk_seconds = registry.histogram("insights_chunk_seconds", "Time to compute and store insights for one chunk of users.")
+
+ACTIVE_USERS_SQL = f"""
+SELECT DISTINCT "userId"
+FROM user_daily_stats
+WHERE day > $1::date - {INSIGHTS_ACTIVE_DAYS} AND "userId" > $2
+ORDER BY "userId"
+LIMIT $3
+"""
+
+# One row of signals per user in $1, all from rollups. $2 is today (UTC).
+SIGNALS_SQL = f"""
+WITH s AS (
+    SELECT "userId" AS user_id, day, category, "summaryCount" AS n, "timeSaved" AS saved, "wordsProduced" AS words
+    FROM user_daily_stats
+    WHERE "userId" = ANY($1::text[]) AND day > $2::date - {INSIGHTS_LOOKBACK_DAYS} AND "summaryCount" > 0
+),
+totals AS (
+    SELECT
+        user_id,
+        COALESCE(SUM(n) FILTER (WHERE day > $2::date - 7), 0) AS week_count,
+        COALESCE(SUM(n) FILTER (WHERE day > $2::date - 14 AND day <= $2::date - 7), 0) AS prev_week_count,
+        COALESCE(SUM(saved) FILTER (WHERE day > $2::date - 7), 0) AS week_saved,
+        COALESCE(SUM(saved) FILTER (WHERE day > $2::date - 14 AND day <= $2::date - 7), 0) AS prev_week_saved,
+        COALESCE(SUM(n) FILTER (WHERE day > $2::date - 30), 0) AS month_count,
+        COUNT(DISTINCT day) FILTER (WHERE day > $2::date - 30) AS month_active_days,
+        BOOL_OR(day = $2::date) AS active_today
+    FROM s
+    GROUP BY user_id
+),
+weekdays AS (
+    SELECT DISTINCT ON (user_id) user_id, EXTRACT(ISODOW FROM day)::int AS weekday, SUM(n) AS weekday_count
+    FROM s
+    WHERE day > $2::date - 56
+    GROUP BY user_id, EXTRACT(ISODOW FROM day)
+    ORDER BY user_id, SUM(n) DESC, EXTRACT(ISODOW FROM day)
+),
+categories AS (
+    SELECT
+        user_id,
+        category,
+        COALESCE(SUM(n) FILTER (WHERE day > $2::date - 30), 0) AS recent,
+        COALESCE(SUM(n) FILTER (WHERE day <= $2::date - 30), 0) AS previous
+    FROM s
+    GROUP BY user_id, category
+),
+top_categories AS (
+    SELECT
+        user_id,
+        (array_agg(category ORDER BY recent DESC, category) FILTER (WHERE recent > 0))[1] AS recent_top,
+        (array_agg(category ORDER BY previous DESC, category) FILTER (WHERE previous > 0))[1] AS previous_top,
+        MAX(recent)::float / NULLIF(SUM(recent), 0) AS recent_top_share
+    FROM categories
+    GROUP BY user_id
+),
+-- Consecutive active days ending yesterday; today may simply not have happened yet.
+streaks AS (
+    SELECT user_id, COUNT(*) AS streak
+    FROM (
+        SELECT user_id, day + (ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY day DESC))::int AS island
+        FROM (SELECT DISTINCT user_id, day FROM s WHERE day < $2::date) active_days
+    ) islands
+    WHERE island = $2::date
+    GROUP BY user_id
+)
+SELECT
+    t.user_id AS "userId", t.week_count, t.prev_week_count, t.week_saved, t.prev_week_saved,
+    t.month_count, t.month_active_days, t.active_today,
+    w.weekday, w.weekday_count, tc.recent_top, tc.previous_top, tc.recent_top_share,
+    COALESCE(st.streak, 0) AS streak
+FROM totals t
+LEFT JOIN weekdays w USING (user_id)
+LEFT JOIN top_categories tc USING (user_id)
+LEFT JOIN streaks st USING (user_id)
+"""
+
+UPSERT_SQL = """
+INSERT INTO user_insights ("userId", insights, "computedAt")
+SELECT u.user_id, u.insights::jsonb, NOW()
+FROM unnest($1::text[], $2::text[]) AS u(user_id, insights)
+ON CONFLICT ("userId") DO UPDATE SET insights = EXCLUDED.insights, "computedAt" = EXCLUDED."computedAt"
+"""
+
+# Users who went quiet fall back to DEFAULT_INSIGHTS instead of keeping a stale streak warning.
+PRUNE_SQL = f"""
+DELETE FROM user_insights i
+WHERE NOT EXISTS (
+    SELECT 1 FROM user_daily_stats s
+    WHERE s."userId" = i."userId" AND s.day > $1::date - {INSIGHTS_ACTIVE_DAYS}
+)
+"""
+
+
+def _insight(type_: str, title: str, description: str, priority: str, icon: str, value: Optional[float] = None,
+             trend: Optional[str] = None, actionable: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "type": type_,
+        "title": title,
+        "description": description,
+        "value": value,
+        "trend": trend,
+        "actionable": actionable,
+        "priority": priority,
+        "icon": icon,
+    }
+
+
+def _plural(count: float, singular: str, plural: Optional[str] = None) -> str:
+    count = int(count)
+    return f"{count} {singular}" if count == 1 else f"{count} {plural or singular + 's'}"
+
+
+def build_insights(signals: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Turns one user's signal row into at most INSIGHTS_MAX_PER_USER insights, most urgent first."""
+    insights = []
+    week, prev_week = int(signals["week_count"] or 0), int(signals["prev_week_count"] or 0)
+    week_saved, prev_week_saved = float(signals["week_saved"] or 0), float(signals["prev_week_saved"] or 0)
+    streak = int(signals["streak"] or 0)
+
+    if streak >= 2 and not signals["active_today"]:
+        insights.append(_insight(
+            "streak_risk", f"Keep your {streak}-day streak alive",
+            f"You've summarized something every day for {_plural(streak, 'day')}. Nothing yet today.",
+            "high", "flame", value=streak, actionable="Summarize one article today to keep the streak going.",
+        ))
+    elif signals["active_today"] and streak + 1 >= 3:
+        insights.append(_insight(
+            "streak", f"{streak + 1}-day streak",
+            f"You've summarized something every day for {_plural(streak + 1, 'day')} in a row.",
+            "low", "flame", value=streak + 1, trend="up",
+        ))
+
+    if prev_week > 0 and week != prev_week:
+        change = round((week - prev_week) / prev_week * 100)
+        direction = "up" if change > 0 else "down"
+        insights.append(_insight(
+            "trend", f"Summaries {direction} {abs(change)}% this week",
+            f"{_plural(week, 'summary', 'summaries')} in the last 7 days, compared with {prev_week} the week before.",
+            "medium" if direction == "down" else "low", "trending-up" if direction == "up" else "trending-down",
+            value=change, trend=direction,
+            actionable=None if direction == "up" else "Set a weekly goal to get back on track.",
+        ))
+    elif prev_week == 0 and week > 0:
+        insights.append(_insight(
+            "trend", "Back in the habit",
+            f"{_plural(week, 'summary', 'summaries')} this week after a quiet week.",
+            "low", "trending-up", value=week, trend="up",
+        ))
+
+    if week_saved > 0:
+        trend = None
+        if prev_week_saved > 0:
+            trend = "up" if week_saved > prev_week_saved else "down" if week_saved < prev_week_saved else "stable"
+        hours = week_saved / 60
+        title = f"You saved {hours:.1f} hours this week" if hours >= 1 else f"You saved {round(week_saved)} minutes this week"
+        insights.append(_insight(
+            "time_saved", title, "Estimated from the length of the articles you summarized versus the summaries.",
+            "medium", "clock", value=round(week_saved, 1), trend=trend,
+            actionable="Longer articles yield the biggest time savings.",
+        ))
+
+    recent_top, previous_top = signals.get("recent_top"), signals.get("previous_top")
+    if recent_top and previous_top and recent_top != previous_top:
+        insights.append(_insight(
+            "category_shift", f"Your focus shifted to {recent_top}",
+            f"{recent_top} is your most-read category this month; last month it was {previous_top}.",
+            "low", "shuffle",
+        ))
+    elif recent_top and (signals.get("recent_top_share") or 0) >= 0.6 and int(signals["month_count"] or 0) >= 5:
+        share = round(float(signals["recent_top_share"]) * 100)
+        insights.append(_insight(
+            "category_focus", f"Mostly {recent_top} lately",
+            f"{share}% of this month's summaries were {recent_top}.",
+            "low", "target", value=share, actionable="Branch out with a summary from a different category.",
+        ))
+
+    if signals.get("weekday") and int(signals.get("weekday_count") or 0) >= 3:
+        weekday = WEEKDAYS[int(signals["weekday"]) - 1]
+        insights.append(_insight(
+            "reading_pattern", f"You read most on {weekday}s",
+            f"{weekday} has been your busiest summarizing day over the last 8 weeks.",
+            "low", "calendar", actionable=f"Queue up longer reads for {weekday}.",
+        ))
+
+    insights.sort(key=lambda insight: PRIORITY_ORDER[insight["priority"]])
+    return insights[:INSIGHTS_MAX_PER_USER]
+
+
+class InsightsService:
+    """Refreshes stored insights for active users and serves them"""
+
+    def __init__(
+        self,
+        db,
+        chunk_size: int = INSIGHTS_CHUNK_SIZE,
+        refresh_seconds: int = INSIGHTS_REFRESH_SECONDS,
+        on_refresh: Optional[Callable[[str], None]] = None,
+    ):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.refresh_seconds = refresh_seconds
+        self.on_refresh = on_refresh  # Called with each user id whose stored insights were rewritten
+
+    async def get_insights(self, user_id: str) -> List[Dict[str, Any]]:
+        rows = await self.db.query_raw('SELECT insights FROM user_insights WHERE "userId" = $1', user_id)
+        if not rows:
+            return DEFAULT_INSIGHTS
+        insights = rows[0]["insights"]
+        insights = json.loads(insights) if isinstance(insights, str) else insights
+        return insights or DEFAULT_INSIGHTS
+
+    async def refresh_all(self, today: Optional[str] = None) -> Dict[str, float]:
+        """Recomputes insights for every active user, one chunk at a time."""
+        today = today or datetime.now(timezone.utc).date().isoformat()
+        start = time.perf_counter()
+        total = 0
+        last_user = ""
+        while True:
+            rows = await self.db.query_raw(ACTIVE_USERS_SQL, today, last_user, self.chunk_size)
+            if not rows:
+                break
+            user_ids = [row["userId"] for row in rows]
+            await self.refresh_users(user_ids, today)
+            total += len(user_ids)
+            last_user = user_ids[-1]
+            if len(rows) < self.chunk_size:
+                break
+            await asyncio.sleep(0)
+        pruned = await self.db.execute_raw(PRUNE_SQL, today)
+        elapsed = time.perf_counter() - start
+        rate = total / elapsed if elapsed > 0 else 0.0
+        logger.info(f"[Insights] Refreshed {total} users in {elapsed:.1f}s ({rate:.0f} users/s), pruned {pruned}")
+        return {"users": total, "seconds": elapsed, "usersPerSecond": rate}
+
+    async def refresh_users(self, user_ids: List[str], today: str) -> None:
+        chunk_start = time.perf_counter()
+        signals = await self.db.query_raw(SIGNALS_SQL, user_ids, today)
+        documents = [json.dumps(build_insights(row)) for row in signals]
+        if signals:
+            await self.db.execute_raw(UPSERT_SQL, [row["userId"] for row in signals], documents)
+        if self.on_refresh:
+            for row in signals:
+                self.on_refresh(row["userId"])
+        users_processed.inc(len(signals))
+        chunk_seconds.observe(time.perf_counter() - chunk_start)
+
+    async def run_if_due(self) -> bool:
+        """PollingWorker handler: refreshes everything when the last pass is older than the interval."""
+        rows = await self.db.query_raw(
+            'SELECT EXTRACT(EPOCH FROM (NOW() - MAX("computedAt")))::float AS age FROM user_insights'
+        )
+        age = rows[0]["age"] if rows else None
+        if age is not None and age < self.refresh_seconds:
+            return False
+        await self.refresh_all()
+        return False  # One pass per interval
+
+
+async def _main(argv: List[str]) -> None:
+    from prisma import Prisma
+
+    if argv[:1] != ["refresh"]:
+        raise SystemExit("usage: python -m services.insights refresh")
+    db = Prisma()
+    await db.connect()
+    try:
+        await InsightsService(db).refresh_all()
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(sys.argv[1:]))
@@ -0,0 +1,96 @@
+"""
+PDF Batch - Renders several resume PDFs at once on the shared browser pool
+
+Job seekers export one tailored resume per target job, often several in a row. A batch
+renders them concurrently instead of one request after another. Each item goes through
+the PDF cache (services/pdf_cache.py), so unchanged variants cost nothing and every
+rendered PDF stays downloadable by its id. At most PDF_BATCH_CONCURRENCY items of one
+batch hold a pool page at a time. That keeps a batch from filling the pool's wait queue
+and turning other users' single renders into 503s. With the default, the cap equals
+PDF_POOL_SIZE, so the batch takes about ceil(N / PDF_POOL_SIZE) render times.
+"""
+import asyncio
+import io
+import logging
+import os
+import time
+import zipfile
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional
+
+from .metrics import registry
+from .pdf_cache import PdfCache
+from .pdf_renderer import PDF_POOL_SIZE, PdfRendererBusy
+
+logger = logging.getLogger(__name__)
+
+PDF_BATCH_MAX_ITEMS = int(os.getenv("PDF_BATCH_MAX_ITEMS", "20"))
+PDF_BATCH_CONCURRENCY = int(os.getenv("PDF_BATCH_CONCURRENCY", str(PDF_POOL_SIZE)))
+
+batch_seconds = registry.histogram("pdf_batch_seconds", "Wall time of a resume PDF batch, including cache hits.")
+batch_items = registry.counter("pdf_batch_items_total", "Resume PDFs requested in batches, by result (rendered/cached/busy/failed).", ["result"])
+
+
+@dataclass
+class BatchItem:
+    key: str  # PDF id (pdf_cache_key)
+    filename: str
+    render: Callable[[], Awaitable[bytes]]
+
+
+@dataclass
+class BatchResult:
+    key: str
+    filename: str
+    pdf: Optional[bytes] = None
+    cached: bool = False
+    busy: bool = False  # The pool stayed full; retrying later may succeed
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.pdf is not None
+
+
+async def render_batch(
+    cache: PdfCache, owner: str, items: List[BatchItem], concurrency: int = PDF_BATCH_CONCURRENCY
+) -> List[BatchResult]:
+    """Renders (or loads from `owner`'s cache entries) every item, at most `concurrency` at a time.
+
+    Failures are reported per item rather than raised, so one bad render does not lose the
+    rest of the batch. Results are in the order of `items`.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    start = time.perf_counter()
+
+    async def one(item: BatchItem) -> BatchResult:
+        result = BatchResult(key=item.key, filename=item.filename)
+        async with semaphore:
+            try:
+                result.pdf, result.cached = await cache.get_or_render(owner, item.key, item.render)
+            except PdfRendererBusy as e:
+                result.busy, result.error = True, str(e)
+            except Exception as e:
+                logger.error(f"[PDF Batch] Rendering {item.key[:12]} failed: {e}", exc_info=True)
+                result.error = "Failed to generate PDF resume."
+        batch_items.inc(result="busy" if result.busy else "failed" if result.error else "cached" if result.cached else "rendered")
+        return result
+
+    results = await asyncio.gather(*(one(item) for item in items))
+    elapsed = time.perf_counter() - start
+    batch_seconds.observe(elapsed)
+    logger.info(
+        f"[PDF Batch] {len(items)} PDFs in {elapsed:.2f}s: {sum(r.cached for r in results)} cached, "
+        f"{sum(not r.ok for r in results)} failed"
+    )
+    return list(results)
+
+
+def zip_pdfs(results: List[BatchResult]) -> bytes:
+    """A zip of the rendered PDFs. PDFs are already compressed, so entries are stored as is."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for result in results:
+            if result.ok:
+                archive.writestr(result.filename, result.pdf)
+    return buffer.getvalue()
@@ -0,0 +1,210 @@
+"""
+PDF Cache - Content-addressed cache of rendered resume PDFs on the persistent volume
+
+A PDF's id is the SHA-256 of the template name, the template file's mtime and the
+normalized resume JSON, so identical requests map to the same id and editing a template
+invalidates everything rendered from it. The id doubles as the PDF's strong ETag.
+
+Resumes are personal data, so entries belong to the user who rendered them: the file is
+stored under the SHA-256 of the owner's user id and the PDF id. Looking up another
+user's id finds nothing, even for identical content, so an id that leaks cannot be used
+to download someone else's resume.
+
+Files live under PDF_CACHE_DIR (the Fly volume mounted at /data) as <key[:2]>/<key>.pdf,
+written atomically. The in-memory index (key -> size, least recently used first) is
+rebuilt from the directory at startup using file mtimes, which are bumped on every hit.
+Past PDF_CACHE_MAX_MB the least recently used files are deleted.
+
+If the directory cannot be created (e.g. no volume in local development) the cache is
+disabled and every request renders.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", "/data/pdf-cache")
+PDF_CACHE_MAX_MB = int(os.getenv("PDF_CACHE_MAX_MB", "256"))
+
+cache_requests = registry.counter("pdf_cache_requests_total", "Resume PDF cache lookups by result (hit/miss).", ["result"])
+cache_evictions = registry.counter("pdf_cache_evictions_total", "Cached PDFs deleted to stay under PDF_CACHE_MAX_MB.")
+
+
+def pdf_cache_key(template_name: str, template_mtime_ns: int, resume_data: Dict[str, Any]) -> str:
+    """The PDF id: hex SHA-256 over the template and the resume JSON with sorted keys."""
+    normalized = json.dumps(resume_data, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(f"{template_name}\0{template_mtime_ns}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+class _RenderAbandoned(Exception):
+    """The request rendering a PDF was cancelled; requests waiting on it render it themselves."""
+
+
+def _owned_key(owner: str, pdf_id: str) -> str:
+    return hashlib.sha256(f"{owner}\0{pdf_id}".encode("utf-8")).hexdigest()
+
+
+def pdf_etag(key: str) -> str:
+    return f'"{key}"'
+
+
+class PdfCache:
+    """Size-bounded LRU of rendered PDFs on disk"""
+
+    def __init__(self, directory: str = PDF_CACHE_DIR, max_bytes: int = PDF_CACHE_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = False
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._inflight: Dict[str, "asyncio.Future[bytes]"] = {}
+
+    async def load(self) -> None:
+        """Creates the directory and rebuilds the index from the files already in it."""
+        try:
+            entries = await asyncio.to_thread(self._scan)
+        except OSError as e:
+            logger.warning(f"[PDF Cache] Disabled, cannot use {self.directory}: {e}")
+            return
+        self._index = OrderedDict((key, size) for _, key, size in sorted(entries))
+        self._bytes = sum(self._index.values())
+        self.enabled = True
+        logger.info(f"[PDF Cache] {len(self._index)} PDFs ({self._bytes / 1e6:.1f} MB) in {self.directory}")
+        await self._evict()
+
+    def _scan(self):
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                if name.endswith(".tmp"):  # Left behind by a write that was interrupted
+                    os.unlink(path)
+                elif name.endswith(".pdf"):
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        return entries
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.pdf")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._hits + self._misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._index),
+            "bytes": self._bytes,
+            "maxBytes": self.max_bytes,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hitRate": round(self._hits / lookups, 3) if lookups else None,
+            "evictions": self._evictions,
+        }
+
+    async def get(self, owner: str, pdf_id: str) -> Optional[bytes]:
+        """The PDF `owner` rendered with this id, or None."""
+        return await self._get(_owned_key(owner, pdf_id))
+
+    async def _get(self, key: str) -> Optional[bytes]:
+        if key not in self._index:
+            return None
+        path = self._path(key)
+        try:
+            data = await asyncio.to_thread(self._read_and_touch, path)
+        except OSError:  # Deleted underneath us; forget it
+            self._bytes -= self._index.pop(key, 0)
+            return None
+        if key in self._index:
+            self._index.move_to_end(key)
+        return data
+
+    @staticmethod
+    def _read_and_touch(path: str) -> bytes:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path)  # Keeps LRU order across restarts
+        return data
+
+    async def _put(self, key: str, data: bytes) -> None:
+        if not self.enabled or key in self._index:
+            return
+        try:
+            await asyncio.to_thread(self._write, self._path(key), data)
+        except OSError as e:
+            logger.warning(f"[PDF Cache] Could not store {key}: {e}")
+            return
+        self._index[key] = len(data)
+        self._bytes += len(data)
+        await self._evict()
+
+    @staticmethod
+    def _write(path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    async def _evict(self) -> None:
+        victims = []
+        while self._bytes > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._bytes -= size
+            victims.append(self._path(key))
+        if victims:
+            self._evictions += len(victims)
+            cache_evictions.inc(len(victims))
+            await asyncio.to_thread(self._unlink_all, victims)
+
+    @staticmethod
+    def _unlink_all(paths) -> None:
+        for path in paths:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    async def get_or_render(self, owner: str, pdf_id: str, render: Callable[[], Awaitable[bytes]]) -> Tuple[bytes, bool]:
+        """(PDF bytes, whether they came from the cache). Concurrent misses for one key render once."""
+        key = _owned_key(owner, pdf_id)
+        data = await self._get(key)
+        if data is not None:
+            self._hits += 1
+            cache_requests.inc(result="hit")
+            return data, True
+        self._misses += 1
+        cache_requests.inc(result="miss")
+
+        # Wait on a render already in flight for this key. If the request doing it is
+        # cancelled (e.g. its client disconnected), the next waiter takes over the render.
+        while key in self._inflight:
+            try:
+                return await asyncio.shield(self._inflight[key]), False
+            except _RenderAbandoned:
+                continue
+        future: "asyncio.Future[bytes]" = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            data = await render()
+        except BaseException as e:
+            del self._inflight[key]
+            # Waiters get an ordinary exception, never this request's cancellation
+            future.set_exception(_RenderAbandoned() if isinstance(e, asyncio.CancelledError) else e)
+            future.exception()  # Marks it retrieved when nobody else was waiting
+            raise
+        future.set_result(data)
+        try:
+            await self._put(key, data)
+        finally:
+            del self._inflight[key]  # Only once the file is indexed, so no one renders it again
+        return data, False
@@ -0,0 +1,218 @@
+"""
+PDF Renderer - One long-lived Chromium with a pool of warm pages for resume PDFs
+
+The browser is launched at startup and PDF_POOL_SIZE pages are opened up front, each in
+its own browser context so nothing one user's render leaves behind (storage, cookies)
+is visible to the next. A render borrows a page and gives it back. A page is recycled
+(context closed, a fresh one opened) after PDF_PAGE_MAX_RENDERS renders or after any
+error, and the browser is relaunched when it has crashed or disconnected.
+
+Rendering never touches the filesystem: the HTML is injected with set_content() and the
+PDF bytes come back from page.pdf() in memory.
+
+Callers wait for a free page in a bounded queue. With PDF_QUEUE_LIMIT requests already
+waiting, or after PDF_ACQUIRE_TIMEOUT_SECONDS, they get PdfRendererBusy and the endpoint
+answers 503 rather than letting requests and memory pile up.
+"""
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from playwright.async_api import async_playwright
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+PDF_POOL_SIZE = int(os.getenv("PDF_POOL_SIZE", "2"))
+PDF_PAGE_MAX_RENDERS = int(os.getenv("PDF_PAGE_MAX_RENDERS", "100"))
+PDF_QUEUE_LIMIT = int(os.getenv("PDF_QUEUE_LIMIT", "20"))
+PDF_ACQUIRE_TIMEOUT_SECONDS = float(os.getenv("PDF_ACQUIRE_TIMEOUT_SECONDS", "20"))
+# /dev/shm is tiny in containers; Chromium falls back to /tmp with --disable-dev-shm-usage
+CHROMIUM_ARGS = ["--no-sandbox", "--disable-setuid-sandbox", "--disable-dev-shm-usage"]
+PDF_RENDER_TIMEOUT_MS = 15_000
+PDF_OPTIONS = {
+    "format": "Letter",
+    "print_background": True,
+    "margin": {"top": "0.5in", "bottom": "0.5in", "left": "0.5in", "right": "0.5in"},
+}
+
+browser_launches = registry.counter("pdf_browser_launches_total", "Chromium launches (startup and relaunches after a crash).")
+pages_recycled = registry.counter("pdf_pages_recycled_total", "Pool pages replaced, by reason (max_renders/error/stale).", ["reason"])
+page_wait_seconds = registry.histogram("pdf_page_wait_seconds", "Time a render waited for a free pool page.")
+render_seconds = registry.histogram("pdf_render_seconds", "HTML-to-PDF time on a pool page, excluding the wait for the page.")
+pool_rejections = registry.counter("pdf_pool_rejections_total", "Renders refused because the pool was busy, by reason.", ["reason"])
+
+
+class PdfRendererBusy(Exception):
+    """Every page is in use and the wait queue is full, or the wait timed out."""
+
+
+async def render_pdf(page, html: str) -> bytes:
+    """Prints `html` to PDF on `page`.
+
+    set_content() resolves on the document's load event, after every stylesheet and
+    image has loaded; awaiting document.fonts.ready as well means web fonts are laid out
+    before printing. Both are deterministic, unlike networkidle's 500 ms idle wait.
+    """
+    start = time.perf_counter()
+    await page.set_content(html, wait_until="load", timeout=PDF_RENDER_TIMEOUT_MS)
+    await page.evaluate("document.fonts.ready.then(() => null)")
+    pdf_bytes = await page.pdf(**PDF_OPTIONS)
+    render_seconds.observe(time.perf_counter() - start)
+    return pdf_bytes
+
+
+class _Slot:
+    def __init__(self, context, page, generation: int):
+        self.context = context
+        self.page = page
+        self.generation = generation  # Browser launch the page belongs to
+        self.renders = 0
+
+
+class BrowserPool:
+    """Hands out warm Chromium pages, PDF_POOL_SIZE at a time"""
+
+    def __init__(
+        self,
+        size: int = PDF_POOL_SIZE,
+        max_renders: int = PDF_PAGE_MAX_RENDERS,
+        queue_limit: int = PDF_QUEUE_LIMIT,
+        acquire_timeout: float = PDF_ACQUIRE_TIMEOUT_SECONDS,
+    ):
+        self.size = size
+        self.max_renders = max_renders
+        self.queue_limit = queue_limit
+        self.acquire_timeout = acquire_timeout
+        self._playwright = None
+        self._browser = None
+        self._generation = 0
+        self._launch_lock = asyncio.Lock()
+        # One entry per pool slot; None is a slot whose page still has to be opened
+        self._idle: "asyncio.Queue[Optional[_Slot]]" = asyncio.Queue()
+        self._waiting = 0
+
+    async def start(self) -> None:
+        """Launches Chromium and opens the pool's pages. Failures are logged; renders retry them."""
+        try:
+            await self._ensure_browser()
+        except Exception as e:
+            logger.error(f"[PDF Renderer] Could not launch Chromium, will retry on first render: {e}", exc_info=True)
+        warm = 0
+        for _ in range(self.size):
+            slot = None
+            if self._browser is not None:
+                try:
+                    slot = await self._new_slot()
+                    warm += 1
+                except Exception as e:
+                    logger.error(f"[PDF Renderer] Could not open a pool page: {e}")
+            self._idle.put_nowait(slot)
+        logger.info(f"[PDF Renderer] Pool started with {warm}/{self.size} warm pages")
+
+    async def stop(self) -> None:
+        while not self._idle.empty():
+            slot = self._idle.get_nowait()
+            if slot is not None:
+                await self._close_slot(slot)
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "waiting": self._waiting,
+            "browserConnected": bool(self._browser and self._browser.is_connected()),
+        }
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator[Any]:
+        """A warm page for one render. Raises PdfRendererBusy when none frees up in time."""
+        # Callers already in line beyond the pages that are free right now
+        if self._waiting - self._idle.qsize() >= self.queue_limit:
+            pool_rejections.inc(reason="queue_full")
+            raise PdfRendererBusy(f"{self._waiting} renders already waiting")
+        self._waiting += 1
+        start = time.perf_counter()
+        try:
+            slot = await asyncio.wait_for(self._idle.get(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            pool_rejections.inc(reason="timeout")
+            raise PdfRendererBusy(f"no page free after {self.acquire_timeout:.0f}s")
+        finally:
+            self._waiting -= 1
+        page_wait_seconds.observe(time.perf_counter() - start)
+
+        try:
+            slot = await self._healthy(slot)
+        except BaseException:
+            self._idle.put_nowait(None)
+            raise
+
+        failed = True
+        try:
+            yield slot.page
+            failed = False
+        finally:
+            slot.renders += 1
+            reason = "error" if failed else "max_renders" if slot.renders >= self.max_renders else None
+            # The slot goes back before the (slow) close so waiters are never starved
+            self._idle.put_nowait(None if reason else slot)
+            if reason:
+                pages_recycled.inc(reason=reason)
+                await self._close_slot(slot)
+
+    async def render(self, html: str) -> bytes:
+        """Renders `html` to PDF bytes on a pool page."""
+        async with self.page() as page:
+            return await render_pdf(page, html)
+
+    async def _healthy(self, slot: Optional[_Slot]) -> _Slot:
+        await self._ensure_browser()
+        if slot is not None and (slot.generation != self._generation or slot.page.is_closed()):
+            pages_recycled.inc(reason="stale")
+            await self._close_slot(slot)
+            slot = None
+        return slot or await self._new_slot()
+
+    async def _ensure_browser(self):
+        if self._browser is not None and self._browser.is_connected():
+            return self._browser
+        async with self._launch_lock:
+            if self._browser is not None and self._browser.is_connected():
+                return self._browser
+            if self._browser is not None:
+                logger.warning("[PDF Renderer] Browser disconnected, relaunching")
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch(args=CHROMIUM_ARGS)
+            self._generation += 1
+            browser_launches.inc()
+            return self._browser
+
+    async def _new_slot(self) -> _Slot:
+        context = await self._browser.new_context()
+        try:
+            page = await context.new_page()
+        except BaseException:
+            await context.close()
+            raise
+        return _Slot(context, page, self._generation)
+
+    async def _close_slot(self, slot: _Slot) -> None:
+        try:
+            await slot.context.close()
+        except Exception as e:  # Already gone with a crashed browser
+            logger.debug(f"[PDF Renderer] Closing context failed: {e}")
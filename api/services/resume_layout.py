@@ -0,0 +1,119 @@
+"""
+Resume Layout - Page count and page-break estimates for a resume, without a browser
+
+The live preview returns these with the rendered HTML, so the editor can warn about a
+resume running onto a second page, or a job split across pages, while the user types.
+Only the final export pays for a Chromium render. The estimate models the printed Letter
+page of the resume templates (10pt Arial, line-height 1.6, 0.5in margins) with an
+average glyph width. Block heights come from wrapped line counts plus the templates'
+margins. It is an approximation of Chromium's layout, meant for placing warnings, not
+for exact pagination.
+"""
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+# Points (1/72 in) on the printed page
+PAGE_HEIGHT = (11 - 2 * 0.5) * 72
+PAGE_WIDTH = (8.5 - 2 * 0.5) * 72
+LINE_HEIGHT = 1.6
+AVG_GLYPH_WIDTH = 0.5           # Average Arial glyph width, in ems
+BULLET_INDENT = 0.2 * 72
+
+NAME_BLOCK = 22 * LINE_HEIGHT + 15 + 7          # h1 and its margins
+SECTION_HEADING = 14 * LINE_HEIGHT + 7 + 22 + 3  # h2, padding, border and margins
+SECTION_GAP = 22
+ENTRY_HEADING = 11 * LINE_HEIGHT + 14           # Job title / degree / project name
+ENTRY_GAP = 14
+PARAGRAPH_GAP = 10
+LIST_GAP = 4 + 10
+ITEM_GAP = 4
+SKILL_CHIP_PADDING = 16 + 5                      # Horizontal padding and margin of one chip
+SKILL_ROW = 9 * LINE_HEIGHT + 6 + 5
+
+
+def _lines(text: Optional[str], font_size: float = 10, width: float = PAGE_WIDTH) -> int:
+    if not text:
+        return 0
+    chars_per_line = max(1, int(width / (font_size * AVG_GLYPH_WIDTH)))
+    return sum(max(1, math.ceil(len(paragraph) / chars_per_line)) for paragraph in str(text).split("\n"))
+
+
+def _paragraph(text: Optional[str], font_size: float = 10, width: float = PAGE_WIDTH) -> float:
+    lines = _lines(text, font_size, width)
+    return lines * font_size * LINE_HEIGHT + PARAGRAPH_GAP if lines else 0.0
+
+
+def _bullets(bullets: Optional[List[str]]) -> float:
+    if not bullets:
+        return 0.0
+    width = PAGE_WIDTH - BULLET_INDENT
+    return LIST_GAP + sum(_lines(b, width=width) * 10 * LINE_HEIGHT + ITEM_GAP for b in bullets)
+
+
+def _skills(skills: List[str]) -> float:
+    rows, row_width = 1, 0.0
+    for skill in skills:
+        chip = len(skill) * 9 * AVG_GLYPH_WIDTH + SKILL_CHIP_PADDING
+        if row_width and row_width + chip > PAGE_WIDTH:
+            rows, row_width = rows + 1, 0.0
+        row_width += chip
+    return rows * SKILL_ROW
+
+
+def resume_blocks(resume: Dict[str, Any]) -> List[Tuple[str, Optional[int], float]]:
+    """(section, entry index or None, height in points) in document order."""
+    contact = resume.get("contact") or {}
+    contact_line = " | ".join(str(contact[k]) for k in ("email", "phone", "website") if contact.get(k))
+    blocks: List[Tuple[str, Optional[int], float]] = [
+        ("header", None, NAME_BLOCK + _paragraph(contact_line, 9) + _paragraph(contact.get("address"), 9) + SECTION_GAP)
+    ]
+    if resume.get("summary"):
+        blocks.append(("summary", None, SECTION_HEADING + _paragraph(resume["summary"]) + SECTION_GAP))
+    for section, subtitle_keys in (("experience", ("company", "location")), ("education", ("institution", "location"))):
+        entries = resume.get(section) or []
+        for i, entry in enumerate(entries):
+            subtitle = " | ".join(str(entry[k]) for k in subtitle_keys if entry.get(k))
+            height = ENTRY_HEADING + _paragraph(subtitle) + _paragraph(entry.get("details")) + _bullets(entry.get("bullets"))
+            height += ENTRY_GAP
+            if i == 0:
+                height += SECTION_HEADING
+            if i == len(entries) - 1:
+                height += SECTION_GAP
+            blocks.append((section, i, height))
+    if resume.get("skills"):
+        blocks.append(("skills", None, SECTION_HEADING + _skills(resume["skills"]) + SECTION_GAP))
+    projects = resume.get("projects") or []
+    for i, project in enumerate(projects):
+        technologies = ", ".join(project.get("technologies") or [])
+        height = ENTRY_HEADING + _paragraph(f"Technologies: {technologies}" if technologies else None) + _bullets(project.get("bullets"))
+        height += ENTRY_GAP + (SECTION_HEADING if i == 0 else 0)
+        blocks.append(("projects", i, height))
+    return blocks
+
+
+def estimate_layout(resume: Dict[str, Any]) -> Dict[str, Any]:
+    """Estimated page count, and for each page break the block it falls in.
+
+    A break with `splits` true cuts through the block (e.g. a job's bullets continue on
+    the next page); false means the block starts the new page.
+    """
+    offset = 0.0
+    breaks = []
+    for section, index, height in resume_blocks(resume):
+        start, end = offset, offset + height
+        next_break = (math.floor(start / PAGE_HEIGHT) + 1) * PAGE_HEIGHT
+        while next_break < end:
+            breaks.append({
+                "page": int(next_break // PAGE_HEIGHT) + 1,
+                "section": section,
+                "index": index,
+                # Less than a line fits above the break: the block effectively starts the page
+                "splits": next_break - start >= 10 * LINE_HEIGHT,
+            })
+            next_break += PAGE_HEIGHT
+        offset = end
+    return {
+        "estimatedPages": max(1, math.ceil(offset / PAGE_HEIGHT)),
+        "pageBreaks": breaks,
+        "fillOfLastPage": round((offset % PAGE_HEIGHT) / PAGE_HEIGHT, 2) if offset % PAGE_HEIGHT else 1.0,
+    }
@@ -0,0 +1,117 @@
+"""
+Resume Templates - Registry of the resume templates, compiled and validated once at startup
+
+Every *.html file in api/resume_templates/ is compiled when the app starts and checked
+for syntax errors, for top-level variables that resume data does not provide, and by
+rendering it with sample data. Templates that fail are logged and left out, so a request
+can only name a template that is known to work. Compiled bytecode is kept in a Jinja
+FileSystemBytecodeCache (JINJA_BYTECODE_CACHE_DIR, on the /data volume by default), so
+later startups skip parsing. Templates are not reloaded while the process runs.
+"""
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template, meta, select_autoescape
+
+logger = logging.getLogger(__name__)
+
+RESUME_TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resume_templates")
+JINJA_BYTECODE_CACHE_DIR = os.getenv("JINJA_BYTECODE_CACHE_DIR", "/data/jinja-cache")
+DEFAULT_RESUME_TEMPLATE = "modern_template.html"
+
+# Used to test-render every template at startup
+SAMPLE_RESUME: Dict[str, Any] = {
+    "name": "Sample Person",
+    "contact": {"email": "sample@example.com", "phone": "555-0100", "website": "example.com", "address": "Springfield"},
+    "summary": "Sample summary.",
+    "experience": [{"title": "Engineer", "company": "Example", "location": None, "startDate": "2020", "endDate": "Present", "bullets": ["Did things."]}],
+    "education": [{"degree": "B.S.", "institution": "University", "location": None, "startDate": "2016", "endDate": "2020", "details": None}],
+    "skills": ["Python"],
+    "projects": [{"name": "Project", "date": None, "technologies": ["Python"], "bullets": ["Built it."]}],
+    "template_name": DEFAULT_RESUME_TEMPLATE,
+}
+
+
+class UnknownTemplateError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class ResumeTemplate:
+    name: str
+    template: Template
+    mtime_ns: int  # Part of the rendered-PDF cache key (services/pdf_cache.py)
+
+    def render(self, resume_data: Dict[str, Any]) -> str:
+        return self.template.render(resume_data)
+
+
+def _bytecode_cache(directory: Optional[str]) -> Optional[FileSystemBytecodeCache]:
+    if not directory:
+        return None
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError as e:
+        logger.info(f"[Resume Templates] No bytecode cache, cannot use {directory}: {e}")
+        return None
+    return FileSystemBytecodeCache(directory)
+
+
+class ResumeTemplateRegistry:
+    """Compiled resume templates by file name"""
+
+    def __init__(
+        self,
+        template_dir: str = RESUME_TEMPLATE_DIR,
+        bytecode_cache_dir: Optional[str] = JINJA_BYTECODE_CACHE_DIR,
+        data_fields: Iterable[str] = SAMPLE_RESUME.keys(),
+    ):
+        self.template_dir = template_dir
+        self.data_fields = set(data_fields)
+        self.env = Environment(
+            loader=FileSystemLoader(template_dir),
+            autoescape=select_autoescape(["html", "xml"]),
+            bytecode_cache=_bytecode_cache(bytecode_cache_dir),
+            auto_reload=False,
+        )
+        self._templates: Dict[str, ResumeTemplate] = {}
+
+    def load(self) -> None:
+        """Compiles and validates every template; failures are logged and skipped."""
+        templates = {}
+        for name in sorted(os.listdir(self.template_dir)):
+            if not name.endswith(".html"):
+                continue
+            try:
+                templates[name] = self._load(name)
+            except Exception as e:
+                logger.error(f"[Resume Templates] Skipping {name}: {e}")
+        self._templates = templates
+        logger.info(f"[Resume Templates] Loaded {len(templates)} templates: {', '.join(templates) or 'none'}")
+
+    def _load(self, name: str) -> ResumeTemplate:
+        path = os.path.join(self.template_dir, name)
+        with open(path, encoding="utf-8") as f:
+            source = f.read()
+        unknown = meta.find_undeclared_variables(self.env.parse(source)) - self.data_fields
+        if unknown:
+            raise ValueError(f"uses variables resume data does not have: {', '.join(sorted(unknown))}")
+        template = self.env.get_template(name)
+        template.render(SAMPLE_RESUME)
+        return ResumeTemplate(
+            name=name,
+            template=template,
+            mtime_ns=os.stat(path).st_mtime_ns,
+        )
+
+    def names(self) -> List[str]:
+        return list(self._templates)
+
+    def get(self, name: Optional[str]) -> ResumeTemplate:
+        """The template called `name` (default DEFAULT_RESUME_TEMPLATE). Raises UnknownTemplateError."""
+        template = self._templates.get(name or DEFAULT_RESUME_TEMPLATE)
+        if template is None:
+            raise UnknownTemplateError(f"Unknown resume template '{name}'. Available: {', '.join(self._templates)}")
+        return template
@@ -0,0 +1,131 @@
+"""
+Stripe Client - Non-blocking Stripe API access for request handlers and background jobs
+
+The module-level stripe.* resource methods do blocking HTTP on the calling thread, which
+inside an `async def` handler stalls the whole event loop for a network round trip. This
+wraps a stripe.StripeClient that uses the SDK's httpx transport and its *_async methods:
+one pooled connection set for the process, explicit timeouts, a cap on concurrent calls,
+and per-operation latency in /metrics.
+
+Set STRIPE_API_BASE (e.g. http://localhost:12111) to point it at stripe-mock.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+import httpx
+import stripe
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE")
+STRIPE_TIMEOUT_SECONDS = float(os.getenv("STRIPE_TIMEOUT_SECONDS", "10"))
+STRIPE_CONNECT_TIMEOUT_SECONDS = 3.0
+STRIPE_MAX_CONCURRENCY = int(os.getenv("STRIPE_MAX_CONCURRENCY", "20"))
+STRIPE_MAX_NETWORK_RETRIES = 2  # The SDK retries idempotent-safe failures with backoff
+
+request_seconds = registry.histogram(
+    "stripe_request_seconds",
+    "Stripe API call latency by operation and outcome.",
+    ["operation", "outcome"],
+)
+
+
+class AsyncStripeClient:
+    """Awaitable wrappers for the Stripe calls the API makes"""
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        api_base: Optional[str] = None,
+        timeout: float = STRIPE_TIMEOUT_SECONDS,
+        max_concurrency: int = STRIPE_MAX_CONCURRENCY,
+        max_network_retries: int = STRIPE_MAX_NETWORK_RETRIES,
+    ):
+        self.api_key = api_key
+        self.api_base = api_base
+        self.timeout = timeout
+        self.max_network_retries = max_network_retries
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._http_client: Optional[stripe.HTTPXClient] = None
+        self._client: Optional[stripe.StripeClient] = None
+
+    @classmethod
+    def from_env(cls) -> "AsyncStripeClient":
+        return cls(os.getenv("STRIPE_SECRET_KEY"), STRIPE_API_BASE)
+
+    @property
+    def client(self) -> stripe.StripeClient:
+        # Built on first use so importing the module never needs a key or a running loop
+        if self._client is None:
+            if not self.api_key:
+                raise stripe.error.AuthenticationError("STRIPE_SECRET_KEY is not configured.")
+            self._http_client = stripe.HTTPXClient(
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, STRIPE_CONNECT_TIMEOUT_SECONDS))
+            )
+            self._client = stripe.StripeClient(
+                self.api_key,
+                base_addresses={"api": self.api_base} if self.api_base else {},
+                http_client=self._http_client,
+                max_network_retries=self.max_network_retries,
+            )
+            if self.api_base:
+                logger.info(f"[Stripe] Using API base {self.api_base}")
+        return self._client
+
+    async def _call(self, operation: str, request: Callable[[], Awaitable[Any]]) -> Any:
+        outcome = "error"
+        start = time.perf_counter()
+        try:
+            async with self._slots:
+                result = await request()
+            outcome = "ok"
+            return result
+        finally:
+            request_seconds.observe(time.perf_counter() - start, operation=operation, outcome=outcome)
+
+    async def create_customer(
+        self,
+        email: str,
+        name: Optional[str] = None,
+        metadata: Optional[Dict[str, str]] = None,
+        idempotency_key: Optional[str] = None,
+    ) -> stripe.Customer:
+        params: Dict[str, Any] = {"email": email, "metadata": metadata or {}}
+        if name:
+            params["name"] = name
+        options = {"idempotency_key": idempotency_key} if idempotency_key else {}
+        return await self._call("customers.create", lambda: self.client.customers.create_async(params=params, options=options))
+
+    async def create_checkout_session(self, **params: Any) -> stripe.checkout.Session:
+        return await self._call("checkout.sessions.create", lambda: self.client.checkout.sessions.create_async(params=params))
+
+    async def retrieve_subscription(self, subscription_id: str, **params: Any) -> stripe.Subscription:
+        return await self._call(
+            "subscriptions.retrieve", lambda: self.client.subscriptions.retrieve_async(subscription_id, params=params)
+        )
+
+    async def iter_subscriptions(self, **params: Any) -> AsyncIterator[stripe.Subscription]:
+        """Every subscription matching `params`, following Stripe's pagination 100 at a time."""
+        first_page = await self._call(
+            "subscriptions.list", lambda: self.client.subscriptions.list_async(params={"limit": 100, **params})
+        )
+        # Later pages are fetched by the SDK's auto-pagination on the same HTTP client
+        async for subscription in first_page.auto_paging_iter():
+            yield subscription
+
+    async def retrieve_price(self, price_id: str) -> stripe.Price:
+        return await self._call("prices.retrieve", lambda: self.client.prices.retrieve_async(price_id))
+
+    async def aclose(self) -> None:
+        if self._http_client is not None:
+            await self._http_client.close_async()
+            self._http_client = None
+            self._client = None
+
+
+stripe_client = AsyncStripeClient.from_env()
@@ -0,0 +1,247 @@
+"""
+Stripe Customer Provisioning - Creates each user's Stripe customer ahead of checkout
+
+Customers used to be created inside create_checkout_session, which put a second Stripe
+call and a DB write between the upgrade click and the redirect. Now a background job
+creates them shortly after sign-up (Clerk user.created wakes it). The users table is the
+queue: rows without a stripeCustomerId that signed up within PROVISION_WINDOW are
+provisioned in batches, and failures are retried with backoff. Every create sends an idempotency key derived from the Clerk id, so a retried
+batch, or a checkout that races the job, gets the same customer back instead of a duplicate.
+
+A batch in which every create fails is taken as Stripe being unavailable: the worker pauses
+as a whole with the same backoff and retries that batch, rather than parking each user and
+moving on through the table. Users Stripe rejects individually (invalid email and the like)
+back off on their own so they do not hold up the queue.
+
+Older users get their customer at checkout, as before. Creating customers for all of them
+ahead of time is a one-off, run explicitly:
+
+    cd api && python -m services.stripe_customers backfill [--dry-run]
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import stripe
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+PROVISION_BATCH_SIZE = 50          # Creates run concurrently, bounded by the Stripe client's concurrency cap
+PROVISION_RETRY_BASE_SECONDS = 30  # 30s, 60s, 120s ... capped below
+PROVISION_RETRY_MAX_SECONDS = 3600
+PROVISION_WINDOW = "7 days"        # The worker only provisions users who signed up this recently
+
+customers_provisioned_total = registry.counter(
+    "stripe_customers_provisioned_total",
+    "Stripe customer provisioning attempts by result (created/failed).",
+    ["result"],
+)
+
+# Recent users still waiting for a customer, oldest first, skipping those backing off after a
+# failure. Served by the partial index from migration add_stripe_customer_provisioning.
+PENDING_SQL = f"""
+SELECT "clerkId", email, "firstName", "lastName" FROM users
+WHERE "stripeCustomerId" IS NULL AND "createdAt" > NOW() - INTERVAL '{PROVISION_WINDOW}'
+  AND NOT ("clerkId" = ANY($2::text[]))
+ORDER BY "createdAt"
+LIMIT $1
+"""
+
+# Every user without a customer, regardless of sign-up date, in keyset chunks for backfill()
+BACKFILL_SQL = """
+SELECT "clerkId", email, "firstName", "lastName" FROM users
+WHERE "stripeCustomerId" IS NULL AND "clerkId" > $1
+ORDER BY "clerkId"
+LIMIT $2
+"""
+
+UNPROVISIONED_COUNT_SQL = 'SELECT COUNT(*)::int AS n FROM users WHERE "stripeCustomerId" IS NULL'
+
+LINK_SQL = """
+UPDATE users u SET "stripeCustomerId" = v.customer_id, "updatedAt" = NOW()
+FROM unnest($1::text[], $2::text[]) AS v(clerk_id, customer_id)
+WHERE u."clerkId" = v.clerk_id AND u."stripeCustomerId" IS NULL
+"""
+
+
+def customer_name(email: str, first_name: Optional[str], last_name: Optional[str]) -> str:
+    return f"{first_name} {last_name}".strip() if first_name and last_name else email
+
+
+def idempotency_key(clerk_id: str) -> str:
+    return f"customer-create-{clerk_id}"
+
+
+class StripeCustomerProvisioner:
+    """Creates missing Stripe customers and links them to users.stripeCustomerId"""
+
+    def __init__(self, db, stripe_client, batch_size: int = PROVISION_BATCH_SIZE):
+        self.db = db
+        self.stripe_client = stripe_client
+        self.batch_size = batch_size
+        # clerkId -> (failed attempts, monotonic time of next attempt). In memory only: after a
+        # restart every waiting user is simply tried again.
+        self._backoff: Dict[str, Tuple[int, float]] = {}
+        # Shared backoff while Stripe is failing every create
+        self._outage_attempts = 0
+        self._paused_until = 0.0
+
+    async def _create(self, clerk_id: str, email: str, first_name: Optional[str], last_name: Optional[str]) -> Any:
+        return await self.stripe_client.create_customer(
+            email=email,
+            name=customer_name(email, first_name, last_name),
+            metadata={"clerkId": clerk_id},
+            idempotency_key=idempotency_key(clerk_id),
+        )
+
+    async def _link(self, links: List[Tuple[str, str]]) -> int:
+        return await self.db.execute_raw(LINK_SQL, [c for c, _ in links], [s for _, s in links])
+
+    async def provision(self, clerk_id: str, email: str, first_name: Optional[str] = None, last_name: Optional[str] = None) -> str:
+        """Creates and links one user's customer right away; used when checkout gets there first."""
+        customer = await self._create(clerk_id, email, first_name, last_name)
+        await self._link([(clerk_id, customer.id)])
+        self._backoff.pop(clerk_id, None)
+        customers_provisioned_total.inc(result="created")
+        return customer.id
+
+    async def run_next(self) -> bool:
+        """Provisions one batch. Returns False when no user is waiting or Stripe is failing."""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return False
+        self._forget_stale(now)
+        waiting = [clerk_id for clerk_id, (_, retry_at) in self._backoff.items() if retry_at > now]
+        rows = await self.db.query_raw(PENDING_SQL, self.batch_size, waiting)
+        if not rows:
+            return False
+
+        start = time.perf_counter()
+        links, failures = await self._create_batch(rows)
+        outage = _is_outage(links, failures)
+        for clerk_id, error in failures:
+            if _rejected(error) or not outage:
+                self._schedule_retry(clerk_id, error)
+        if outage:
+            self._pause(len(rows), failures[0][1])
+            return False
+
+        self._outage_attempts = 0
+        for clerk_id, _ in links:
+            self._backoff.pop(clerk_id, None)
+        if links:
+            await self._link(links)
+            customers_provisioned_total.inc(len(links), result="created")
+        logger.info(
+            f"[Stripe Customers] Provisioned {len(links)}/{len(rows)} customers in {time.perf_counter() - start:.2f}s"
+        )
+        return True
+
+    async def backfill(self, dry_run: bool = False) -> Dict[str, Any]:
+        """Provisions every user without a customer, including those outside PROVISION_WINDOW.
+
+        Stops at the first batch that fails as a whole; the idempotency keys make a rerun safe.
+        """
+        start = time.perf_counter()
+        pending = (await self.db.query_raw(UNPROVISIONED_COUNT_SQL))[0]["n"]
+        summary: Dict[str, Any] = {"pending": pending, "created": 0, "failed": 0, "complete": True, "dryRun": dry_run}
+        last_clerk_id = ""
+        while not dry_run:
+            rows = await self.db.query_raw(BACKFILL_SQL, last_clerk_id, self.batch_size)
+            if not rows:
+                break
+            links, failures = await self._create_batch(rows)
+            if _is_outage(links, failures):
+                logger.error(f"[Stripe Customers] Backfill stopped: all {len(rows)} creates failed: {failures[0][1]}")
+                summary["complete"] = False
+                break
+            last_clerk_id = rows[-1]["clerkId"]
+            for clerk_id, error in failures:
+                logger.error(f"[Stripe Customers] Creating customer for {clerk_id} failed: {error}")
+            if links:
+                await self._link(links)
+            customers_provisioned_total.inc(len(links), result="created")
+            customers_provisioned_total.inc(len(failures), result="failed")
+            summary["created"] += len(links)
+            summary["failed"] += len(failures)
+            logger.info(f"[Stripe Customers] Backfill: {summary['created']}/{pending} created, {summary['failed']} failed")
+        summary["seconds"] = round(time.perf_counter() - start, 1)
+        logger.info(f"[Stripe Customers] Backfill {'dry run' if dry_run else 'done'}: {summary}")
+        return summary
+
+    async def _create_batch(self, rows: List[Dict[str, Any]]) -> Tuple[List[Tuple[str, str]], List[Tuple[str, Exception]]]:
+        """Creates the customers for `rows` concurrently. Returns ((clerkId, customerId) links, (clerkId, error) failures)."""
+        results = await asyncio.gather(
+            *(self._create(r["clerkId"], r["email"], r["firstName"], r["lastName"]) for r in rows),
+            return_exceptions=True,
+        )
+        links = [(row["clerkId"], result.id) for row, result in zip(rows, results) if not isinstance(result, Exception)]
+        failures = [(row["clerkId"], result) for row, result in zip(rows, results) if isinstance(result, Exception)]
+        return links, failures
+
+    def _pause(self, batch_size: int, error: Exception) -> None:
+        self._outage_attempts += 1
+        delay = _retry_delay(self._outage_attempts)
+        self._paused_until = time.monotonic() + delay
+        customers_provisioned_total.inc(batch_size, result="failed")
+        logger.error(
+            f"[Stripe Customers] All {batch_size} creates failed (attempt {self._outage_attempts}); "
+            f"pausing provisioning for {delay}s: {error}"
+        )
+
+    def _schedule_retry(self, clerk_id: str, error: Exception) -> None:
+        attempts = self._backoff.get(clerk_id, (0, 0.0))[0] + 1
+        delay = _retry_delay(attempts)
+        self._backoff[clerk_id] = (attempts, time.monotonic() + delay)
+        customers_provisioned_total.inc(result="failed")
+        logger.error(f"[Stripe Customers] Creating customer for {clerk_id} failed (attempt {attempts}, retry in {delay}s): {error}")
+
+    def _forget_stale(self, now: float) -> None:
+        # A user whose retry came due long ago and was not picked up again has been linked
+        # elsewhere (checkout, another instance) or deleted, so the entry can go.
+        cutoff = now - PROVISION_RETRY_MAX_SECONDS
+        for clerk_id in [c for c, (_, retry_at) in self._backoff.items() if retry_at < cutoff]:
+            del self._backoff[clerk_id]
+
+
+def _retry_delay(attempts: int) -> int:
+    return min(PROVISION_RETRY_BASE_SECONDS * 2 ** (attempts - 1), PROVISION_RETRY_MAX_SECONDS)
+
+
+def _rejected(error: Exception) -> bool:
+    """Stripe refused this particular customer (e.g. an invalid email); other users are unaffected."""
+    return isinstance(error, stripe.InvalidRequestError)
+
+
+def _is_outage(links: List[Tuple[str, str]], failures: List[Tuple[str, Exception]]) -> bool:
+    return not links and any(not _rejected(error) for _, error in failures)
+
+
+async def _main(argv: List[str]) -> None:
+    from prisma import Prisma
+
+    from .stripe_client import stripe_client
+
+    if argv[:1] != ["backfill"]:
+        raise SystemExit("usage: python -m services.stripe_customers backfill [--dry-run]")
+    db = Prisma()
+    await db.connect()
+    try:
+        summary = await StripeCustomerProvisioner(db, stripe_client).backfill(dry_run="--dry-run" in argv)
+    finally:
+        await db.disconnect()
+        await stripe_client.aclose()
+    if not summary["complete"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    for noisy in ("stripe", "httpx"):  # One line per request otherwise
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+    asyncio.run(_main(sys.argv[1:]))
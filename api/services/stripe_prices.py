@@ -0,0 +1,60 @@
+"""
+Stripe Price Catalog - Checkout prices validated once at startup
+
+The price ids for each checkout lookup key come from the environment. At startup each is
+retrieved from Stripe and checked (it exists, is active and recurring), and the result is
+kept in memory. Checkout then resolves a lookup key without a Stripe call, and a
+misconfigured price is reported in the startup log instead of on a customer's upgrade.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Set
+
+import stripe
+
+logger = logging.getLogger(__name__)
+
+
+class PriceCatalog:
+    """Lookup key -> Stripe price id, minus prices Stripe says are unusable"""
+
+    def __init__(self, stripe_client, price_ids: Dict[str, str]):
+        self.stripe_client = stripe_client
+        self.price_ids = dict(price_ids)
+        self.prices: Dict[str, Dict[str, Any]] = {}  # Validated price details by lookup key
+        self._invalid: Set[str] = set()
+
+    async def load(self) -> None:
+        """Retrieves and validates every configured price.
+
+        A price Stripe rejects (missing, archived, not recurring) is dropped. If Stripe can't
+        be reached the id is kept unvalidated, so an outage at boot doesn't disable checkout.
+        """
+        keys = list(self.price_ids)
+        results = await asyncio.gather(
+            *(self.stripe_client.retrieve_price(self.price_ids[key]) for key in keys), return_exceptions=True
+        )
+        for key, result in zip(keys, results):
+            price_id = self.price_ids[key]
+            if isinstance(result, stripe.error.InvalidRequestError):
+                self._invalid.add(key)
+                logger.error(f"[Prices] '{key}' price {price_id} not found in Stripe; checkout for it is disabled: {result}")
+            elif isinstance(result, Exception):
+                logger.warning(f"[Prices] Could not validate '{key}' price {price_id}, using it unvalidated: {result}")
+            elif not result.get("active") or not result.get("recurring"):
+                self._invalid.add(key)
+                logger.error(f"[Prices] '{key}' price {price_id} is inactive or not recurring; checkout for it is disabled")
+            else:
+                self._invalid.discard(key)
+                self.prices[key] = {
+                    "id": result.id,
+                    "currency": result.get("currency"),
+                    "unitAmount": result.get("unit_amount"),
+                    "interval": result["recurring"].get("interval"),
+                }
+                logger.info(f"[Prices] '{key}' -> {price_id} ({self.prices[key]['unitAmount']} {self.prices[key]['currency']}/{self.prices[key]['interval']})")
+
+    def get(self, lookup_key: str) -> Optional[str]:
+        if lookup_key in self._invalid:
+            return None
+        return self.price_ids.get(lookup_key)
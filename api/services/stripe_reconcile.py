@@ -0,0 +1,251 @@
+"""
+Stripe Reconciliation - Bulk repair of user plans from Stripe's subscription list
+
+Plans are normally kept in step by webhooks. A missed or failed webhook leaves a user on
+the wrong plan, or with a stale period end, summaryLimit or usageResetAt. Reconciliation
+pages through every Stripe subscription (100 per request, via the SDK's auto-pagination)
+and keeps the most relevant one per customer in memory. It then walks users in keyset
+chunks, compares each to its customer's subscription by stripeCustomerId, and applies the
+corrections for a chunk in one transaction: a single batched UPDATE of users plus a
+refresh of those subscriptions in the stripe_subscriptions mirror.
+
+    cd api && python -m services.stripe_reconcile run [--dry-run] [--report diffs.jsonl]
+
+With STRIPE_API_BASE=http://localhost:12111 it runs against stripe-mock.
+"""
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from .subscriptions import SubscriptionMirror, as_utc, subscription_fields
+from .user_sync import FREE_SUMMARY_LIMIT
+
+logger = logging.getLogger(__name__)
+
+RECONCILE_CHUNK_SIZE = 1000
+MAX_LOGGED_DIFFS = 20  # The full list goes to --report
+
+PREMIUM_SUMMARY_LIMIT = 500  # Must match the checkout.session.completed handler in main.py
+# past_due keeps access while Stripe retries the payment; canceled, unpaid, incomplete and
+# paused subscriptions do not entitle the user to premium.
+ENTITLED_STATUSES = ("active", "trialing", "past_due")
+
+USERS_SQL = """
+SELECT "clerkId", "stripeCustomerId", plan, "summaryLimit", "stripeSubscriptionId", "stripePriceId", "stripeCurrentPeriodEnd"
+FROM users
+WHERE "stripeCustomerId" IS NOT NULL AND "clerkId" > $1
+ORDER BY "clerkId"
+LIMIT $2
+"""
+
+# seen_plan / seen_period_end make the update a no-op for rows a webhook changed after they
+# were read, so reconciliation never overwrites fresher data.
+APPLY_SQL = """
+UPDATE users u SET
+    plan = v.plan,
+    "summaryLimit" = v.summary_limit,
+    "stripeSubscriptionId" = v.subscription_id,
+    "stripePriceId" = v.price_id,
+    "stripeCurrentPeriodEnd" = v.period_end,
+    "summariesUsed" = CASE WHEN v.reset_usage THEN 0 ELSE u."summariesUsed" END,
+    "usageResetAt" = CASE WHEN v.reset_usage THEN v.usage_reset_at ELSE u."usageResetAt" END,
+    "updatedAt" = NOW()
+FROM unnest(
+    $1::text[], $2::text[], $3::int[], $4::text[], $5::text[], $6::timestamp(3)[],
+    $7::boolean[], $8::timestamp(3)[], $9::text[], $10::timestamp(3)[]
+) AS v(clerk_id, plan, summary_limit, subscription_id, price_id, period_end, reset_usage, usage_reset_at, seen_plan, seen_period_end)
+WHERE u."clerkId" = v.clerk_id
+  AND u.plan = v.seen_plan
+  AND u."stripeCurrentPeriodEnd" IS NOT DISTINCT FROM v.seen_period_end
+"""
+
+
+def _rank(fields: Dict[str, Any]) -> Tuple[bool, float]:
+    period_end = fields["currentPeriodEnd"]
+    return fields["status"] in ENTITLED_STATUSES, period_end.timestamp() if period_end else 0.0
+
+
+def _same_second(a: Optional[datetime], b: Optional[datetime]) -> bool:
+    if a is None or b is None:
+        return a is b
+    return int(a.timestamp()) == int(b.timestamp())
+
+
+def _db_timestamp(value: Optional[datetime]) -> Optional[str]:
+    # users timestamps are Prisma DateTime columns: timestamp(3) holding UTC
+    return value.astimezone(timezone.utc).replace(tzinfo=None).isoformat() if value else None
+
+
+def plan_correction(user: Dict[str, Any], subscription: Optional[Dict[str, Any]], now: datetime) -> Optional[Dict[str, Any]]:
+    """What a user row should become given its customer's subscription, or None if it is right.
+
+    Mirrors the webhook handlers: an upgrade or a renewal the app missed also resets usage to
+    the new period; losing the subscription moves the user back to the free plan.
+    """
+    current_end = as_utc(user["stripeCurrentPeriodEnd"])
+    entitled = subscription is not None and subscription["status"] in ENTITLED_STATUSES
+    if entitled:
+        period_end = subscription["currentPeriodEnd"]
+        target = {
+            "plan": "premium",
+            "summaryLimit": PREMIUM_SUMMARY_LIMIT,
+            "stripeSubscriptionId": subscription["id"],
+            "stripePriceId": subscription["priceId"] or user["stripePriceId"],
+            "stripeCurrentPeriodEnd": period_end or current_end,
+        }
+        if user["plan"] != "premium":
+            kind = "upgrade"
+        elif period_end and (current_end is None or int(period_end.timestamp()) > int(current_end.timestamp())):
+            kind = "renewal"
+        else:
+            kind = "sync"
+        reset_usage_at = target["stripeCurrentPeriodEnd"] if kind in ("upgrade", "renewal") else None
+    elif user["plan"] == "premium":
+        kind = "downgrade"
+        target = {
+            "plan": "free",
+            "summaryLimit": FREE_SUMMARY_LIMIT,
+            "stripeSubscriptionId": user["stripeSubscriptionId"],
+            "stripePriceId": user["stripePriceId"],
+            "stripeCurrentPeriodEnd": current_end,
+        }
+        reset_usage_at = now  # Free usage is counted per day from here
+    else:
+        return None
+
+    current = {**user, "stripeCurrentPeriodEnd": current_end}
+    changes = {
+        field: [current[field], value]
+        for field, value in target.items()
+        if not (_same_second(current[field], value) if field == "stripeCurrentPeriodEnd" else current[field] == value)
+    }
+    if not changes:
+        return None
+    return {"clerkId": user["clerkId"], "target": target, "changes": changes, "kind": kind, "resetUsageAt": reset_usage_at}
+
+
+class StripeReconciler:
+    """Compares users against Stripe subscriptions and applies the differences"""
+
+    def __init__(self, db, stripe_client, chunk_size: int = RECONCILE_CHUNK_SIZE):
+        self.db = db
+        self.stripe_client = stripe_client
+        self.chunk_size = chunk_size
+
+    async def load_subscriptions(self) -> Dict[str, Dict[str, Any]]:
+        """The most relevant subscription per Stripe customer: entitled first, then latest period."""
+        by_customer: Dict[str, Dict[str, Any]] = {}
+        count = 0
+        start = time.perf_counter()
+        async for subscription in self.stripe_client.iter_subscriptions(status="all"):
+            fields = subscription_fields(subscription)
+            count += 1
+            existing = by_customer.get(fields["customerId"])
+            if existing is None or _rank(fields) > _rank(existing):
+                by_customer[fields["customerId"]] = fields
+            if count % 10_000 == 0:
+                logger.info(f"[Reconcile] Listed {count} subscriptions ({count / (time.perf_counter() - start):.0f}/s)")
+        logger.info(
+            f"[Reconcile] Listed {count} subscriptions for {len(by_customer)} customers in {time.perf_counter() - start:.1f}s"
+        )
+        return by_customer
+
+    async def run(self, dry_run: bool = False) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """Reconciles every user with a Stripe customer. Returns (summary, diffs)."""
+        start = time.perf_counter()
+        snapshot_at = datetime.now(timezone.utc)
+        subscriptions = await self.load_subscriptions()
+        summary: Dict[str, Any] = {"users": 0, "changed": 0, "skipped": 0, "kinds": {}, "dryRun": dry_run}
+        diffs: List[Dict[str, Any]] = []
+        last_clerk_id = ""
+        while True:
+            users = await self.db.query_raw(USERS_SQL, last_clerk_id, self.chunk_size)
+            if not users:
+                break
+            last_clerk_id = users[-1]["clerkId"]
+            summary["users"] += len(users)
+
+            corrections = []
+            for user in users:
+                correction = plan_correction(user, subscriptions.get(user["stripeCustomerId"]), snapshot_at)
+                if correction:
+                    correction["seen"] = user
+                    correction["customerId"] = user["stripeCustomerId"]
+                    corrections.append(correction)
+            for correction in corrections:
+                diffs.append({k: correction[k] for k in ("clerkId", "customerId", "kind", "changes")})
+                summary["kinds"][correction["kind"]] = summary["kinds"].get(correction["kind"], 0) + 1
+            if dry_run:
+                continue
+
+            mirrored = [subscriptions[u["stripeCustomerId"]] for u in users if u["stripeCustomerId"] in subscriptions]
+            applied = await self._apply(corrections, mirrored, snapshot_at)
+            summary["changed"] += applied
+            summary["skipped"] += len(corrections) - applied
+
+        summary["seconds"] = round(time.perf_counter() - start, 1)
+        summary["diffs"] = len(diffs)
+        for diff in diffs[:MAX_LOGGED_DIFFS]:
+            logger.info(f"[Reconcile] {diff['kind']} {diff['clerkId']} ({diff['customerId']}): {diff['changes']}")
+        if len(diffs) > MAX_LOGGED_DIFFS:
+            logger.info(f"[Reconcile] ... and {len(diffs) - MAX_LOGGED_DIFFS} more")
+        logger.info(f"[Reconcile] {'Dry run' if dry_run else 'Done'}: {summary}")
+        return summary, diffs
+
+    async def _apply(self, corrections: List[Dict[str, Any]], mirrored: List[Dict[str, Any]], snapshot_at: datetime) -> int:
+        applied = 0
+        async with self.db.tx() as tx:
+            if corrections:
+                applied = await tx.execute_raw(
+                    APPLY_SQL,
+                    [c["clerkId"] for c in corrections],
+                    [c["target"]["plan"] for c in corrections],
+                    [c["target"]["summaryLimit"] for c in corrections],
+                    [c["target"]["stripeSubscriptionId"] for c in corrections],
+                    [c["target"]["stripePriceId"] for c in corrections],
+                    [_db_timestamp(c["target"]["stripeCurrentPeriodEnd"]) for c in corrections],
+                    [c["resetUsageAt"] is not None for c in corrections],
+                    [_db_timestamp(c["resetUsageAt"]) for c in corrections],
+                    [c["seen"]["plan"] for c in corrections],
+                    [_db_timestamp(as_utc(c["seen"]["stripeCurrentPeriodEnd"])) for c in corrections],
+                )
+            await SubscriptionMirror(tx, self.stripe_client).record_many(mirrored, snapshot_at)
+        return applied
+
+
+def _json_default(value: Any) -> str:
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+async def _main(argv: List[str]) -> None:
+    from prisma import Prisma
+
+    from .stripe_client import stripe_client
+
+    if argv[:1] != ["run"]:
+        raise SystemExit("usage: python -m services.stripe_reconcile run [--dry-run] [--report PATH]")
+    report_path = argv[argv.index("--report") + 1] if "--report" in argv else None
+    db = Prisma()
+    await db.connect()
+    try:
+        _, diffs = await StripeReconciler(db, stripe_client).run(dry_run="--dry-run" in argv)
+    finally:
+        await db.disconnect()
+        await stripe_client.aclose()
+    if report_path:
+        with open(report_path, "w") as report:
+            for diff in diffs:
+                report.write(json.dumps(diff, default=_json_default) + "\n")
+        logger.info(f"[Reconcile] Wrote {len(diffs)} diffs to {report_path}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    for noisy in ("stripe", "httpx"):  # One line per page request otherwise
+        logging.getLogger(noisy).setLevel(logging.WARNING)
+    asyncio.run(_main(sys.argv[1:]))
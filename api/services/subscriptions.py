@@ -0,0 +1,177 @@
+"""
+Subscription Mirror - Local copy of Stripe subscriptions, maintained from webhooks
+
+customer.subscription.* events upsert stripe_subscriptions, so billing webhooks and plan
+checks can read price and period end locally. Stripe is only asked when the mirror has
+no usable row, and the answer is stored for next time.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIPTION_COLUMNS = 'id, "customerId", status, "priceId", "currentPeriodEnd", "cancelAtPeriodEnd", "eventCreatedAt"'
+
+# Webhooks can arrive out of order; an older snapshot never overwrites a newer one.
+UPSERT_SQL = f"""
+INSERT INTO stripe_subscriptions (id, "customerId", status, "priceId", "currentPeriodEnd", "cancelAtPeriodEnd", "eventCreatedAt", "updatedAt")
+VALUES ($1, $2, $3, $4, $5::timestamptz, $6, $7::timestamptz, NOW())
+ON CONFLICT (id) DO UPDATE SET
+    "customerId" = EXCLUDED."customerId",
+    status = EXCLUDED.status,
+    "priceId" = EXCLUDED."priceId",
+    "currentPeriodEnd" = EXCLUDED."currentPeriodEnd",
+    "cancelAtPeriodEnd" = EXCLUDED."cancelAtPeriodEnd",
+    "eventCreatedAt" = EXCLUDED."eventCreatedAt",
+    "updatedAt" = NOW()
+WHERE stripe_subscriptions."eventCreatedAt" <= EXCLUDED."eventCreatedAt"
+RETURNING {SUBSCRIPTION_COLUMNS}
+"""
+
+
+BULK_UPSERT_SQL = """
+INSERT INTO stripe_subscriptions (id, "customerId", status, "priceId", "currentPeriodEnd", "cancelAtPeriodEnd", "eventCreatedAt", "updatedAt")
+SELECT v.id, v.customer_id, v.status, v.price_id, v.period_end, v.cancel_at_period_end, $7::timestamptz, NOW()
+FROM unnest($1::text[], $2::text[], $3::text[], $4::text[], $5::timestamptz[], $6::boolean[])
+    AS v(id, customer_id, status, price_id, period_end, cancel_at_period_end)
+ON CONFLICT (id) DO UPDATE SET
+    "customerId" = EXCLUDED."customerId",
+    status = EXCLUDED.status,
+    "priceId" = EXCLUDED."priceId",
+    "currentPeriodEnd" = EXCLUDED."currentPeriodEnd",
+    "cancelAtPeriodEnd" = EXCLUDED."cancelAtPeriodEnd",
+    "eventCreatedAt" = EXCLUDED."eventCreatedAt",
+    "updatedAt" = NOW()
+WHERE stripe_subscriptions."eventCreatedAt" <= EXCLUDED."eventCreatedAt"
+"""
+
+
+def _timestamp(value: Optional[int]) -> Optional[datetime]:
+    return datetime.fromtimestamp(value, tz=timezone.utc) if value else None
+
+
+def _price_id(item: Any) -> Optional[str]:
+    price = item.get("price") or item.get("plan")
+    if isinstance(price, str):
+        return price
+    if price:
+        return price.get("id")
+    # Invoice lines on newer API versions carry the price under pricing.price_details
+    details = (item.get("pricing") or {}).get("price_details") or {}
+    return details.get("price")
+
+
+def subscription_fields(subscription: Any) -> Dict[str, Any]:
+    """Mirror columns from a Stripe subscription (a StripeObject or its dict form)."""
+    items = (subscription.get("items") or {}).get("data") or []
+    first_item = items[0] if items else {}
+    # current_period_end moved from the subscription onto its items in newer API versions
+    period_end = subscription.get("current_period_end") or first_item.get("current_period_end")
+    customer = subscription.get("customer")
+    return {
+        "id": subscription["id"],
+        "customerId": customer if isinstance(customer, str) else (customer or {}).get("id"),
+        "status": subscription.get("status"),
+        "priceId": _price_id(first_item) if first_item else None,
+        "currentPeriodEnd": _timestamp(period_end),
+        "cancelAtPeriodEnd": bool(subscription.get("cancel_at_period_end")),
+    }
+
+
+def invoice_subscription_period(invoice: Any, subscription_id: str) -> Tuple[Optional[str], Optional[datetime]]:
+    """(price id, period end) for the subscription from an invoice's line items, if present."""
+    lines = (invoice.get("lines") or {}).get("data") or []
+    for line in lines:
+        line_subscription = line.get("subscription") or (
+            ((line.get("parent") or {}).get("subscription_item_details") or {}).get("subscription")
+        )
+        if line_subscription not in (None, subscription_id):
+            continue
+        period_end = (line.get("period") or {}).get("end")
+        if period_end:
+            return _price_id(line), _timestamp(period_end)
+    return None, None
+
+
+def as_utc(value: Any) -> Optional[datetime]:
+    """A DB timestamp (string or datetime, with or without offset) as an aware UTC datetime."""
+    if value is None:
+        return None
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _row(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        **row,
+        "currentPeriodEnd": as_utc(row["currentPeriodEnd"]),
+        "eventCreatedAt": as_utc(row["eventCreatedAt"]),
+    }
+
+
+class SubscriptionMirror:
+    """Reads and writes stripe_subscriptions, falling back to the Stripe API on a miss"""
+
+    def __init__(self, db, stripe_client):
+        self.db = db
+        self.stripe_client = stripe_client
+
+    async def record(self, subscription: Any, event_created: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Upserts a subscription snapshot taken at `event_created` (Unix seconds; now if omitted).
+
+        Returns the stored row, or None when a newer snapshot is already mirrored.
+        """
+        fields = subscription_fields(subscription)
+        snapshot_at = _timestamp(event_created) or datetime.now(timezone.utc)
+        rows = await self.db.query_raw(
+            UPSERT_SQL,
+            fields["id"],
+            fields["customerId"],
+            fields["status"],
+            fields["priceId"],
+            fields["currentPeriodEnd"].isoformat() if fields["currentPeriodEnd"] else None,
+            fields["cancelAtPeriodEnd"],
+            snapshot_at.isoformat(),
+        )
+        if not rows:
+            logger.info(f"[Subscriptions] Ignored stale snapshot of {fields['id']} from {snapshot_at.isoformat()}")
+            return None
+        return _row(rows[0])
+
+    async def record_many(self, fields: List[Dict[str, Any]], snapshot_at: datetime) -> int:
+        """Upserts many subscription_fields() rows taken at `snapshot_at` in one statement."""
+        if not fields:
+            return 0
+        return await self.db.execute_raw(
+            BULK_UPSERT_SQL,
+            [f["id"] for f in fields],
+            [f["customerId"] for f in fields],
+            [f["status"] for f in fields],
+            [f["priceId"] for f in fields],
+            [f["currentPeriodEnd"].isoformat() if f["currentPeriodEnd"] else None for f in fields],
+            [f["cancelAtPeriodEnd"] for f in fields],
+            snapshot_at.isoformat(),
+        )
+
+    async def get(self, subscription_id: str) -> Optional[Dict[str, Any]]:
+        rows = await self.db.query_raw(
+            f"SELECT {SUBSCRIPTION_COLUMNS} FROM stripe_subscriptions WHERE id = $1", subscription_id
+        )
+        return _row(rows[0]) if rows else None
+
+    async def resolve(self, subscription_id: str, period_end_after: Optional[datetime] = None) -> Dict[str, Any]:
+        """Mirrored subscription, retrieved from Stripe (and mirrored) when missing or incomplete.
+
+        With `period_end_after`, a row whose period ends at or before that time counts as
+        stale, e.g. a renewal invoice handled before its customer.subscription.updated.
+        """
+        row = await self.get(subscription_id)
+        if row and row["priceId"] and row["currentPeriodEnd"]:
+            if period_end_after is None or row["currentPeriodEnd"] > period_end_after:
+                return row
+        logger.info(f"[Subscriptions] Mirror miss for {subscription_id}, retrieving from Stripe")
+        subscription = await self.stripe_client.retrieve_subscription(subscription_id)
+        # A freshly retrieved subscription is current, but record() still defers to a newer webhook
+        return await self.record(subscription) or await self.get(subscription_id)
@@ -0,0 +1,135 @@
+"""
+Summary Metrics - Per-summary word counts, domain and category, computed once at write time
+
+save_summary_to_history stores these on the summary_history row so analytics, rollups and
+deletes never have to re-split text or re-classify URLs.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from .analytics import summary_word_count
+from .domain_classifier import domain_classifier, url_host
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_PAGE_SIZE = 1000
+
+
+def url_domain(url: Optional[str]) -> Optional[str]:
+    """Registrable domain of the URL ("news.bbc.co.uk" -> "bbc.co.uk"), or the bare host for IPs."""
+    host = url_host(url)
+    if not host:
+        return None
+    return domain_classifier.registrable_domain(host) or host
+
+
+def compute_summary_metrics(
+    url: Optional[str],
+    tldr: str,
+    key_points: List[str],
+    article_text: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Column values for summary_history; originalWordCount is None when the article is unknown."""
+    return {
+        "originalWordCount": len(article_text.split()) if article_text else None,
+        "summaryWordCount": summary_word_count(tldr, key_points),
+        "domain": url_domain(url),
+        "category": domain_classifier.classify_url(url),
+    }
+
+
+async def backfill(db, page_size: int = BACKFILL_PAGE_SIZE) -> int:
+    """Fills summary_word_count / domain / category for rows saved before they existed.
+
+    The original article text was never stored, so original_word_count stays NULL for
+    these rows and time saved falls back to the average-article estimate.
+    """
+    total = 0
+    while True:
+        rows = await db.query_raw(
+            """
+            SELECT id, url, tldr, key_points AS "keyPoints"
+            FROM summary_history
+            WHERE summary_word_count IS NULL
+            LIMIT $1
+            """,
+            page_size,
+        )
+        if not rows:
+            return total
+        metrics = [compute_summary_metrics(row.get("url"), row["tldr"], row.get("keyPoints") or []) for row in rows]
+        await db.execute_raw(
+            """
+            UPDATE summary_history AS h SET
+                summary_word_count = m.summary_word_count,
+                domain = m.domain,
+                category = m.category
+            FROM unnest($1::text[], $2::int[], $3::text[], $4::text[]) AS m(id, summary_word_count, domain, category)
+            WHERE h.id = m.id
+            """,
+            [row["id"] for row in rows],
+            [m["summaryWordCount"] for m in metrics],
+            [m["domain"] for m in metrics],
+            [m["category"] for m in metrics],
+        )
+        total += len(rows)
+        logger.info(f"[Summary Metrics] Backfilled {total} summaries so far")
+
+
+async def recategorize(db, page_size: int = BACKFILL_PAGE_SIZE) -> int:
+    """Re-applies the current category ruleset to every summary; returns rows that changed.
+
+    Run `python -m services.daily_stats backfill` afterwards so the rollups follow.
+    """
+    changed = 0
+    last_id = ""
+    while True:
+        rows = await db.query_raw(
+            'SELECT id, url, domain, category FROM summary_history WHERE id > $1 ORDER BY id LIMIT $2',
+            last_id,
+            page_size,
+        )
+        if not rows:
+            return changed
+        updates = []
+        for row in rows:
+            domain, category = url_domain(row.get("url")), domain_classifier.classify_url(row.get("url"))
+            if (domain, category) != (row.get("domain"), row.get("category")):
+                updates.append((row["id"], domain, category))
+        if updates:
+            await db.execute_raw(
+                """
+                UPDATE summary_history AS h SET domain = m.domain, category = m.category
+                FROM unnest($1::text[], $2::text[], $3::text[]) AS m(id, domain, category)
+                WHERE h.id = m.id
+                """,
+                [u[0] for u in updates],
+                [u[1] for u in updates],
+                [u[2] for u in updates],
+            )
+            changed += len(updates)
+        last_id = rows[-1]["id"]
+        logger.info(f"[Summary Metrics] Recategorized {changed} summaries so far")
+
+
+async def _main(argv: List[str]) -> None:
+    from prisma import Prisma
+
+    commands = {"backfill": backfill, "recategorize": recategorize}
+    if not argv or argv[0] not in commands:
+        raise SystemExit("usage: python -m services.summary_metrics backfill|recategorize")
+    db = Prisma()
+    await db.connect()
+    try:
+        total = await commands[argv[0]](db)
+        logger.info(f"[Summary Metrics] {argv[0]} complete: {total} summaries updated")
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(sys.argv[1:]))
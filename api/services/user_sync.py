@@ -0,0 +1,263 @@
+"""
+User Sync - Clerk users mirrored into `users` with a single upsert, plus bulk reconciliation
+
+Clerk user.created / user.updated webhooks and the reconciliation job all write users
+through UserSync, so a row gets the same defaults however it arrives. Each write is one
+statement for any number of users: a user is matched by clerkId, or by email for an
+account whose Clerk id changed, and updated only if something differs; users that do not
+exist yet are inserted.
+
+Reconciliation pages through Clerk's user list and batch-upserts users that are missing or
+whose email, name or image differ. It repairs missed webhooks, which the auth dependency
+used to paper over by creating users on a miss on every request.
+
+    cd api && python -m services.user_sync reconcile [--dry-run]
+
+Set CLERK_API_BASE to run it against a local stand-in for the Clerk Backend API.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+CLERK_API_BASE = os.getenv("CLERK_API_BASE", "https://api.clerk.com/v1")
+CLERK_SECRET_KEY = os.getenv("CLERK_SECRET_KEY")
+CLERK_PAGE_SIZE = 500  # Clerk's maximum for GET /users
+CLERK_RECONCILE_INTERVAL_SECONDS = float(os.getenv("CLERK_RECONCILE_INTERVAL_SECONDS", str(6 * 3600)))
+MAX_LOGGED_DIFFS = 20
+
+FREE_SUMMARY_LIMIT = 10  # Daily summaries on the free plan
+
+SYNCED_FIELDS = ("email", "firstName", "lastName", "profileImageUrl")
+
+# Matches by clerkId first, then email. A new email already taken by another row is left
+# unchanged rather than failing the batch; missing names/images never blank stored ones.
+# Rows with an active user-deletion job are never matched, so a sign-up with the email of an
+# account being deleted is not linked to it; it is inserted once the deletion has finished.
+UPSERT_SQL = f"""
+WITH incoming AS (
+    SELECT * FROM unnest($1::text[], $2::text[], $3::text[], $4::text[], $5::text[])
+        AS i(clerk_id, email, first_name, last_name, image_url)
+),
+matched AS (
+    SELECT DISTINCT ON (i.clerk_id)
+        u.id AS user_id,
+        i.clerk_id,
+        CASE WHEN u.email = i.email OR NOT EXISTS (SELECT 1 FROM users o WHERE o.email = i.email)
+             THEN i.email ELSE u.email END AS email,
+        COALESCE(i.first_name, u."firstName") AS first_name,
+        COALESCE(i.last_name, u."lastName") AS last_name,
+        COALESCE(i.image_url, u."profileImageUrl") AS image_url
+    FROM incoming i
+    JOIN users u ON u."clerkId" = i.clerk_id OR u.email = i.email
+    WHERE NOT EXISTS (
+        SELECT 1 FROM history_deletion_jobs j
+        WHERE j."userId" = u."clerkId" AND j.kind = 'user' AND j.status IN ('pending', 'running')
+    )
+    ORDER BY i.clerk_id, (u."clerkId" = i.clerk_id) DESC
+),
+updated AS (
+    UPDATE users u SET
+        "clerkId" = m.clerk_id,
+        email = m.email,
+        "firstName" = m.first_name,
+        "lastName" = m.last_name,
+        "profileImageUrl" = m.image_url,
+        "updatedAt" = NOW()
+    FROM matched m
+    WHERE u.id = m.user_id
+      AND (u."clerkId", u.email, u."firstName", u."lastName", u."profileImageUrl")
+          IS DISTINCT FROM (m.clerk_id, m.email, m.first_name, m.last_name, m.image_url)
+    RETURNING u."clerkId"
+),
+inserted AS (
+    INSERT INTO users (id, "clerkId", email, "firstName", "lastName", "profileImageUrl",
+                       plan, "summaryLimit", "summariesUsed", "totalSummariesMade", "usageResetAt", "createdAt", "updatedAt")
+    SELECT gen_random_uuid()::text, i.clerk_id, i.email, i.first_name, i.last_name, i.image_url,
+           'free', {FREE_SUMMARY_LIMIT}, 0, 0, NOW(), NOW(), NOW()
+    FROM incoming i
+    WHERE NOT EXISTS (SELECT 1 FROM matched m WHERE m.clerk_id = i.clerk_id)
+    ON CONFLICT DO NOTHING
+    RETURNING "clerkId"
+)
+SELECT 'inserted' AS action, "clerkId" FROM inserted
+UNION ALL
+SELECT 'updated' AS action, "clerkId" FROM updated
+"""
+
+EXISTING_SQL = """
+SELECT "clerkId", email, "firstName", "lastName", "profileImageUrl" FROM users
+WHERE "clerkId" = ANY($1::text[])
+"""
+
+
+def primary_email(clerk_user: Dict[str, Any]) -> Optional[str]:
+    """Primary email address, else the first verified one, else the first one."""
+    addresses = clerk_user.get("email_addresses") or []
+    primary = next((e for e in addresses if e.get("id") == clerk_user.get("primary_email_address_id")), None)
+    if primary is None:
+        primary = next((e for e in addresses if (e.get("verification") or {}).get("status") == "verified"), None)
+    if primary is None and addresses:
+        primary = addresses[0]
+    return primary.get("email_address") if primary else None
+
+
+def clerk_user_fields(clerk_user: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """users columns from a Clerk user object (webhook `data` or Backend API), or None without id/email."""
+    clerk_id = clerk_user.get("id")
+    email = primary_email(clerk_user)
+    if not clerk_id or not email:
+        return None
+    return {
+        "clerkId": clerk_id,
+        "email": email,
+        "firstName": clerk_user.get("first_name"),
+        "lastName": clerk_user.get("last_name"),
+        "profileImageUrl": clerk_user.get("image_url"),
+    }
+
+
+def _differs(existing: Optional[Dict[str, Any]], fields: Dict[str, Any]) -> Dict[str, List[Any]]:
+    if existing is None:
+        return {field: [None, fields[field]] for field in SYNCED_FIELDS}
+    # Mirrors UPSERT_SQL: a missing value in Clerk never clears a stored one
+    return {
+        field: [existing[field], fields[field]]
+        for field in SYNCED_FIELDS
+        if fields[field] is not None and existing[field] != fields[field]
+    }
+
+
+class UserSync:
+    """Creates and updates users rows from Clerk user data"""
+
+    def __init__(
+        self,
+        db,
+        clerk_secret_key: Optional[str] = CLERK_SECRET_KEY,
+        clerk_api_base: str = CLERK_API_BASE,
+        page_size: int = CLERK_PAGE_SIZE,
+    ):
+        self.db = db
+        self.clerk_secret_key = clerk_secret_key
+        self.clerk_api_base = clerk_api_base.rstrip("/")
+        self.page_size = page_size
+
+    async def upsert_many(self, users: List[Dict[str, Any]]) -> Dict[str, str]:
+        """Upserts clerk_user_fields() rows in one statement. Returns {clerkId: inserted|updated} for rows written."""
+        # Two incoming users with one email would collide on users_email_key; the first wins.
+        seen_emails = set()
+        batch = []
+        for user in users:
+            if user["email"] in seen_emails:
+                logger.warning(f"[User Sync] Skipping {user['clerkId']}: email {user['email']} appears twice in the batch")
+                continue
+            seen_emails.add(user["email"])
+            batch.append(user)
+        if not batch:
+            return {}
+        rows = await self.db.query_raw(
+            UPSERT_SQL,
+            [u["clerkId"] for u in batch],
+            [u["email"] for u in batch],
+            [u["firstName"] for u in batch],
+            [u["lastName"] for u in batch],
+            [u["profileImageUrl"] for u in batch],
+        )
+        return {row["clerkId"]: row["action"] for row in rows}
+
+    async def upsert(self, clerk_user: Dict[str, Any]) -> Optional[str]:
+        """Syncs one Clerk user object. Returns 'inserted', 'updated', or None when nothing changed.
+
+        Raises ValueError when the object has no id or email address.
+        """
+        fields = clerk_user_fields(clerk_user)
+        if fields is None:
+            raise ValueError(f"Clerk user {clerk_user.get('id')} has no id or email address")
+        return (await self.upsert_many([fields])).get(fields["clerkId"])
+
+    async def iter_clerk_users(self) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Pages of Clerk user objects, oldest first."""
+        if not self.clerk_secret_key:
+            raise RuntimeError("CLERK_SECRET_KEY is not configured.")
+        headers = {"Authorization": f"Bearer {self.clerk_secret_key}", "User-Agent": "TildraAPI/1.0"}
+        async with httpx.AsyncClient(base_url=self.clerk_api_base, headers=headers, timeout=30.0) as client:
+            offset = 0
+            while True:
+                response = await client.get(
+                    "/users", params={"limit": self.page_size, "offset": offset, "order_by": "+created_at"}
+                )
+                response.raise_for_status()
+                page = response.json()
+                page = page.get("data", []) if isinstance(page, dict) else page
+                if not page:
+                    return
+                yield page
+                if len(page) < self.page_size:
+                    return
+                offset += len(page)
+
+    async def reconcile(self, dry_run: bool = False) -> Dict[str, Any]:
+        """Upserts every Clerk user that is missing from users or differs from it."""
+        start = time.perf_counter()
+        summary: Dict[str, Any] = {"clerkUsers": 0, "missing": 0, "changed": 0, "written": 0, "skipped": 0, "dryRun": dry_run}
+        logged = 0
+        async for page in self.iter_clerk_users():
+            summary["clerkUsers"] += len(page)
+            users = []
+            for clerk_user in page:
+                fields = clerk_user_fields(clerk_user)
+                if fields is None:
+                    summary["skipped"] += 1
+                    continue
+                users.append(fields)
+            existing_rows = await self.db.query_raw(EXISTING_SQL, [u["clerkId"] for u in users])
+            existing = {row["clerkId"]: row for row in existing_rows}
+
+            stale = []
+            for fields in users:
+                changes = _differs(existing.get(fields["clerkId"]), fields)
+                if not changes:
+                    continue
+                summary["missing" if fields["clerkId"] not in existing else "changed"] += 1
+                stale.append(fields)
+                if logged < MAX_LOGGED_DIFFS:
+                    logger.info(f"[User Sync] {'missing' if fields['clerkId'] not in existing else 'changed'} {fields['clerkId']}: {changes}")
+                    logged += 1
+            if stale and not dry_run:
+                summary["written"] += len(await self.upsert_many(stale))
+
+        summary["seconds"] = round(time.perf_counter() - start, 1)
+        logger.info(f"[User Sync] Reconcile {'dry run' if dry_run else 'done'}: {summary}")
+        return summary
+
+    async def run_reconcile(self) -> bool:
+        """PollingWorker handler: one reconciliation pass per interval."""
+        await self.reconcile()
+        return False
+
+
+async def _main(argv: List[str]) -> None:
+    from prisma import Prisma
+
+    if argv[:1] != ["reconcile"]:
+        raise SystemExit("usage: python -m services.user_sync reconcile [--dry-run]")
+    db = Prisma()
+    await db.connect()
+    try:
+        await UserSync(db).reconcile(dry_run="--dry-run" in argv)
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    asyncio.run(_main(sys.argv[1:]))
@@ -0,0 +1,191 @@
+"""
+Webhook Inbox - Durable store-then-process pipeline for provider webhooks (Stripe, Clerk)
+
+Webhook endpoints only verify the signature and insert the event here, keyed by the
+provider's event id, so the provider gets its 2xx after a single insert and its retries
+are deduplicated. A PollingWorker then processes events with retries and backoff. Events
+that share an ordering key (a Stripe customer, a Clerk user) are processed one at a time
+in the order the provider created them; an event waits while an earlier one for the same
+key is still pending or running.
+"""
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_MAX_ATTEMPTS = 8
+WEBHOOK_RETRY_BASE_SECONDS = 10   # 10s, 20s, 40s ... capped below
+WEBHOOK_RETRY_MAX_SECONDS = 3600
+# A processing event whose worker has not finished within this long is assumed orphaned
+# (e.g. the machine restarted mid-event) and is picked up again.
+WEBHOOK_STALE_AFTER = "5 minutes"
+WEBHOOK_RETENTION = "30 days"     # Processed events are kept this long for dedupe and debugging
+PRUNE_INTERVAL_SECONDS = 3600
+
+EventHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+events_total = registry.counter(
+    "webhook_events_total",
+    "Webhook events by provider and result (received/duplicate/processed/retried/failed).",
+    ["provider", "result"],
+)
+process_seconds = registry.histogram(
+    "webhook_event_process_seconds",
+    "Time spent processing one webhook event.",
+    ["provider"],
+)
+
+EVENT_COLUMNS = 'provider, id, type, "orderingKey", payload, status, attempts, error, "eventCreatedAt", "receivedAt"'
+
+RECORD_SQL = """
+INSERT INTO webhook_events (provider, id, type, "orderingKey", payload, status, attempts, "eventCreatedAt", "receivedAt", "nextAttemptAt", "updatedAt")
+VALUES ($1, $2, $3, $4, $5::jsonb, 'pending', 0, $6::timestamptz, NOW(), NOW(), NOW())
+ON CONFLICT (provider, id) DO NOTHING
+RETURNING id
+"""
+
+# Oldest ready event whose ordering key has nothing earlier still waiting or running.
+CLAIM_SQL = f"""
+UPDATE webhook_events SET status = 'processing', attempts = attempts + 1, "updatedAt" = NOW()
+WHERE (provider, id) = (
+    SELECT e.provider, e.id FROM webhook_events e
+    WHERE (
+        (e.status = 'pending' AND e."nextAttemptAt" <= NOW())
+        OR (e.status = 'processing' AND e."updatedAt" < NOW() - INTERVAL '{WEBHOOK_STALE_AFTER}')
+    )
+    AND NOT EXISTS (
+        SELECT 1 FROM webhook_events p
+        WHERE p.provider = e.provider
+          AND p."orderingKey" = e."orderingKey"
+          AND p.status IN ('pending', 'processing')
+          AND (p."eventCreatedAt", p."receivedAt") < (e."eventCreatedAt", e."receivedAt")
+    )
+    ORDER BY e."eventCreatedAt", e."receivedAt"
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING {EVENT_COLUMNS}
+"""
+
+COMPLETE_SQL = """
+UPDATE webhook_events SET status = 'processed', error = NULL, "processedAt" = NOW(), "updatedAt" = NOW()
+WHERE provider = $1 AND id = $2
+"""
+
+RETRY_SQL = """
+UPDATE webhook_events SET status = $3, error = $4, "nextAttemptAt" = NOW() + make_interval(secs => $5), "updatedAt" = NOW()
+WHERE provider = $1 AND id = $2
+"""
+
+PRUNE_SQL = f"""
+DELETE FROM webhook_events WHERE status = 'processed' AND "processedAt" < NOW() - INTERVAL '{WEBHOOK_RETENTION}'
+"""
+
+
+def retry_delay(attempts: int) -> float:
+    return min(WEBHOOK_RETRY_BASE_SECONDS * 2 ** (attempts - 1), WEBHOOK_RETRY_MAX_SECONDS)
+
+
+class WebhookInbox:
+    """Records verified webhook events and feeds them to per-provider handlers"""
+
+    def __init__(self, db, handlers: Optional[Dict[str, EventHandler]] = None):
+        self.db = db
+        self.handlers: Dict[str, EventHandler] = dict(handlers or {})
+        self._last_prune = 0.0
+
+    def register(self, provider: str, handler: EventHandler) -> None:
+        self.handlers[provider] = handler
+
+    async def record(
+        self,
+        provider: str,
+        event_id: str,
+        event_type: str,
+        payload: Dict[str, Any],
+        ordering_key: Optional[str] = None,
+        created_at: Optional[datetime] = None,
+    ) -> bool:
+        """Stores a verified event. Returns False when the event id was already recorded."""
+        created_at = created_at or datetime.now(timezone.utc)
+        rows = await self.db.query_raw(
+            RECORD_SQL, provider, event_id, event_type, ordering_key, json.dumps(payload), created_at.isoformat()
+        )
+        events_total.inc(provider=provider, result="received" if rows else "duplicate")
+        if not rows:
+            logger.info(f"[Webhook Inbox] Duplicate {provider} event {event_id} ({event_type}) ignored")
+        return bool(rows)
+
+    async def run_next(self) -> bool:
+        """Claims and processes one event. Returns False when nothing is ready."""
+        rows = await self.db.query_raw(CLAIM_SQL)
+        if not rows:
+            await self._prune_if_due()
+            return False
+        event = rows[0]
+        provider, event_id = event["provider"], event["id"]
+        payload = event["payload"]
+        payload = json.loads(payload) if isinstance(payload, str) else payload
+
+        start = time.perf_counter()
+        try:
+            handler = self.handlers.get(provider)
+            if handler is None:
+                raise RuntimeError(f"No webhook handler registered for provider '{provider}'")
+            await handler(payload)
+        except Exception as e:
+            attempts = event["attempts"]
+            status = "failed" if attempts >= WEBHOOK_MAX_ATTEMPTS else "pending"
+            delay = retry_delay(attempts)
+            logger.error(
+                f"[Webhook Inbox] {provider} event {event_id} ({event['type']}) attempt {attempts} failed, "
+                f"marking {status}{'' if status == 'failed' else f' (retry in {delay:.0f}s)'}: {e}",
+                exc_info=True,
+            )
+            await self.db.execute_raw(RETRY_SQL, provider, event_id, status, str(e)[:1000], delay)
+            events_total.inc(provider=provider, result="failed" if status == "failed" else "retried")
+            return True
+        finally:
+            process_seconds.observe(time.perf_counter() - start, provider=provider)
+
+        await self.db.execute_raw(COMPLETE_SQL, provider, event_id)
+        events_total.inc(provider=provider, result="processed")
+        logger.info(f"[Webhook Inbox] Processed {provider} event {event_id} ({event['type']})")
+        return True
+
+    async def _prune_if_due(self) -> None:
+        if time.monotonic() - self._last_prune < PRUNE_INTERVAL_SECONDS:
+            return
+        self._last_prune = time.monotonic()
+        pruned = await self.db.execute_raw(PRUNE_SQL)
+        if pruned:
+            logger.info(f"[Webhook Inbox] Pruned {pruned} processed events")
+
+
+async def _main(argv: List[str]) -> None:
+    from prisma import Prisma
+
+    if argv[:1] != ["retry-failed"]:
+        raise SystemExit("usage: python -m services.webhook_inbox retry-failed")
+    db = Prisma()
+    await db.connect()
+    try:
+        count = await db.execute_raw(
+            """UPDATE webhook_events SET status = 'pending', attempts = 0, "nextAttemptAt" = NOW(), "updatedAt" = NOW() WHERE status = 'failed'"""
+        )
+        logger.info(f"[Webhook Inbox] Re-queued {count} failed events; the API's webhook worker will pick them up")
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(sys.argv[1:]))
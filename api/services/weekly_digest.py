@@ -0,0 +1,220 @@
+"""
+Weekly Digest - Weekly summary email for users with summaryNotifications enabled
+
+Users who turned off emailNotifications ("Receive important updates via email") are
+skipped too, whatever their summaryNotifications setting.
+
+Once a week (DIGEST_WEEKDAY after DIGEST_HOUR_UTC, UTC) the job walks opted-in users in
+keyset chunks. For each chunk it reads the week of summary_history with one grouped query,
+renders the digest HTML from the weekly_digest.html template (compiled once), and queues
+the messages in the email outbox with a single insert. The email worker then sends them to
+Brevo in batches. Only one chunk is held in memory at a time. Outbox idempotency keys are
+per user and week, so a run that is interrupted or repeated never emails anyone twice.
+
+    cd api && python -m services.weekly_digest run [--dry-run] [--week-ending YYYY-MM-DD]
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from .analytics import ESTIMATED_ORIGINAL_WORDS, READING_WORDS_PER_MINUTE
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+DIGEST_CHUNK_SIZE = 1000
+DIGEST_DAYS = 7
+DIGEST_MAX_ITEMS = 5              # Latest summaries listed per email
+DIGEST_TLDR_CHARS = 280
+DIGEST_WEEKDAY = int(os.getenv("DIGEST_WEEKDAY", "0"))      # Monday
+DIGEST_HOUR_UTC = int(os.getenv("DIGEST_HOUR_UTC", "3"))
+DIGEST_SUBJECT = "Your week on Tildra"
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "email_templates")
+_jinja_env = Environment(loader=FileSystemLoader(TEMPLATE_DIR), autoescape=select_autoescape(["html", "xml"]))
+
+users_processed = registry.counter("digest_users_processed_total", "Opted-in users scanned by the weekly digest.")
+digests_queued = registry.counter("digest_emails_queued_total", "Weekly digest emails queued in the email outbox.")
+chunk_seconds = registry.histogram("digest_chunk_seconds", "Time to query, render and queue one chunk of users.")
+
+# summaryNotifications is NULL for users created before the column had a default
+USERS_SQL = """
+SELECT "clerkId", email, "firstName" FROM users
+WHERE "summaryNotifications" IS NOT FALSE AND "emailNotifications" IS NOT FALSE AND "clerkId" > $1
+ORDER BY "clerkId"
+LIMIT $2
+"""
+
+# Per user in $1: count, estimated minutes saved (as in services/analytics.py) and the latest
+# summaries of the week [$2, $3). Users without a summary that week get no row and no email.
+WEEK_SQL = f"""
+SELECT
+    "userId",
+    COUNT(*)::int AS summaries,
+    SUM(GREATEST(
+        (COALESCE(original_word_count, {ESTIMATED_ORIGINAL_WORDS}) - COALESCE(summary_word_count, 0))::float
+            / {READING_WORDS_PER_MINUTE} * 60,
+        0
+    )) AS time_saved,
+    mode() WITHIN GROUP (ORDER BY category) AS top_category,
+    to_json((array_agg(
+        json_build_object('title', title, 'url', url, 'domain', domain, 'tldr', left(tldr, {DIGEST_TLDR_CHARS}))
+        ORDER BY "createdAt" DESC
+    ))[1:{DIGEST_MAX_ITEMS}]) AS recent
+FROM summary_history
+WHERE "userId" = ANY($1::text[]) AND "createdAt" >= $2::timestamp AND "createdAt" < $3::timestamp
+GROUP BY "userId"
+"""
+
+RUN_STARTED_SQL = """
+INSERT INTO email_digest_runs (week, "startedAt") VALUES ($1, NOW())
+ON CONFLICT (week) DO UPDATE SET "startedAt" = NOW(), "completedAt" = NULL
+"""
+
+RUN_COMPLETED_SQL = """
+UPDATE email_digest_runs SET "completedAt" = NOW(), users = $2, queued = $3, seconds = $4 WHERE week = $1
+"""
+
+
+def digest_week(week_end: date) -> str:
+    """ISO week label ("2025-W26") of the week that ends the day before `week_end`."""
+    year, week, _ = (week_end - timedelta(days=1)).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _format_time_saved(minutes: float) -> str:
+    # Same presentation as the time_saved insight (services/insights.py)
+    return f"{minutes / 60:.1f} h" if minutes >= 60 else f"{round(minutes)} min"
+
+
+class WeeklyDigest:
+    """Renders the weekly digest for every opted-in user and queues it in the email outbox"""
+
+    def __init__(
+        self,
+        db,
+        email_outbox,
+        sender: Dict[str, str],
+        frontend_url: str,
+        chunk_size: int = DIGEST_CHUNK_SIZE,
+    ):
+        self.db = db
+        self.email_outbox = email_outbox
+        self.sender = sender
+        self.frontend_url = frontend_url.rstrip("/")
+        self.chunk_size = chunk_size
+        self.template = _jinja_env.get_template("weekly_digest.html")
+
+    def render(self, user: Dict[str, Any], week: Dict[str, Any], week_start: date, week_end: date) -> Dict[str, Any]:
+        """Brevo payload for one user's digest."""
+        recent = week["recent"]
+        recent = json.loads(recent) if isinstance(recent, str) else recent
+        html = self.template.render(
+            first_name=user["firstName"] or "there",
+            week_start=week_start.strftime("%b %d"),
+            week_end=(week_end - timedelta(days=1)).strftime("%b %d"),
+            summaries=week["summaries"],
+            time_saved=_format_time_saved(float(week["time_saved"] or 0)),
+            top_category=week["top_category"],
+            recent=recent or [],
+            history_url=f"{self.frontend_url}/dashboard",
+            settings_url=f"{self.frontend_url}/settings",
+        )
+        return {
+            "sender": self.sender,
+            "to": [{"email": user["email"], "name": user["firstName"] or user["email"]}],
+            "subject": DIGEST_SUBJECT,
+            "htmlContent": html,
+            "tags": ["weekly-digest"],
+        }
+
+    async def run(self, week_end: Optional[date] = None, dry_run: bool = False) -> Dict[str, Any]:
+        """Queues the digest for the DIGEST_DAYS days before `week_end` (default: today, UTC)."""
+        week_end = week_end or datetime.now(timezone.utc).date()
+        week_start = week_end - timedelta(days=DIGEST_DAYS)
+        week = digest_week(week_end)
+        if not dry_run:
+            await self.db.execute_raw(RUN_STARTED_SQL, week)
+
+        start = time.perf_counter()
+        summary: Dict[str, Any] = {"week": week, "users": 0, "active": 0, "queued": 0, "dryRun": dry_run}
+        last_clerk_id = ""
+        while True:
+            users = await self.db.query_raw(USERS_SQL, last_clerk_id, self.chunk_size)
+            if not users:
+                break
+            last_clerk_id = users[-1]["clerkId"]
+            chunk_start = time.perf_counter()
+            weeks = await self.db.query_raw(
+                WEEK_SQL, [u["clerkId"] for u in users], week_start.isoformat(), week_end.isoformat()
+            )
+            by_user = {row["userId"]: row for row in weeks}
+            messages = [
+                (f"digest:{week}:{user['clerkId']}", self.render(user, by_user[user["clerkId"]], week_start, week_end))
+                for user in users
+                if user["clerkId"] in by_user and user["email"]
+            ]
+            if messages and not dry_run:
+                queued = await self.email_outbox.enqueue_many("digest", messages)
+                summary["queued"] += queued
+                digests_queued.inc(queued)
+            summary["users"] += len(users)
+            summary["active"] += len(messages)
+            users_processed.inc(len(users))
+            chunk_seconds.observe(time.perf_counter() - chunk_start)
+            if len(users) < self.chunk_size:
+                break
+            await asyncio.sleep(0)  # Rendering is CPU work; let requests in between chunks
+
+        elapsed = time.perf_counter() - start
+        summary["seconds"] = round(elapsed, 1)
+        summary["usersPerSecond"] = round(summary["users"] / elapsed) if elapsed > 0 else 0
+        if not dry_run:
+            await self.db.execute_raw(RUN_COMPLETED_SQL, week, summary["users"], summary["queued"], elapsed)
+        logger.info(f"[Weekly Digest] {'Dry run' if dry_run else 'Done'}: {summary}")
+        return summary
+
+    async def run_if_due(self) -> bool:
+        """PollingWorker handler: runs once per week, on DIGEST_WEEKDAY after DIGEST_HOUR_UTC."""
+        now = datetime.now(timezone.utc)
+        if now.weekday() != DIGEST_WEEKDAY or now.hour < DIGEST_HOUR_UTC:
+            return False
+        rows = await self.db.query_raw(
+            'SELECT "completedAt" FROM email_digest_runs WHERE week = $1', digest_week(now.date())
+        )
+        if rows and rows[0]["completedAt"] is not None:
+            return False
+        await self.run(now.date())
+        return False  # One pass per week
+
+
+async def _main(argv: List[str]) -> None:
+    from prisma import Prisma
+
+    from .email_outbox import EmailOutbox
+
+    if argv[:1] != ["run"]:
+        raise SystemExit("usage: python -m services.weekly_digest run [--dry-run] [--week-ending YYYY-MM-DD]")
+    week_end = date.fromisoformat(argv[argv.index("--week-ending") + 1]) if "--week-ending" in argv else None
+    sender = {"name": "Tildra Team", "email": "support@tildra.xyz"}  # SENDER_NAME / SENDER_EMAIL in main.py
+    db = Prisma()
+    await db.connect()
+    try:
+        # Queued only; the API's email worker sends them
+        digest = WeeklyDigest(db, EmailOutbox(db, None), sender, os.getenv("FRONTEND_URL", "http://localhost:3000"))
+        await digest.run(week_end, dry_run="--dry-run" in argv)
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(sys.argv[1:]))
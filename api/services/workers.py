@@ -0,0 +1,66 @@
+"""
+Background Workers - Minimal in-process polling loop for durable, table-backed jobs
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PollingWorker:
+    """Runs `handler` repeatedly on the event loop until stopped.
+
+    `handler` returns True when it did some work (it is called again right away) and
+    False when there was nothing to do (the worker sleeps for `interval` seconds or
+    until `wake()` is called). The job state itself lives in the database, so a worker
+    that dies with the machine simply picks up where it left off on the next start.
+    """
+
+    def __init__(self, name: str, handler: Callable[[], Awaitable[bool]], interval: float = 30.0):
+        self.name = name
+        self.handler = handler
+        self.interval = interval
+        self._wake_event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(), name=f"worker:{self.name}")
+        logger.info(f"[Worker {self.name}] Started (interval={self.interval}s)")
+
+    def wake(self) -> None:
+        """Ask the worker to poll immediately instead of waiting out its interval."""
+        self._wake_event.set()
+
+    async def stop(self) -> None:
+        self._stopping = True
+        self._wake_event.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        logger.info(f"[Worker {self.name}] Stopped")
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                did_work = await self.handler()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[Worker {self.name}] Handler failed: {e}", exc_info=True)
+                did_work = False
+            if did_work:
+                await asyncio.sleep(0)  # Let request handlers run between units of work
+                continue
+            self._wake_event.clear()
+            try:
+                await asyncio.wait_for(self._wake_event.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,20 @@
+-- array_to_string is only STABLE, so wrap it for use in a generated column.
+CREATE OR REPLACE FUNCTION "immutable_array_to_string"(TEXT[], TEXT) RETURNS TEXT
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$ SELECT array_to_string($1, $2) $$;
+
+-- AlterTable
+ALTER TABLE "summary_history" ADD COLUMN "search_vector" tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('english'::regconfig, coalesce("title", '')), 'A') ||
+    setweight(to_tsvector('english'::regconfig, coalesce("tldr", '')), 'B') ||
+    setweight(to_tsvector('english'::regconfig, coalesce("immutable_array_to_string"("key_points", ' '), '')), 'C')
+) STORED;
+
+-- btree_gin lets "userId" live in the same GIN index, so per-user searches never
+-- touch posting lists belonging to other users.
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+
+-- CreateIndex
+CREATE INDEX "summary_history_userId_search_vector_idx" ON "summary_history" USING GIN ("userId", "search_vector");
+
+-- CreateIndex
+CREATE INDEX "summary_history_userId_createdAt_idx" ON "summary_history"("userId", "createdAt" DESC);
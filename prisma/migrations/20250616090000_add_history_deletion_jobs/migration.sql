@@ -0,0 +1,24 @@
+-- CreateTable
+CREATE TABLE "history_deletion_jobs" (
+    "id" TEXT NOT NULL,
+    "userId" TEXT NOT NULL,
+    "kind" TEXT NOT NULL,
+    "status" TEXT NOT NULL DEFAULT 'pending',
+    "deletedCount" INTEGER NOT NULL DEFAULT 0,
+    "attempts" INTEGER NOT NULL DEFAULT 0,
+    "error" TEXT,
+    "createdAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "updatedAt" TIMESTAMP(3) NOT NULL,
+    "completedAt" TIMESTAMP(3),
+
+    CONSTRAINT "history_deletion_jobs_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateIndex
+CREATE INDEX "history_deletion_jobs_status_createdAt_idx" ON "history_deletion_jobs"("status", "createdAt");
+
+-- CreateIndex
+CREATE INDEX "history_deletion_jobs_userId_idx" ON "history_deletion_jobs"("userId");
+
+-- At most one active job per user and kind
+CREATE UNIQUE INDEX "history_deletion_jobs_active_key" ON "history_deletion_jobs"("userId", "kind") WHERE "status" IN ('pending', 'running');
@@ -0,0 +1,30 @@
+-- CreateTable
+CREATE TABLE "summary_embeddings" (
+    "summaryId" TEXT NOT NULL,
+    "userId" TEXT NOT NULL,
+    "vector" TEXT NOT NULL,
+    "listId" INTEGER,
+    "createdAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "summary_embeddings_pkey" PRIMARY KEY ("summaryId")
+);
+
+-- CreateTable
+CREATE TABLE "embedding_indexes" (
+    "userId" TEXT NOT NULL,
+    "centroids" TEXT NOT NULL,
+    "nlist" INTEGER NOT NULL,
+    "vectorCount" INTEGER NOT NULL,
+    "builtAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "embedding_indexes_pkey" PRIMARY KEY ("userId")
+);
+
+-- CreateIndex
+CREATE INDEX "summary_embeddings_userId_summaryId_idx" ON "summary_embeddings"("userId", "summaryId");
+
+-- CreateIndex
+CREATE INDEX "summary_embeddings_userId_listId_idx" ON "summary_embeddings"("userId", "listId");
+
+-- AddForeignKey
+ALTER TABLE "summary_embeddings" ADD CONSTRAINT "summary_embeddings_summaryId_fkey" FOREIGN KEY ("summaryId") REFERENCES "summary_history"("id") ON DELETE CASCADE ON UPDATE CASCADE;
@@ -0,0 +1,12 @@
+-- CreateTable
+CREATE TABLE "user_daily_stats" (
+    "userId" TEXT NOT NULL,
+    "day" DATE NOT NULL,
+    "category" TEXT NOT NULL,
+    "summaryCount" INTEGER NOT NULL DEFAULT 0,
+    "wordsProduced" INTEGER NOT NULL DEFAULT 0,
+    "timeSaved" DOUBLE PRECISION NOT NULL DEFAULT 0,
+    "updatedAt" TIMESTAMP(3) NOT NULL,
+
+    CONSTRAINT "user_daily_stats_pkey" PRIMARY KEY ("userId","day","category")
+);
@@ -0,0 +1,5 @@
+-- AlterTable
+ALTER TABLE "summary_history" ADD COLUMN     "category" TEXT,
+ADD COLUMN     "domain" TEXT,
+ADD COLUMN     "original_word_count" INTEGER,
+ADD COLUMN     "summary_word_count" INTEGER;
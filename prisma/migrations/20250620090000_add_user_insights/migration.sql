@@ -0,0 +1,11 @@
+-- CreateTable
+CREATE TABLE "user_insights" (
+    "userId" TEXT NOT NULL,
+    "insights" JSONB NOT NULL,
+    "computedAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "user_insights_pkey" PRIMARY KEY ("userId")
+);
+
+-- CreateIndex
+CREATE INDEX "user_insights_computedAt_idx" ON "user_insights"("computedAt");
@@ -0,0 +1,23 @@
+-- CreateTable
+CREATE TABLE "user_goals" (
+    "id" TEXT NOT NULL,
+    "userId" TEXT NOT NULL,
+    "type" TEXT NOT NULL,
+    "metric" TEXT NOT NULL,
+    "target" INTEGER NOT NULL,
+    "period" TEXT NOT NULL,
+    "periodStart" DATE NOT NULL,
+    "progress" DOUBLE PRECISION NOT NULL DEFAULT 0,
+    "samples" INTEGER NOT NULL DEFAULT 0,
+    "isActive" BOOLEAN NOT NULL DEFAULT true,
+    "createdAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "updatedAt" TIMESTAMP(3) NOT NULL,
+
+    CONSTRAINT "user_goals_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateIndex
+CREATE INDEX "user_goals_userId_createdAt_idx" ON "user_goals"("userId", "createdAt");
+
+-- CreateIndex
+CREATE INDEX "user_goals_periodStart_idx" ON "user_goals"("periodStart");
@@ -0,0 +1,24 @@
+-- CreateTable
+CREATE TABLE "webhook_events" (
+    "provider" TEXT NOT NULL,
+    "id" TEXT NOT NULL,
+    "type" TEXT NOT NULL,
+    "orderingKey" TEXT,
+    "payload" JSONB NOT NULL,
+    "status" TEXT NOT NULL DEFAULT 'pending',
+    "attempts" INTEGER NOT NULL DEFAULT 0,
+    "error" TEXT,
+    "eventCreatedAt" TIMESTAMPTZ(3) NOT NULL,
+    "receivedAt" TIMESTAMPTZ(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "nextAttemptAt" TIMESTAMPTZ(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "processedAt" TIMESTAMPTZ(3),
+    "updatedAt" TIMESTAMPTZ(3) NOT NULL,
+
+    CONSTRAINT "webhook_events_pkey" PRIMARY KEY ("provider","id")
+);
+
+-- CreateIndex
+CREATE INDEX "webhook_events_status_nextAttemptAt_idx" ON "webhook_events"("status", "nextAttemptAt");
+
+-- CreateIndex
+CREATE INDEX "webhook_events_provider_orderingKey_eventCreatedAt_idx" ON "webhook_events"("provider", "orderingKey", "eventCreatedAt");
@@ -0,0 +1,16 @@
+-- CreateTable
+CREATE TABLE "stripe_subscriptions" (
+    "id" TEXT NOT NULL,
+    "customerId" TEXT NOT NULL,
+    "status" TEXT NOT NULL,
+    "priceId" TEXT,
+    "currentPeriodEnd" TIMESTAMPTZ(3),
+    "cancelAtPeriodEnd" BOOLEAN NOT NULL DEFAULT false,
+    "eventCreatedAt" TIMESTAMPTZ(3) NOT NULL,
+    "updatedAt" TIMESTAMPTZ(3) NOT NULL,
+
+    CONSTRAINT "stripe_subscriptions_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateIndex
+CREATE INDEX "stripe_subscriptions_customerId_idx" ON "stripe_subscriptions"("customerId");
@@ -0,0 +1,2 @@
+-- Users still waiting for a Stripe customer, oldest first (see api/services/stripe_customers.py)
+CREATE INDEX "users_unprovisioned_createdAt_idx" ON "users"("createdAt") WHERE "stripeCustomerId" IS NULL;
@@ -0,0 +1,11 @@
+-- CreateTable
+CREATE TABLE "email_digest_runs" (
+    "week" TEXT NOT NULL,
+    "startedAt" TIMESTAMPTZ(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "completedAt" TIMESTAMPTZ(3),
+    "users" INTEGER NOT NULL DEFAULT 0,
+    "queued" INTEGER NOT NULL DEFAULT 0,
+    "seconds" DOUBLE PRECISION,
+
+    CONSTRAINT "email_digest_runs_pkey" PRIMARY KEY ("week")
+);
@@ -0,0 +1,18 @@
+-- A list id only means something under the centroids it was assigned with. Each index
+-- build gets an id, stored with the centroids and on every vector it assigns; vectors
+-- whose buildId is not the index's current one are scanned like unassigned vectors.
+
+-- AlterTable
+ALTER TABLE "embedding_indexes" ADD COLUMN "buildId" INTEGER NOT NULL DEFAULT 0;
+
+-- AlterTable
+ALTER TABLE "summary_embeddings" ADD COLUMN "buildId" INTEGER;
+
+-- Vectors assigned before builds were tracked belong to the existing index (buildId 0)
+UPDATE "summary_embeddings" SET "buildId" = 0 WHERE "listId" IS NOT NULL;
+
+-- DropIndex
+DROP INDEX "summary_embeddings_userId_listId_idx";
+
+-- CreateIndex
+CREATE INDEX "summary_embeddings_userId_buildId_listId_idx" ON "summary_embeddings"("userId", "buildId", "listId");
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Test script for Clerk user sync (services/user_sync.py).
+
+Starts a local stand-in for Clerk's Backend API (GET /v1/users with limit/offset paging)
+and runs the single-statement upsert and the bulk reconciliation against the database in
+DATABASE_URL. Every user it creates has a random `test_sync_` prefix and is deleted again.
+
+    DATABASE_URL=postgresql://... python test_clerk_sync.py
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "api"))
+
+from services.user_sync import FREE_SUMMARY_LIMIT, UserSync
+
+PREFIX = f"test_sync_{uuid.uuid4().hex[:8]}"
+CLERK_USERS = 1203  # Three pages of 500
+
+
+def clerk_user(clerk_id, email, first_name="Test", last_name="User"):
+    return {
+        "id": clerk_id,
+        "first_name": first_name,
+        "last_name": last_name,
+        "image_url": f"https://img.example.com/{clerk_id}.png",
+        "primary_email_address_id": "idn_1",
+        "email_addresses": [{"id": "idn_1", "email_address": email, "verification": {"status": "verified"}}],
+    }
+
+
+def start_clerk_stand_in(users):
+    """Serves `users` as Clerk's paginated user list; returns (base URL, server)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path != "/v1/users" or self.headers.get("Authorization") != "Bearer sk_test_stand_in":
+                self.send_response(404)
+                self.end_headers()
+                return
+            limit, offset = int(query["limit"][0]), int(query.get("offset", ["0"])[0])
+            body = json.dumps(users[offset:offset + limit]).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v1", server
+
+
+async def count_users(db, clerk_id):
+    rows = await db.query_raw('SELECT COUNT(*)::int AS n FROM users WHERE "clerkId" = $1', clerk_id)
+    return rows[0]["n"]
+
+
+async def test_single_upsert(db):
+    print("Testing single-statement upsert...")
+    sync = UserSync(db, clerk_secret_key=None)
+    user = clerk_user(f"{PREFIX}_a", f"{PREFIX}_a@example.com")
+    results = [
+        await sync.upsert(user),
+        await sync.upsert(user),
+        await sync.upsert({**user, "first_name": "Renamed"}),
+        # Same person signs up again: new Clerk ID, same email
+        await sync.upsert({**user, "id": f"{PREFIX}_a2", "first_name": "Renamed"}),
+    ]
+    rows = await db.query_raw(
+        'SELECT "clerkId", "firstName", plan, "summaryLimit" FROM users WHERE email = $1', f"{PREFIX}_a@example.com"
+    )
+    expected = ["inserted", None, "updated", "updated"]
+    if results == expected and len(rows) == 1 and rows[0]["clerkId"] == f"{PREFIX}_a2" and rows[0]["firstName"] == "Renamed" \
+            and rows[0]["plan"] == "free" and rows[0]["summaryLimit"] == FREE_SUMMARY_LIMIT:
+        print(f"✅ insert / no-op / update / relink: {results}")
+        return True
+    print(f"❌ Expected {expected} and one relinked free row, got {results} and {rows}")
+    return False
+
+
+async def test_reconcile(db):
+    print(f"\nTesting reconciliation against a Clerk stand-in with {CLERK_USERS} users...")
+    users = [clerk_user(f"{PREFIX}_r{i:05d}", f"{PREFIX}_r{i:05d}@example.com") for i in range(CLERK_USERS)]
+    users.append({**clerk_user(f"{PREFIX}_noemail", "x"), "email_addresses": []})
+    base_url, server = start_clerk_stand_in(users)
+    sync = UserSync(db, clerk_secret_key="sk_test_stand_in", clerk_api_base=base_url)
+    try:
+        # A third already exist (one in ten of those with a stale name); the rest are missing
+        existing = users[: CLERK_USERS // 3]
+        await sync.upsert_many([
+            {"clerkId": u["id"], "email": u["email_addresses"][0]["email_address"],
+             "firstName": "Stale" if i % 10 == 0 else u["first_name"], "lastName": u["last_name"], "profileImageUrl": u["image_url"]}
+            for i, u in enumerate(existing)
+        ])
+        dry = await sync.reconcile(dry_run=True)
+        first = await sync.reconcile()
+        second = await sync.reconcile()
+    finally:
+        server.shutdown()
+
+    expected_missing = CLERK_USERS - len(existing)
+    expected_changed = (len(existing) + 9) // 10
+    ok = (
+        dry["missing"] == expected_missing and dry["changed"] == expected_changed and dry["written"] == 0
+        and first["written"] == expected_missing + expected_changed and first["skipped"] == 1
+        and second["missing"] == second["changed"] == 0
+        and await count_users(db, f"{PREFIX}_r{CLERK_USERS - 1:05d}") == 1
+    )
+    print(f"  dry run: {dry}\n  first:   {first}\n  second:  {second}")
+    print("✅ Missing and changed users repaired in batches; second pass is clean" if ok else "❌ Unexpected reconciliation counts")
+    return ok
+
+
+async def run(db):
+    try:
+        return [await test_single_upsert(db), await test_reconcile(db)]
+    finally:
+        await db.execute_raw('DELETE FROM users WHERE "clerkId" LIKE $1', f"{PREFIX}%")
+
+
+async def main():
+    from prisma import Prisma
+
+    print("🚀 Testing Clerk user sync")
+    print("=" * 50)
+    db = Prisma()
+    await db.connect()
+    try:
+        results = await run(db)
+    finally:
+        await db.disconnect()
+
+    print("\n" + "=" * 50)
+    print("📊 Test Results Summary:")
+    print(f"✅ Passed: {sum(results)} tests")
+    print(f"❌ Failed: {len(results) - sum(results)} tests")
+    if all(results):
+        print("🎉 All tests passed! Clerk users sync with one upsert and reconcile in bulk.")
+    else:
+        print("⚠️  Some tests failed. Check the output above for details.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
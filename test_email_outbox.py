@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Test script for the email outbox (services/email_outbox.py) and the weekly digest
+(services/weekly_digest.py).
+
+Starts a local stand-in for Brevo's POST /v3/smtp/email (single sends and messageVersions
+batch sends) and runs batching, batch rejection, retry and dedupe, then a chunked digest
+run, against the database in DATABASE_URL. The digest is run for a week in 2000, so only
+this script's users have summaries in it. Every row it creates has a random `test_email_`
+prefix and is deleted again. The worker claims every due message, so the script refuses
+to run while the outbox holds messages of its own.
+
+    DATABASE_URL=postgresql://... python test_email_outbox.py
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import uuid
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "api"))
+
+from services.email_outbox import BREVO_MAX_VERSIONS, EmailOutbox
+from services.weekly_digest import WeeklyDigest, digest_week
+
+PREFIX = f"test_email_{uuid.uuid4().hex[:8]}"
+SENDER = {"name": "Tildra Team", "email": "support@tildra.xyz"}
+WELCOME_EMAILS = 150
+DIGEST_USERS = 1203
+DIGEST_CHUNK_SIZE = 500  # The 721 opted-in users span two chunks
+DIGEST_WEEK_END = date(2001, 1, 1)
+
+
+def start_brevo_stand_in():
+    """Accepts sends like Brevo; returns (URL, server, calls). Recipients starting with 'bad' get a 400."""
+    calls = []
+    state = {"fail_next": 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            calls.append(body)
+            versions = body.get("messageVersions") or [body]
+            if self.headers.get("api-key") != "xkeysib-stand-in":
+                code, out = 401, {"message": "Key not found"}
+            elif state["fail_next"]:
+                state["fail_next"] -= 1
+                code, out = 502, {"message": "Bad gateway"}
+            elif any(v["to"][0]["email"].startswith("bad") for v in versions):
+                code, out = 400, {"message": "Invalid recipient"}
+            elif "messageVersions" in body:
+                code, out = 201, {"messageIds": [f"<batch{len(calls)}.{i}@stand-in>" for i in range(len(versions))]}
+            else:
+                code, out = 201, {"messageId": f"<single{len(calls)}@stand-in>"}
+            payload = json.dumps(out).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.state = state
+    return f"http://127.0.0.1:{server.server_address[1]}/v3/smtp/email", server, calls
+
+
+def welcome(i, email=None):
+    return {
+        "sender": SENDER,
+        "to": [{"email": email or f"{PREFIX}_{i}@example.com", "name": f"User {i}"}],
+        "templateId": 1,
+        "params": {"userName": f"User {i}"},
+    }
+
+
+async def drain(outbox):
+    while await outbox.run_next():
+        pass
+
+
+async def statuses(db, like):
+    rows = await db.query_raw(
+        'SELECT status, COUNT(*)::int AS n FROM email_outbox WHERE "idempotencyKey" LIKE $1 GROUP BY status', like
+    )
+    return {row["status"]: row["n"] for row in rows}
+
+
+async def test_batching_and_dedupe(db, url, server, calls):
+    print(f"Testing batching of {WELCOME_EMAILS} welcome emails, dedupe and a rejected batch...")
+    outbox = EmailOutbox(db, "xkeysib-stand-in", url)
+    try:
+        for i in range(WELCOME_EMAILS):
+            await outbox.enqueue("welcome", welcome(i), f"{PREFIX}:welcome:{i}")
+        duplicate_queued = await outbox.enqueue("welcome", welcome(0), f"{PREFIX}:welcome:0")
+        await outbox.enqueue("welcome", welcome(-1, f"bad_{PREFIX}@example.com"), f"{PREFIX}:welcome:bad")
+        calls.clear()
+        await drain(outbox)
+    finally:
+        await outbox.aclose()
+
+    counts = await statuses(db, f"{PREFIX}:welcome:%")
+    batch_sizes = sorted((len(c["messageVersions"]) for c in calls if "messageVersions" in c), reverse=True)
+    singles = sum("messageVersions" not in c for c in calls)
+    # 151 messages: a batch of 100 goes out; the batch of 51 with the bad address is
+    # rejected and its messages are re-sent one by one.
+    ok = (
+        not duplicate_queued
+        and counts == {"sent": WELCOME_EMAILS, "failed": 1}
+        and batch_sizes == [BREVO_MAX_VERSIONS, WELCOME_EMAILS + 1 - BREVO_MAX_VERSIONS]
+        and singles == WELCOME_EMAILS + 1 - BREVO_MAX_VERSIONS
+    )
+    print(f"  statuses: {counts}, batches: {batch_sizes}, single re-sends: {singles}")
+    print("✅ Batched by template, duplicate ignored, rejected batch re-sent singly" if ok else "❌ Unexpected batching result")
+    return ok
+
+
+async def test_retry(db, url, server, calls):
+    print("\nTesting retry after a 5xx from Brevo...")
+    outbox = EmailOutbox(db, "xkeysib-stand-in", url)
+    key = f"{PREFIX}:retry"
+    try:
+        await outbox.enqueue("welcome", welcome(0), key)
+        server.state["fail_next"] = 1
+        await drain(outbox)
+        first = await db.query_raw('SELECT status, attempts, error FROM email_outbox WHERE "idempotencyKey" = $1', key)
+        # Skip the backoff instead of waiting it out
+        await db.execute_raw('UPDATE email_outbox SET "nextAttemptAt" = NOW() WHERE "idempotencyKey" = $1', key)
+        await drain(outbox)
+        second = await db.query_raw('SELECT status, attempts FROM email_outbox WHERE "idempotencyKey" = $1', key)
+    finally:
+        await outbox.aclose()
+
+    ok = (
+        first[0]["status"] == "pending" and first[0]["attempts"] == 1 and "502" in (first[0]["error"] or "")
+        and second[0]["status"] == "sent" and second[0]["attempts"] == 2
+    )
+    print(f"  after 502: {first[0]}\n  after retry: {second[0]}")
+    print("✅ 5xx left the message pending with backoff; the retry sent it" if ok else "❌ Unexpected retry result")
+    return ok
+
+
+async def test_digest_chunking(db, url, server, calls):
+    print(f"\nTesting a weekly digest over {DIGEST_USERS} users in chunks of {DIGEST_CHUNK_SIZE}...")
+    ids = [f"{PREFIX}_u{i:05d}" for i in range(DIGEST_USERS)]
+    # One in five turned off summary notifications, one in five all email; one in three was inactive that week
+    summary_on = [i % 5 != 0 for i in range(DIGEST_USERS)]
+    email_on = [i % 5 != 1 for i in range(DIGEST_USERS)]
+    active = [i % 3 != 0 for i in range(DIGEST_USERS)]
+    expected = sum(s and e and a for s, e, a in zip(summary_on, email_on, active))
+    await db.execute_raw(
+        """
+        INSERT INTO users (id, "clerkId", email, "firstName", "updatedAt", "summaryNotifications", "emailNotifications")
+        SELECT u.id, u.id, u.id || '@example.com', 'Test', NOW(), u.summary_on, u.email_on
+        FROM unnest($1::text[], $2::boolean[], $3::boolean[]) AS u(id, summary_on, email_on)
+        """,
+        ids, summary_on, email_on,
+    )
+    await db.execute_raw(
+        """
+        INSERT INTO summary_history (id, "userId", title, tldr, "createdAt", "updatedAt")
+        SELECT u.id || '_s' || n, u.id, 'Article ' || n, 'A short summary.', TIMESTAMP '2000-12-28 12:00' + n * INTERVAL '1 hour', NOW()
+        FROM unnest($1::text[]) AS u(id), generate_series(1, 2) AS n
+        """,
+        [user_id for user_id, a in zip(ids, active) if a],
+    )
+
+    outbox = EmailOutbox(db, "xkeysib-stand-in", url)
+    digest = WeeklyDigest(db, outbox, SENDER, "http://localhost:3000", chunk_size=DIGEST_CHUNK_SIZE)
+    try:
+        first = await digest.run(DIGEST_WEEK_END)
+        second = await digest.run(DIGEST_WEEK_END)
+        calls.clear()
+        await drain(outbox)
+    finally:
+        await outbox.aclose()
+
+    counts = await statuses(db, f"digest:{digest_week(DIGEST_WEEK_END)}:{PREFIX}%")
+    versions = sum(len(c.get("messageVersions", [c])) for c in calls)
+    ok = (
+        first["queued"] == expected and first["users"] >= sum(s and e for s, e in zip(summary_on, email_on))
+        and second["queued"] == 0
+        and counts == {"sent": expected}
+        and versions == expected and len(calls) == -(-expected // BREVO_MAX_VERSIONS)
+    )
+    print(f"  first run: {first}\n  second run: {second}\n  sent: {counts}, in {len(calls)} Brevo calls")
+    print(f"✅ {expected} digests queued once and sent in batches" if ok else f"❌ Expected {expected} digests queued once")
+    return ok
+
+
+async def run(db):
+    others = await db.query_raw(
+        "SELECT COUNT(*)::int AS n FROM email_outbox WHERE status IN ('pending', 'sending')"
+    )
+    if others[0]["n"]:
+        print(f"❌ The outbox has {others[0]['n']} unsent messages; run this against a database with an idle outbox")
+        return [False]
+    url, server, calls = start_brevo_stand_in()
+    try:
+        return [
+            await test_batching_and_dedupe(db, url, server, calls),
+            await test_retry(db, url, server, calls),
+            await test_digest_chunking(db, url, server, calls),
+        ]
+    finally:
+        server.shutdown()
+        await db.execute_raw(
+            'DELETE FROM email_outbox WHERE "idempotencyKey" LIKE $1 OR "idempotencyKey" LIKE $2',
+            f"{PREFIX}%", f"digest:%:{PREFIX}%",
+        )
+        await db.execute_raw("DELETE FROM email_digest_runs WHERE week = $1", digest_week(DIGEST_WEEK_END))
+        await db.execute_raw('DELETE FROM summary_history WHERE "userId" LIKE $1', f"{PREFIX}%")
+        await db.execute_raw('DELETE FROM users WHERE "clerkId" LIKE $1', f"{PREFIX}%")
+
+
+async def main():
+    from prisma import Prisma
+
+    print("🚀 Testing email outbox and weekly digest")
+    print("=" * 50)
+    db = Prisma()
+    await db.connect()
+    try:
+        results = await run(db)
+    finally:
+        await db.disconnect()
+
+    print("\n" + "=" * 50)
+    print("📊 Test Results Summary:")
+    print(f"✅ Passed: {sum(results)} tests")
+    print(f"❌ Failed: {len(results) - sum(results)} tests")
+    if all(results):
+        print("🎉 All tests passed! Emails are batched, retried and deduplicated; digests are chunked.")
+    else:
+        print("⚠️  Some tests failed. Check the output above for details.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
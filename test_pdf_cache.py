@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Test script for the resume PDF cache (services/pdf_cache.py).
+
+Runs the cache in a temporary directory with a stand-in render that returns fixed-size
+PDF bytes after a short delay, so no browser is needed. Covers concurrent misses
+rendering once, a waiter taking over when the rendering request is cancelled, eviction
+past max_bytes, the per-owner scoping of PDF ids, and the index rebuild on restart.
+
+    python test_pdf_cache.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "api"))
+
+from services.pdf_cache import PdfCache, pdf_cache_key
+
+PDF_SIZE = 1000
+OWNER = "user_test_owner"
+OTHER_OWNER = "user_test_other"
+
+
+def pdf_id(name):
+    return pdf_cache_key("classic", 1, {"basics": {"name": name}})
+
+
+class StandInRender:
+    """Counts calls; each returns PDF_SIZE bytes after `delay` seconds, or waits for `release`."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = 0
+        self.release = None
+
+    def __call__(self, label):
+        async def render():
+            self.calls += 1
+            if self.release is not None:
+                await self.release.wait()
+            else:
+                await asyncio.sleep(self.delay)
+            return f"%PDF-{label}".encode().ljust(PDF_SIZE, b" ")
+        return render
+
+
+def pdf_files(directory):
+    return sorted(name for _, _, files in os.walk(directory) for name in files)
+
+
+async def test_single_flight(directory):
+    print("Testing concurrent misses for one PDF...")
+    cache = PdfCache(directory)
+    await cache.load()
+    render = StandInRender()
+    results = await asyncio.gather(*(cache.get_or_render(OWNER, pdf_id("a"), render("a")) for _ in range(5)))
+    hit = await cache.get_or_render(OWNER, pdf_id("a"), render("a"))
+
+    ok = (
+        render.calls == 1 and len({data for data, _ in results}) == 1
+        and not any(cached for _, cached in results) and hit == (results[0][0], True)
+        and len(pdf_files(directory)) == 1
+    )
+    print(f"  renders: {render.calls}, then cached: {hit[1]}, stats: {cache.stats()}")
+    print("✅ Five concurrent misses rendered once; the next request was a hit" if ok else "❌ Unexpected single-flight result")
+    return ok
+
+
+async def test_cancelled_leader(directory):
+    print("\nTesting a waiter taking over from a cancelled render...")
+    cache = PdfCache(directory)
+    await cache.load()
+    stuck = StandInRender()
+    stuck.release = asyncio.Event()  # Never set: the leader's render hangs until cancelled
+    takeover = StandInRender()
+
+    leader = asyncio.create_task(cache.get_or_render(OWNER, pdf_id("b"), stuck("b")))
+    await asyncio.sleep(0.01)
+    waiter = asyncio.create_task(cache.get_or_render(OWNER, pdf_id("b"), takeover("b")))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+    try:
+        await leader
+        leader_cancelled = False
+    except asyncio.CancelledError:
+        leader_cancelled = True
+    data, cached = await waiter
+
+    ok = (
+        leader_cancelled and stuck.calls == 1 and takeover.calls == 1
+        and data.startswith(b"%PDF-b") and not cached and not cache._inflight
+        and await cache.get(OWNER, pdf_id("b")) == data
+    )
+    print(f"  leader cancelled: {leader_cancelled}, takeover renders: {takeover.calls}, stored: {await cache.get(OWNER, pdf_id('b')) is not None}")
+    print("✅ The waiter rendered and stored the PDF itself instead of inheriting the cancellation" if ok else "❌ Unexpected cancellation result")
+    return ok
+
+
+async def test_owner_scoping(directory):
+    print("\nTesting that PDF ids are scoped to their owner...")
+    cache = PdfCache(directory)
+    await cache.load()
+    render = StandInRender()
+    lookup = await cache.get(OTHER_OWNER, pdf_id("a"))
+    _, cached = await cache.get_or_render(OTHER_OWNER, pdf_id("a"), render("a"))
+    own = await cache.get(OWNER, pdf_id("a"))
+
+    ok = lookup is None and not cached and render.calls == 1 and own is not None
+    print(f"  other owner's lookup: {lookup!r}, other owner's render cached: {cached}, owner still hits: {own is not None}")
+    print("✅ Another user's request for the same id missed and rendered its own copy" if ok else "❌ A PDF id was shared across owners")
+    return ok
+
+
+async def test_eviction(directory):
+    print("\nTesting eviction past max_bytes...")
+    cache = PdfCache(directory, max_bytes=int(2.5 * PDF_SIZE))
+    await cache.load()  # Three PDFs from the earlier tests, one over the limit
+    loaded = cache.stats()
+    render = StandInRender(delay=0)
+    await cache.get_or_render(OWNER, pdf_id("c"), render("c"))
+    await cache.get(OWNER, pdf_id("c"))  # Most recently used
+    await cache.get_or_render(OWNER, pdf_id("d"), render("d"))
+    stats = cache.stats()
+    c_kept = await cache.get(OWNER, pdf_id("c")) is not None
+
+    ok = (
+        loaded["entries"] == 2 and loaded["evictions"] == 1
+        and stats["entries"] == 2 and stats["bytes"] <= cache.max_bytes
+        and c_kept and len(pdf_files(directory)) == 2
+    )
+    print(f"  after load: {loaded['entries']} entries, {loaded['evictions']} evicted; after two more: {stats}")
+    print("✅ Least recently used PDFs deleted from the index and the disk" if ok else "❌ Unexpected eviction result")
+    return ok
+
+
+async def test_restart_rebuild(directory):
+    print("\nTesting the index rebuild on restart...")
+    cache = PdfCache(directory)
+    await cache.load()
+    before = list(cache._index.items())
+    # Order on disk comes from mtimes; make them distinct, oldest first
+    now = time.time()
+    for age, (key, _) in enumerate(reversed(before)):
+        os.utime(cache._path(key), (now - 100 * (age + 1), now - 100 * (age + 1)))
+    interrupted = cache._path(before[0][0]) + ".123.tmp"
+    with open(interrupted, "wb") as f:
+        f.write(b"%PDF-partial")
+
+    restarted = PdfCache(directory)
+    await restarted.load()
+    after = list(restarted._index.items())
+    hit = await restarted.get_or_render(OWNER, pdf_id("c"), StandInRender()("c"))
+
+    ok = after == before and not os.path.exists(interrupted) and hit[1] and restarted.stats()["bytes"] == sum(s for _, s in before)
+    print(f"  entries before: {len(before)}, after restart: {len(after)}, same LRU order: {after == before}, temp file removed: {not os.path.exists(interrupted)}")
+    print("✅ Index rebuilt from the directory in LRU order; the partial write was cleaned up" if ok else "❌ Unexpected rebuild result")
+    return ok
+
+
+async def main():
+    print("🚀 Testing the resume PDF cache")
+    print("=" * 50)
+    with tempfile.TemporaryDirectory() as directory:
+        results = [
+            await test_single_flight(directory),
+            await test_cancelled_leader(directory),
+            await test_owner_scoping(directory),
+            await test_eviction(directory),
+            await test_restart_rebuild(directory),
+        ]
+
+    print("\n" + "=" * 50)
+    print("📊 Test Results Summary:")
+    print(f"✅ Passed: {sum(results)} tests")
+    print(f"❌ Failed: {len(results) - sum(results)} tests")
+    if all(results):
+        print("🎉 All tests passed! PDFs render once, stay with their owner, and the cache stays bounded.")
+    else:
+        print("⚠️  Some tests failed. Check the output above for details.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
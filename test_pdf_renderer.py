@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Test script for the resume PDF browser pool (services/pdf_renderer.py).
+
+Runs the pool against a stand-in for Playwright's Chromium (browser, contexts and pages
+that record what happens to them), so no browser is needed. Covers page checkout and
+reuse, recycling after PDF_PAGE_MAX_RENDERS and after an error, the queue_full and
+timeout rejections, and the relaunch after the browser disconnects.
+
+    python test_pdf_renderer.py
+"""
+import asyncio
+import itertools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "api"))
+
+from services.pdf_renderer import BrowserPool, PdfRendererBusy
+
+RESUME_HTML = "<html><body><h1>Jane Doe</h1></body></html>"
+
+
+class StandInPage:
+    ids = itertools.count(1)
+
+    def __init__(self, context):
+        self.id = next(self.ids)
+        self.context = context
+        self.closed = False
+        self.renders = 0
+
+    def is_closed(self):
+        return self.closed
+
+    async def set_content(self, html, wait_until=None, timeout=None):
+        if "<fail>" in html:
+            raise RuntimeError("stand-in render failed")
+        self.html = html
+
+    async def evaluate(self, expression):
+        return None
+
+    async def pdf(self, **options):
+        self.renders += 1
+        return f"%PDF-stand-in page {self.id}".encode()
+
+
+class StandInContext:
+    def __init__(self, browser):
+        self.browser = browser
+        self.closed = False
+        self.pages = []
+
+    async def new_page(self):
+        page = StandInPage(self)
+        self.pages.append(page)
+        return page
+
+    async def close(self):
+        self.closed = True
+        for page in self.pages:
+            page.closed = True
+
+
+class StandInBrowser:
+    def __init__(self):
+        self.connected = True
+        self.contexts = []
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self):
+        context = StandInContext(self)
+        self.contexts.append(context)
+        return context
+
+    async def close(self):
+        self.connected = False
+
+
+class StandInPlaywright:
+    """Stands in for the object async_playwright().start() returns."""
+
+    def __init__(self):
+        self.browsers = []
+        self.chromium = self
+
+    async def launch(self, args=None):
+        browser = StandInBrowser()
+        self.browsers.append(browser)
+        return browser
+
+    async def stop(self):
+        pass
+
+
+async def start_pool(**options):
+    playwright = StandInPlaywright()
+    pool = BrowserPool(**options)
+    pool._playwright = playwright  # _ensure_browser launches through it instead of starting Playwright
+    await pool.start()
+    return pool, playwright
+
+
+async def test_checkout_and_reuse():
+    print("Testing page checkout and reuse...")
+    pool, playwright = await start_pool(size=2, max_renders=100)
+    try:
+        warm = pool.stats()
+        pages, idle_during = [], []
+        for _ in range(4):
+            async with pool.page() as page:
+                pages.append(page)
+                idle_during.append(pool.stats()["idle"])
+        pdf = await pool.render(RESUME_HTML)
+        contexts = list(playwright.browsers[0].contexts)
+        closed = sum(c.closed for c in contexts)
+    finally:
+        await pool.stop()
+
+    ok = (
+        len(playwright.browsers) == 1 and len(contexts) == 2 and closed == 0
+        and warm["idle"] == 2 and idle_during == [1, 1, 1, 1]
+        and len({p.id for p in pages}) <= 2 and pdf.startswith(b"%PDF-")
+    )
+    print(f"  launches: {len(playwright.browsers)}, contexts opened: {len(contexts)}, distinct pages used: {len({p.id for p in pages})}")
+    print("✅ Two warm pages opened at start and reused across renders" if ok else "❌ Unexpected checkout result")
+    return ok
+
+
+async def test_recycling():
+    print("\nTesting recycling after max_renders and after an error...")
+    pool, playwright = await start_pool(size=1, max_renders=2)
+    try:
+        for _ in range(2):
+            await pool.render(RESUME_HTML)
+        after_max = list(playwright.browsers[0].contexts)
+        try:
+            await pool.render("<fail>")
+        except RuntimeError:
+            pass
+        after_error = list(playwright.browsers[0].contexts)
+        await pool.render(RESUME_HTML)
+        idle = pool.stats()["idle"]
+        contexts = list(playwright.browsers[0].contexts)
+        states = ["closed" if c.closed else "open" for c in contexts]
+    finally:
+        await pool.stop()
+
+    # 1: warm page, closed after 2 renders; 2: reopened, closed by the error; 3: reopened again
+    ok = (
+        len(after_max) == 1 and after_max[0].closed
+        and len(after_error) == 2 and after_error[1].closed
+        and states == ["closed", "closed", "open"] and idle == 1
+    )
+    print(f"  contexts: {states}, idle after: {idle}")
+    print("✅ Page recycled after max_renders and after a failed render; the slot stayed in the pool" if ok else "❌ Unexpected recycling result")
+    return ok
+
+
+async def test_queue_full_and_timeout():
+    print("\nTesting queue_full and timeout rejections...")
+    pool, _ = await start_pool(size=1, queue_limit=1, acquire_timeout=0.2)
+    release = asyncio.Event()
+
+    async def hold():
+        async with pool.page():
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0.01)
+    waiter = asyncio.create_task(pool.render(RESUME_HTML))
+    await asyncio.sleep(0.01)
+    try:
+        try:
+            await pool.render(RESUME_HTML)
+            queue_full = None
+        except PdfRendererBusy as e:
+            queue_full = str(e)
+        start = time.perf_counter()
+        try:
+            await waiter
+            timeout = None
+        except PdfRendererBusy as e:
+            timeout = str(e)
+        waited = time.perf_counter() - start
+        release.set()
+        await holder
+        after = await pool.render(RESUME_HTML)
+        stats = pool.stats()
+    finally:
+        release.set()
+        await pool.stop()
+
+    ok = (
+        queue_full is not None and "waiting" in queue_full
+        and timeout is not None and waited < 1.0
+        and after.startswith(b"%PDF-") and stats["waiting"] == 0 and stats["idle"] == 1
+    )
+    print(f"  queue full: {queue_full!r}, timeout: {timeout!r} after {waited:.2f}s, stats after: {stats}")
+    print("✅ Busy pool rejected the extra caller at once and the waiter after the timeout" if ok else "❌ Unexpected rejection result")
+    return ok
+
+
+async def test_relaunch():
+    print("\nTesting relaunch after the browser disconnects...")
+    pool, playwright = await start_pool(size=2)
+    try:
+        await pool.render(RESUME_HTML)
+        playwright.browsers[0].connected = False  # Chromium crashed
+        disconnected = pool.stats()["browserConnected"]
+        pages = []
+        for _ in range(2):
+            async with pool.page() as page:
+                pages.append(page)
+        connected = pool.stats()["browserConnected"]
+    finally:
+        await pool.stop()
+
+    old_contexts = playwright.browsers[0].contexts
+    ok = (
+        not disconnected and connected and len(playwright.browsers) == 2
+        and all(page.context.browser is playwright.browsers[1] for page in pages)
+        and all(c.closed for c in old_contexts)
+    )
+    print(f"  launches: {len(playwright.browsers)}, pages now on the new browser: {sum(p.context.browser is playwright.browsers[1] for p in pages)}/2")
+    print("✅ Browser relaunched once and stale pages replaced" if ok else "❌ Unexpected relaunch result")
+    return ok
+
+
+async def main():
+    print("🚀 Testing the PDF browser pool")
+    print("=" * 50)
+    results = [
+        await test_checkout_and_reuse(),
+        await test_recycling(),
+        await test_queue_full_and_timeout(),
+        await test_relaunch(),
+    ]
+
+    print("\n" + "=" * 50)
+    print("📊 Test Results Summary:")
+    print(f"✅ Passed: {sum(results)} tests")
+    print(f"❌ Failed: {len(results) - sum(results)} tests")
+    if all(results):
+        print("🎉 All tests passed! Pages are reused, recycled and bounded, and the browser is relaunched.")
+    else:
+        print("⚠️  Some tests failed. Check the output above for details.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
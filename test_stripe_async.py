@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Test script to verify Stripe calls no longer block the API's event loop.
+
+Runs against stripe-mock (https://github.com/stripe/stripe-mock), a local stand-in
+for the Stripe API:
+
+    docker run --rm -p 12111-12112:12111-12112 stripe/stripe-mock:latest
+    python test_stripe_async.py
+
+A ticker task measures event-loop lag (how late a 10 ms sleep wakes up) while a burst of
+Stripe calls runs, first through the blocking stripe.* SDK methods the handlers used to
+call, then through services.stripe_client. Lag should stay near the idle baseline for
+the async client.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "api"))
+
+import stripe
+
+from services.stripe_client import AsyncStripeClient
+
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE", "http://localhost:12111")
+STRIPE_TEST_KEY = os.getenv("STRIPE_TEST_KEY", "sk_test_123")  # stripe-mock accepts any test key
+CALLS = 50
+TICK_SECONDS = 0.01
+# Allowed rise in worst-case loop lag over the idle baseline while async calls are in flight.
+# Encoding 50 requests that all start at once is still CPU work on the loop (~15 ms);
+# the blocking SDK stalls it for the sum of every round trip.
+MAX_EXTRA_LAG_MS = 50.0
+
+async def measure_lag(workload):
+    """Run `workload` while sampling loop lag; returns (p50 ms, max ms, workload seconds)."""
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(TICK_SECONDS)
+            lags.append((time.perf_counter() - start - TICK_SECONDS) * 1000)
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(TICK_SECONDS * 3)  # Let the ticker settle
+    start = time.perf_counter()
+    await workload()
+    elapsed = time.perf_counter() - start
+    done.set()
+    await ticker_task
+    return statistics.median(lags), max(lags), elapsed
+
+async def idle():
+    await asyncio.sleep(0.5)
+
+async def blocking_sdk_calls():
+    """What the handlers did before: sync SDK calls inside async code."""
+    stripe.api_key = STRIPE_TEST_KEY
+    stripe.api_base = STRIPE_API_BASE
+
+    async def handler(i):
+        stripe.Customer.create(email=f"loop-test-{i}@example.com", metadata={"clerkId": f"user_{i}"})
+        stripe.Subscription.retrieve("sub_123")
+
+    await asyncio.gather(*(handler(i) for i in range(CALLS)))
+
+def async_client_calls(client):
+    async def run():
+        async def handler(i):
+            await client.create_customer(email=f"loop-test-{i}@example.com", metadata={"clerkId": f"user_{i}"})
+            await client.retrieve_subscription("sub_123")
+
+        await asyncio.gather(*(handler(i) for i in range(CALLS)))
+    return run
+
+async def test_stripe_mock_reachable(client):
+    print("Checking stripe-mock is reachable...")
+    try:
+        customer = await client.create_customer(email="ping@example.com")
+        print(f"✅ stripe-mock answered at {STRIPE_API_BASE} (customer {customer.id})")
+        return True
+    except Exception as e:
+        print(f"❌ Could not reach stripe-mock at {STRIPE_API_BASE}: {e}")
+        return False
+
+async def test_loop_latency(client):
+    print(f"\nMeasuring event-loop lag during {CALLS} concurrent handlers (2 Stripe calls each)...")
+    base_p50, base_max, _ = await measure_lag(idle)
+    sync_p50, sync_max, sync_elapsed = await measure_lag(blocking_sdk_calls)
+    async_p50, async_max, async_elapsed = await measure_lag(async_client_calls(client))
+
+    print(f"  {'':<18} {'lag p50':>10} {'lag max':>10} {'wall':>9}")
+    print(f"  {'idle':<18} {base_p50:>7.1f} ms {base_max:>7.1f} ms")
+    print(f"  {'blocking SDK':<18} {sync_p50:>7.1f} ms {sync_max:>7.1f} ms {sync_elapsed:>7.2f} s")
+    print(f"  {'async client':<18} {async_p50:>7.1f} ms {async_max:>7.1f} ms {async_elapsed:>7.2f} s")
+
+    if async_max <= base_max + MAX_EXTRA_LAG_MS:
+        print("✅ Event-loop lag stays flat while Stripe calls are in flight")
+        return True
+    print(f"❌ Event-loop lag rose by {async_max - base_max:.1f} ms (allowed {MAX_EXTRA_LAG_MS} ms)")
+    return False
+
+async def main():
+    print("🚀 Testing non-blocking Stripe client against stripe-mock")
+    print("=" * 50)
+
+    client = AsyncStripeClient(STRIPE_TEST_KEY, STRIPE_API_BASE)
+    results = []
+    try:
+        if await test_stripe_mock_reachable(client):
+            results.append(await test_loop_latency(client))
+        else:
+            results.append(False)
+    finally:
+        await client.aclose()
+
+    print("\n" + "=" * 50)
+    print("📊 Test Results Summary:")
+    print(f"✅ Passed: {sum(results)} tests")
+    print(f"❌ Failed: {len(results) - sum(results)} tests")
+
+    if all(results):
+        print("🎉 All tests passed! Stripe calls no longer block the event loop.")
+    else:
+        print("⚠️  Some tests failed. Check the output above for details.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
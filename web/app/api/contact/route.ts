@@ -6,7 +6,7 @@ const backendApiBaseUrl = process.env.INTERNAL_API_URL || 'https://tildra.fly.de
 export async function POST(request: NextRequest) {
   try {
     const body = await request.json()
-    const { name, email, subject, message } = body
+    const { name, email, subject, message, submissionId } = body
 
     // Validate the input
     if (!name || !email || !subject || !message) {
@@ -39,7 +39,8 @@ export async function POST(request: NextRequest) {
         email: email.trim(),
         subject: subject.trim(),
         message: message.trim(),
-        recipient: 'support@tildra.xyz'
+        recipient: 'support@tildra.xyz',
+        submissionId,
       }),
       cache: 'no-store',
     })
@@ -23,6 +23,8 @@ export function ContactForm() {
     subject: "",
     message: "",
   })
+  // One id per message, reused when a failed submit is retried, so the backend queues it once
+  const [submissionId, setSubmissionId] = useState(() => crypto.randomUUID())
 
   const handleChange = (e: React.ChangeEvent<HTMLInputElement | HTMLTextAreaElement>) => {
     const { name, value } = e.target
@@ -76,7 +78,7 @@ export function ContactForm() {
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify(formData),
+        body: JSON.stringify({ ...formData, submissionId }),
       })
 
       const data = await response.json()
@@ -93,6 +95,7 @@ export function ContactForm() {
 
       setIsSubmitted(true)
       setFormData({ name: "", email: "", subject: "", message: "" })
+      setSubmissionId(crypto.randomUUID())
       toast.success('Message sent successfully! We\'ll get back to you soon.')
     } catch (error) {
       console.error('Contact form error:', error)